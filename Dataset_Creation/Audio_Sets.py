@@ -1,9 +1,27 @@
+import errno
+import hashlib
 import os
-import random
 import shutil
-import pandas as pd
+from multiprocessing.pool import ThreadPool
+import numpy as np
 import soundfile as sf
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from segment_manifest import default_extension, manifest_path, read_manifest, write_manifest
+
+# Share of the total duration of each label that goes to each set
+SPLIT_PROPORTIONS = {'train': 0.8, 'validation': 0.1, 'test': 0.1}
+
+# ioctl request that clones a file's extents into another (Linux btrfs/XFS/bcachefs; copy-on-write, no data copied)
+FICLONE = 0x40049409
+MATERIALIZE_METHODS = ('auto', 'reflink', 'hardlink', 'copy', 'none')
+# Errors meaning "this filesystem can't do it", after which the method is not tried again
+UNSUPPORTED_ERRORS = (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EMLINK)
+
 
 def get_audio_duration(file_path):
     """
@@ -19,7 +37,176 @@ def get_audio_duration(file_path):
         return len(audio_file) / audio_file.samplerate
 
 
-def split_audio_files(original_folder, output_folder, excel_file, target_duration=1):
+def reflink_file(source_path, destination_path):
+    """
+    Create destination_path as a copy-on-write clone of source_path.
+
+    Args:
+        source_path (str): Existing file.
+        destination_path (str): New file.
+
+    Raises:
+        OSError: If the platform or filesystem doesn't support reflinks.
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks need fcntl")
+    with open(source_path, 'rb') as source_file, open(destination_path, 'wb') as destination_file:
+        try:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            destination_file.close()
+            os.remove(destination_path)
+            raise
+
+
+LINK_FUNCTIONS = {'reflink': reflink_file, 'hardlink': os.link, 'copy': shutil.copy2}
+
+
+def materialize_file(source_path, destination_path, method='auto', unsupported=None):
+    """
+    Place a segment file in a split folder without duplicating its data where possible.
+
+    With method 'auto' a reflink is tried first (an independent file sharing the data blocks),
+    then a hard link (the same file under a second name), then a full copy.
+
+    Args:
+        source_path (str): Segment file.
+        destination_path (str): Path in the split folder.
+        method (str): 'auto', 'reflink', 'hardlink' or 'copy'.
+        unsupported (set): Methods already known to fail on this filesystem; updated in place.
+
+    Returns:
+        str: The method that was used, or 'existing' if the destination was already there.
+    """
+    if os.path.exists(destination_path):
+        return 'existing'
+    unsupported = set() if unsupported is None else unsupported
+    candidates = ['reflink', 'hardlink', 'copy'] if method == 'auto' else [method]
+    for candidate in candidates:
+        if candidate in unsupported and candidate != 'copy':
+            continue
+        try:
+            LINK_FUNCTIONS[candidate](source_path, destination_path)
+            return candidate
+        except OSError as e:
+            if candidate == candidates[-1] or e.errno not in UNSUPPORTED_ERRORS:
+                raise
+            unsupported.add(candidate)
+
+
+def materialize_groups(original_folder, output_folder, group_files, method='auto', dry_run=False):
+    """
+    Fill the split folders, one worker thread per group.
+
+    Segment files that a previous run placed in a group folder but that now belong to another
+    group (their source changed set) are removed, so no segment is in two sets.
+
+    Args:
+        original_folder (str): Folder holding the segment files.
+        output_folder (str): Folder where the group folders are created.
+        group_files (dict): Group name -> list of segment file names.
+        method (str): See materialize_file.
+        dry_run (bool): Only report how many files and bytes each group would hold (and remove).
+
+    Returns:
+        dict: Group name -> {'files', 'bytes', and the number of files placed by each method or 'removed'}.
+    """
+    unsupported = set()
+    group_of_file = {file: group for group, files in group_files.items() for file in files}
+
+    def materialize_group(group):
+        report = {'files': len(group_files[group]), 'bytes': 0}
+        group_folder = os.path.join(output_folder, group)
+        if os.path.isdir(group_folder):
+            moved = [file for file in os.listdir(group_folder) if group_of_file.get(file, group) != group]
+            for file in moved:
+                if not dry_run:
+                    os.remove(os.path.join(group_folder, file))
+            if moved:
+                report['removed'] = len(moved)
+        elif not dry_run:
+            os.makedirs(group_folder)
+        for file in group_files[group]:
+            source_path = os.path.join(original_folder, file)
+            report['bytes'] += os.path.getsize(source_path)
+            if not dry_run:
+                used = materialize_file(source_path, os.path.join(group_folder, file), method, unsupported)
+                report[used] = report.get(used, 0) + 1
+        return group, report
+
+    with ThreadPool(len(group_files) or 1) as pool:
+        reports = dict(pool.map(materialize_group, list(group_files)))
+
+    for group, report in reports.items():
+        placed = ", ".join(f"{count} {name}" for name, count in report.items() if name not in ('files', 'bytes'))
+        summary = f"{group}: {report['files']} files, {report['bytes'] / 2 ** 20:.1f} MiB"
+        print(summary + (f" ({placed})" if placed else ""))
+    if dry_run:
+        total = sum(report['bytes'] for report in reports.values())
+        print(f"A full copy would take {total / 2 ** 20:.1f} MiB; hard links and reflinks take next to none")
+    return reports
+
+
+def source_hash(source, seed=0):
+    """
+    Get a stable pseudo-random rank for a source file, the same on every machine and run.
+
+    Args:
+        source (str): Source file name.
+        seed (int): Changes the whole ordering; keep it fixed to reproduce a split.
+
+    Returns:
+        int: 64-bit hash of the seed and source name.
+    """
+    return int.from_bytes(hashlib.sha1(f"{seed}:{source}".encode('utf-8')).digest()[:8], 'big')
+
+
+def assign_splits(source_durations, source_labels=None, existing=None, proportions=None, seed=0):
+    """
+    Assign source files to sets, balancing total duration per set within each label.
+
+    Sources that already have a set keep it. The others are visited in source_hash order and
+    each goes to the set furthest below its target share of the label's total duration, so
+    the result is reproducible for the same seed and sources. Since the balance depends on
+    all sources, adding files can move old ones unless their sets are passed as existing.
+
+    Args:
+        source_durations (dict): Source file -> total duration in seconds.
+        source_labels (dict): Source file -> label to stratify by. Default treats all sources as one label.
+        existing (dict): Source file -> set from a previous run.
+        proportions (dict): Set name -> share of the duration. Default is SPLIT_PROPORTIONS.
+        seed (int): See source_hash.
+
+    Returns:
+        dict: Source file -> set name.
+    """
+    proportions = proportions or SPLIT_PROPORTIONS
+    source_labels = source_labels or {}
+    existing = {source: split for source, split in (existing or {}).items()
+                if source in source_durations and split in proportions}
+
+    strata = {}
+    for source in source_durations:
+        strata.setdefault(source_labels.get(source), []).append(source)
+
+    assignment = dict(existing)
+    for sources in strata.values():
+        total = sum(source_durations[source] for source in sources)
+        assigned = dict.fromkeys(proportions, 0.0)
+        for source in sources:
+            if source in existing:
+                assigned[existing[source]] += source_durations[source]
+        for source in sorted((source for source in sources if source not in existing),
+                             key=lambda source: (source_hash(source, seed), source)):
+            # Largest deficit first; ties go to the earlier set in proportions
+            split = max(proportions, key=lambda name: proportions[name] * total - assigned[name])
+            assignment[source] = split
+            assigned[split] += source_durations[source]
+    return assignment
+
+
+def split_audio_files(original_folder, output_folder, excel_file, target_duration=1, method='auto', dry_run=False,
+                      seed=0, label_column=None, previous_manifest=None):
     """
     Splits WAV audio files with a specific duration from the original folder into three groups:
     train, validation, and test. Ensures samples from the same source file are not split across groups.
@@ -27,82 +214,97 @@ def split_audio_files(original_folder, output_folder, excel_file, target_duratio
     Args:
         original_folder (str): Path to the folder containing the original audio files.
         output_folder (str): Path to the folder where the output groups will be created.
-        excel_file (str): Path to the Excel file containing the metadata about the audio samples.
+        excel_file (str): Path to the segment manifest (Parquet, Arrow, CSV or Excel) describing the audio samples.
         target_duration (float): Target duration of the audio files in seconds. Default is 1.
+        method (str): How files are placed in the group folders: 'auto' (reflink, else hard link, else copy),
+            'reflink', 'hardlink', 'copy', or 'none' to only write the manifest.
+        dry_run (bool): Only report the size of each group; nothing is written.
+        seed (int): Seed of the source ordering (see assign_splits).
+        label_column (str): Manifest column to stratify the sets by (e.g. 'Label', written by Audio_Subsections
+            when given a label). Default treats all sources as one label.
+        previous_manifest (str): Manifest whose 'Set' column is kept for the sources it lists.
+            Default is the updated_segments manifest already in output_folder, if any.
+
+    Raises:
+        KeyError: If label_column is not in the manifest.
+        FileNotFoundError: If output_folder already holds set folders but no previous manifest is found;
+            assigning from scratch could move sources between sets (delete the set folders to start over).
 
     Output:
         Three folders ('train', 'validation', 'test') are created within the output_folder.
-        The audio files are copied into these folders based on the specified proportions.
-        A new Excel file is created with all fields from the original file plus an additional column indicating the set.
+        The audio files are linked (or copied) into these folders based on the specified proportions.
+        A new manifest (updated_segments.parquet, or .xlsx without pyarrow) is created with all fields
+        from the original file plus an additional column indicating the set.
 
     Purpose:
-        This function shuffles the WAV audio files in the original folder and then divides them
-        into three groups with specified proportions for train, validation, and test.
-        It ensures that each group contains a random and non-repeating selection of files
-        with a specific duration.
+        This function divides the source files of the WAV audio files in the original folder
+        into three groups holding 80/10/10% of the audio duration of each label. The assignment
+        is reproducible and stable as files are added, so embeddings and models cached per set
+        stay valid across dataset rebuilds.
     """
-    # Read the Excel file
-    df = pd.read_excel(excel_file)
+    # Read the manifest
+    df = read_manifest(excel_file)
 
     # Filter the dataframe for rows with the target duration
-    df = df[df['Segment Length (s)'] == target_duration]
-
-    # Get a list of unique source files
-    source_files = df['Source File'].unique()
+    df = df[np.isclose(df['Segment Length (s)'], target_duration)].reset_index(drop=True)
 
-    # Shuffle the list of source files to ensure randomness
-    random.shuffle(source_files)
+    # Row positions, total duration and label of every source file, computed once with a single groupby
+    grouped = df.groupby('Source File', observed=True, sort=False)
+    source_rows = grouped.indices
+    source_durations = grouped['Segment Length (s)'].sum().to_dict()
+    if label_column is not None and label_column not in df:
+        raise KeyError(f"No '{label_column}' column to stratify by in {excel_file}")
+    source_labels = grouped[label_column].first().to_dict() if label_column is not None else None
 
-    # Calculate the number of source files for each group
-    total_sources = len(source_files)
-    train_count = int(0.8 * total_sources)
-    validation_count = test_count = int(0.1 * total_sources)
-
-    # Create folders for each group if they don't exist
-    for group in ['train', 'validation', 'test']:
-        os.makedirs(os.path.join(output_folder, group), exist_ok=True)
-
-    # Assign source files to groups
-    train_sources = source_files[:train_count]
-    validation_sources = source_files[train_count:train_count + validation_count]
-    test_sources = source_files[train_count + validation_count:]
+    # Keep the sets of a previous run
+    if previous_manifest is None:
+        previous_manifest = manifest_path(output_folder, 'updated_segments')
+    existing = {}
+    if os.path.exists(previous_manifest):
+        previous = read_manifest(previous_manifest, columns=['Source File', 'Set'])
+        existing = previous.dropna().drop_duplicates('Source File').set_index('Source File')['Set'].to_dict()
+        print(f"Keeping the sets of {len(existing)} source files from {previous_manifest}")
+    elif any(os.path.isdir(os.path.join(output_folder, group)) and os.listdir(os.path.join(output_folder, group))
+             for group in SPLIT_PROPORTIONS):
+        raise FileNotFoundError(f"{output_folder} already holds sets but {previous_manifest} is missing; a new "
+                                f"assignment could move sources between train and test. Pass previous_manifest, "
+                                f"or delete the set folders to start over")
 
     # Create a dictionary to map each source file to its respective group
-    source_to_group = {}
-    for source in train_sources:
-        source_to_group[source] = 'train'
-    for source in validation_sources:
-        source_to_group[source] = 'validation'
-    for source in test_sources:
-        source_to_group[source] = 'test'
+    source_to_group = assign_splits(source_durations, source_labels, existing, seed=seed)
 
     # Add a new column to the dataframe indicating the group for each sample
     df['Set'] = df['Source File'].map(source_to_group)
 
-    # Save the updated dataframe to a new Excel file
-    output_excel_file = os.path.join(output_folder, 'updated_segments.xlsx')
-    df.to_excel(output_excel_file, index=False)
+    # Save the updated dataframe to a new manifest
+    if not dry_run:
+        os.makedirs(output_folder, exist_ok=True)
+        output_manifest_file = os.path.join(output_folder, 'updated_segments' + default_extension())
+        write_manifest(df, output_manifest_file)
 
-    # Helper function to copy files to the respective group folder
-    def copy_files_to_group(group_name, sources):
-        for source in sources:
-            segment_names = df[df['Source File'] == source]['Segment Name']
-            for file in segment_names:
-                shutil.copy(os.path.join(original_folder, file), os.path.join(output_folder, group_name, file))
+    if method == 'none' and not dry_run:
+        return
 
-    # Copy files to their respective groups
-    copy_files_to_group('train', train_sources)
-    copy_files_to_group('validation', validation_sources)
-    copy_files_to_group('test', test_sources)
+    # Link (or copy) files into their respective group folders
+    segment_names = df['Segment Name'].to_numpy()
+    group_files = {group: [] for group in SPLIT_PROPORTIONS}
+    for source, group in source_to_group.items():
+        group_files[group].extend(segment_names[source_rows[source]])
+    materialize_groups(original_folder, output_folder, group_files, method, dry_run)
 
 
 def main():
     original_folder = 'add path to original folder here'
     output_folder = 'add path to output folder here'
-    excel_file = 'add path to excel file here'
+    excel_file = 'add path to audio_segments.parquet (or .xlsx) here'
     target_duration = 3  # or any other duration you need
+    method = 'auto'  # 'reflink', 'hardlink', 'copy', or 'none' to only write the manifest
+    dry_run = False  # True only reports the size of each group
+    seed = 0  # keep fixed so rebuilds reproduce the same sets
+    label_column = None  # 'Label' to stratify a manifest holding both ads and podcasts
 
-    split_audio_files(original_folder, output_folder, excel_file, target_duration)
+    split_audio_files(original_folder, output_folder, excel_file, target_duration, method, dry_run, seed,
+                      label_column)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,15 @@
 import os
+import numpy as np
 import soundfile as sf
 import pandas as pd
 import time
 
+from segment_manifest import default_extension, write_manifest
+
+# Columnar segment metadata: one record per segment, the remainder (if kept) last
+SEGMENT_DTYPE = np.dtype([('segment', np.int32), ('start_sample', np.int64), ('num_samples', np.int64),
+                          ('start_time', np.float64), ('end_time', np.float64)])
+
 def load_audio(audio_file_path):
     """
     Load audio from the specified file path using soundfile library.
@@ -27,9 +34,12 @@ def create_output_folder(output_folder):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-def split_audio(audio, sample_rate, segment_duration):
+def segment_audio(audio, sample_rate, segment_duration):
     """
-    Split the audio into segments of specified duration.
+    Split the audio into segments of specified duration without copying it.
+
+    The whole segments are a single (num_segments, samples_per_segment[, channels]) view of
+    the audio array, so the cost does not grow with the number of segments.
 
     Args:
     - audio (np.ndarray): Audio data.
@@ -37,44 +47,127 @@ def split_audio(audio, sample_rate, segment_duration):
     - segment_duration (float): Duration of each segment in seconds.
 
     Returns:
-    - list: List of audio segments.
+    - np.ndarray: View of the whole segments.
+    - np.ndarray or None: View of the trailing samples that don't fill a segment, or None.
+    - np.ndarray: Segment metadata (SEGMENT_DTYPE records), the remainder last if there is one.
     """
+    audio = np.ascontiguousarray(audio)
     num_samples_per_segment = int(sample_rate * segment_duration)
+    num_segments, remainder_samples = divmod(len(audio), num_samples_per_segment)
 
-    num_segments = len(audio) // num_samples_per_segment
-    remainder_samples = len(audio) % num_samples_per_segment
+    segments = audio[:num_segments * num_samples_per_segment].reshape(
+        (num_segments, num_samples_per_segment) + audio.shape[1:])
+    remainder = audio[num_segments * num_samples_per_segment:] if remainder_samples > 0 else None
 
-    audio_segments = []
+    num_records = num_segments + (remainder is not None)
+    metadata = np.empty(num_records, dtype=SEGMENT_DTYPE)
+    metadata['segment'] = np.arange(num_records)
+    metadata['start_sample'] = metadata['segment'] * np.int64(num_samples_per_segment)
+    metadata['num_samples'] = num_samples_per_segment
+    if remainder is not None:
+        metadata['num_samples'][-1] = remainder_samples
+    metadata['start_time'] = metadata['segment'] * segment_duration
+    metadata['end_time'] = metadata['start_time'] + metadata['num_samples'] / sample_rate
+    return segments, remainder, metadata
 
-    for i in range(num_segments):
-        start_sample = i * num_samples_per_segment
-        end_sample = start_sample + int(sample_rate * segment_duration)  # Dynamically calculate end_sample
-        segment = audio[start_sample:end_sample]
-        audio_segments.append(segment)
 
-    # Handle the remaining samples
-    if remainder_samples > 0:
-        segment = audio[num_segments * num_samples_per_segment:]
-        audio_segments.append(segment)
+def split_audio(audio, sample_rate, segment_duration):
+    """
+    Split the audio into segments of specified duration.
+
+    Args:
+    - audio (np.ndarray): Audio data.
+    - sample_rate (int): Sample rate of the audio data.
+    - segment_duration (float): Duration of each segment in seconds.
 
+    Returns:
+    - list: List of audio segments (views of the audio), the shorter remainder last.
+    """
+    segments, remainder, _ = segment_audio(audio, sample_rate, segment_duration)
+    audio_segments = list(segments)
+    if remainder is not None:
+        audio_segments.append(remainder)
     return audio_segments
 
 
-def save_audio_segments(audio_segments_info, output_folder):
+def embed_audio_file(audio_file_path, segment_duration, embed_batch, include_remainder=False):
     """
-    Save audio segments information to an Excel file.
+    Segment an audio file and embed the segments in memory, without writing segment files.
 
     Args:
-    - audio_segments_info (list): List of dictionaries containing segment information.
-    - output_folder (str): Path to the output folder.
+    - audio_file_path (str): Path to the audio file.
+    - segment_duration (float): Duration of each segment in seconds.
+    - embed_batch (callable): embed_batch(waveforms, sample_rate) returning one embedding per waveform,
+      e.g. audio_processor.embed_waveforms or OpenL3Embedder.embed_batch.
+    - include_remainder (bool): Also embed the shorter trailing segment.
+
+    Returns:
+    - list: Embeddings, one per segment.
+    - np.ndarray: Metadata of the embedded segments (SEGMENT_DTYPE records).
     """
-    excel_file_path = os.path.join(output_folder, 'audio_segments.xlsx')
-    df = pd.DataFrame(audio_segments_info)
-    df.to_excel(excel_file_path, index=False)
-    print(f"Excel file saved as {excel_file_path}")
+    audio, sample_rate = load_audio(audio_file_path)
+    segments, remainder, metadata = segment_audio(audio, sample_rate, segment_duration)
+    embeddings = list(embed_batch(segments, sample_rate)) if len(segments) else []
+    if include_remainder and remainder is not None:
+        embeddings += list(embed_batch([remainder], sample_rate))
+    else:
+        metadata = metadata[:len(segments)]
+    return embeddings, metadata
 
 
-def process_audio(audio_file_paths, output_folder, segment_duration):
+def segments_table(source_file_name, metadata, label=None):
+    """
+    Build the segment information table of one source file from its columnar metadata.
+
+    Args:
+    - source_file_name (str): Source file name without extension.
+    - metadata (np.ndarray): Segment metadata from segment_audio.
+    - label (str): Optional label of the source (e.g. 'ad' or 'podcast'), written as a 'Label' column.
+
+    Returns:
+    - pd.DataFrame: One row per segment, in the audio_segments.xlsx layout.
+    """
+    segment_names = np.char.add(np.char.add(f"{source_file_name}_segment_",
+                                            (metadata['segment'] + 1).astype(str)), ".wav")
+    table = pd.DataFrame({
+        'Segment Name': segment_names,
+        'Source File': source_file_name,
+        'Start Time (s)': metadata['start_time'],
+        'End Time (s)': metadata['end_time'],
+        'Segment Length (s)': metadata['end_time'] - metadata['start_time']
+    })
+    if label is not None:
+        # Lets Audio_Sets stratify the sets of a manifest that mixes ads and podcasts
+        table['Label'] = label
+    return table
+
+
+def save_audio_segments(audio_segments_info, output_folder, manifest_file=None):
+    """
+    Save audio segments information to a manifest file (Parquet when pyarrow is installed, otherwise Excel).
+
+    Args:
+    - audio_segments_info (list): List of segment tables (pd.DataFrame) or dictionaries of segment information.
+    - output_folder (str): Path to the output folder.
+    - manifest_file (str): Manifest file name, e.g. 'audio_segments.xlsx' to force Excel. Default picks the format.
+
+    Returns:
+    - str: Path of the manifest file.
+    """
+    if manifest_file is None:
+        manifest_file_path = os.path.join(output_folder, 'audio_segments' + default_extension())
+    else:
+        manifest_file_path = os.path.join(output_folder, manifest_file)
+    if audio_segments_info and isinstance(audio_segments_info[0], pd.DataFrame):
+        df = pd.concat(audio_segments_info, ignore_index=True)
+    else:
+        df = pd.DataFrame(audio_segments_info)
+    write_manifest(df, manifest_file_path)
+    print(f"Manifest saved as {manifest_file_path}")
+    return manifest_file_path
+
+
+def process_audio(audio_file_paths, output_folder, segment_duration, write_segments=True, label=None):
     """
     Process multiple audio files by splitting them into segments and saving segment information.
 
@@ -82,34 +175,27 @@ def process_audio(audio_file_paths, output_folder, segment_duration):
     - audio_file_paths (list): List of audio file paths.
     - output_folder (str): Path to the output folder.
     - segment_duration (float): Duration of each segment in seconds.
+    - write_segments (bool): Write a WAV file per segment; False only writes the segment information.
+    - label (str): Label of all the files (e.g. 'ad' or 'podcast'), written as the manifest's 'Label' column.
     """
+    print("Creating output folder...")
+    create_output_folder(output_folder)
+
     all_segments_info = []
 
     for audio_file_path in audio_file_paths:
         print(f"Processing audio file: {audio_file_path}")
         audio, sample_rate = load_audio(audio_file_path)
         source_file_name = os.path.splitext(os.path.basename(audio_file_path))[0]
-        audio_segments = split_audio(audio, sample_rate, segment_duration)
-
-        for i, segment in enumerate(audio_segments):
-            segment_name = f"{source_file_name}_segment_{i + 1}.wav"
-            segment_path = os.path.join(output_folder, segment_name)
-            sf.write(segment_path, segment, sample_rate)
-
-            start_time = i * segment_duration
-            end_time = start_time + len(segment) / sample_rate
-            segment_length = end_time - start_time
+        segments, remainder, metadata = segment_audio(audio, sample_rate, segment_duration)
+        segments_info = segments_table(source_file_name, metadata, label)
 
-            all_segments_info.append({
-                'Segment Name': segment_name,
-                'Source File': source_file_name,
-                'Start Time (s)': start_time,
-                'End Time (s)': end_time,
-                'Segment Length (s)': segment_length
-            })
+        if write_segments:
+            pieces = list(segments) + ([remainder] if remainder is not None else [])
+            for segment_name, segment in zip(segments_info['Segment Name'], pieces):
+                sf.write(os.path.join(output_folder, segment_name), segment, sample_rate)
 
-    print("Creating output folder...")
-    create_output_folder(output_folder)
+        all_segments_info.append(segments_info)
 
     print("Saving audio segments information...")
     save_audio_segments(all_segments_info, output_folder)
@@ -123,11 +209,12 @@ def main():
     segment_duration = 3  # Duration of each segment in seconds
     audio_folder = "add audio_folder path here"
     output_folder = "add output_folder path here"
+    label = None  # e.g. 'ad' or 'podcast', to stratify the sets in Audio_Sets by label
 
     audio_file_paths = [os.path.join(audio_folder, file) for file in os.listdir(audio_folder) if file.endswith('.mp3') or file.endswith('.wav')]
     print("Audio files to process:")
     print(audio_file_paths)
-    process_audio(audio_file_paths, output_folder, segment_duration)
+    process_audio(audio_file_paths, output_folder, segment_duration, label=label)
 
     end_time = time.time()
     execution_time = end_time - start_time
@@ -0,0 +1,108 @@
+import os
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Column types of the segment manifest; source and set names repeat on every row, so they are stored as categories
+MANIFEST_DTYPES = {'Segment Name': 'string', 'Source File': 'category', 'Start Time (s)': 'float64',
+                   'End Time (s)': 'float64', 'Segment Length (s)': 'float64', 'Label': 'category',
+                   'Set': 'category'}
+MANIFEST_EXTENSIONS = ('.parquet', '.arrow', '.feather', '.xlsx', '.csv')
+
+
+def default_extension():
+    """
+    Get the manifest format to write when none is requested.
+
+    Returns:
+        str: '.parquet' when pyarrow is installed, otherwise '.xlsx'.
+    """
+    return '.parquet' if pyarrow is not None else '.xlsx'
+
+
+def manifest_path(folder, stem):
+    """
+    Find an existing manifest in a folder, preferring the columnar formats over Excel.
+
+    Args:
+        folder (str): Folder holding the manifest.
+        stem (str): File name without extension, e.g. 'audio_segments'.
+
+    Returns:
+        str: Path of the first existing manifest, or of a new one in the default format.
+    """
+    for extension in MANIFEST_EXTENSIONS:
+        path = os.path.join(folder, stem + extension)
+        if os.path.exists(path):
+            return path
+    return os.path.join(folder, stem + default_extension())
+
+
+def write_manifest(df, path):
+    """
+    Write a segment manifest in the format given by the file extension.
+
+    Parquet and Arrow/Feather files are columnar and compressed, so hundreds of thousands of
+    rows write and read in well under a second and there is no sheet row limit.
+
+    Args:
+        df (pd.DataFrame): Segment manifest.
+        path (str): Output path ending in .parquet, .arrow, .feather, .xlsx or .csv.
+    """
+    df = df.astype({column: dtype for column, dtype in MANIFEST_DTYPES.items() if column in df})
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    elif path.endswith(('.arrow', '.feather')):
+        df.reset_index(drop=True).to_feather(path)
+    elif path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def read_manifest(path, columns=None):
+    """
+    Read a segment manifest written by write_manifest (or an older Excel manifest).
+
+    Args:
+        path (str): Manifest path.
+        columns (list): Columns to read; the columnar formats skip the others entirely.
+
+    Returns:
+        pd.DataFrame: Segment manifest.
+    """
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path, columns=columns)
+    elif path.endswith(('.arrow', '.feather')):
+        df = pd.read_feather(path, columns=columns)
+    elif path.endswith('.csv'):
+        df = pd.read_csv(path, usecols=columns)
+    else:
+        df = pd.read_excel(path, usecols=columns)
+    return df.astype({column: dtype for column, dtype in MANIFEST_DTYPES.items() if column in df})
+
+
+def convert_manifest(input_path, output_path):
+    """
+    Convert a manifest between formats, e.g. an existing audio_segments.xlsx to Parquet.
+
+    Args:
+        input_path (str): Existing manifest.
+        output_path (str): New manifest path.
+    """
+    write_manifest(read_manifest(input_path), output_path)
+    print(f"Manifest converted to {output_path}")
+
+
+def main():
+    input_path = 'add path to audio_segments.xlsx here'
+    output_path = os.path.splitext(input_path)[0] + default_extension()
+
+    convert_manifest(input_path, output_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,29 @@
-import math
+import argparse
 import sys
 import os
-import joblib
 from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, QHBoxLayout, QWidget, QFileDialog, QFrame, QSlider, QStatusBar
 from PyQt5.QtGui import QPixmap, QFont, QPalette, QColor
 from PyQt5.QtCore import Qt, QSize, QUrl
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from pydub import AudioSegment
+import numpy as np
 
-from Vggish_Embeddings_Model import extract_vggish_embeddings
+from audio_decoding import FFMPEG_CHANNELS, FFMPEG_SAMPLE_RATE, decode_file, write_wav
+from audio_processor import create_processor
 
-
-class AudioProcessor:
-    """
-    Class for processing audio and detecting ads using a pre-trained SVM model.
-    """
-    def __init__(self, svm_model_path):
-        """
-        Initialize the AudioProcessor with a pre-trained SVM model.
-
-        :param svm_model_path: Path to the SVM model file.
-        """
-        self.svm_model = joblib.load(svm_model_path)
-
-    def convert_to_embeddings(self, file_path):
-        """
-        Convert an audio file to VGGish embeddings.
-
-        :param file_path: Path to the audio file.
-        :return: Embeddings of the audio file.
-        """
-        embeddings = extract_vggish_embeddings(file_path)
-        return embeddings
-
-    def detect_ads(self, file_path):
-        """
-        Detect ads in the given audio file based on the embeddings.
-
-        :param file_path: Path to the audio file.
-        :return: True if ads are detected, False otherwise.
-        """
-        embedding = self.convert_to_embeddings(file_path)
-        prediction = self.svm_model.predict([embedding])
-        return prediction == 1
+WINDOW_SECONDS = 5
+WINDOWS_PER_BATCH = 64  # windows embedded per VGGish run
 
 
 class MainWindow(QMainWindow):
     """
     Main window for the Audio Ad Blocker application.
     """
-    def __init__(self):
+    def __init__(self, model_path='svm_model_vggish_5sec.pkl', anomaly_path=None, head_path=None):
+        """
+        :param model_path: SVM pickle, exported .npz or model_registry directory.
+        :param anomaly_path: Directory of a saved anomaly scorer to use instead of the SVM.
+        :param head_path: Distilled head (.npz) to use instead of VGGish + SVM.
+        """
         super().__init__()
 
         self.setWindowTitle("Audio Ad Blocker")
@@ -58,7 +32,8 @@ class MainWindow(QMainWindow):
         # Set the color palette for the application window
         self.set_palette()
 
-        self.audio_processor = AudioProcessor('svm_model_vggish_5sec.pkl')
+        self.audio_processor = create_processor(model_path, WINDOW_SECONDS, anomaly_path=anomaly_path,
+                                                head_path=head_path)
 
         # Header Area
         self.header_label = QLabel("Audio Ad Blocker")
@@ -177,7 +152,7 @@ class MainWindow(QMainWindow):
         options = QFileDialog.Options()
         options |= QFileDialog.ReadOnly
         self.file_path, _ = QFileDialog.getOpenFileName(self, "Upload Audio", "",
-                                                        "Audio Files (*.wav *.mp3);;All Files (*)", options=options)
+                                                        "Audio Files (*.wav *.mp3 *.flac *.ogg *.m4a);;All Files (*)", options=options)
         if self.file_path:
             self.message_label.setText(f"File uploaded: {os.path.basename(self.file_path)}")
 
@@ -190,48 +165,28 @@ class MainWindow(QMainWindow):
             self.statusBar.showMessage("No audio file uploaded", 3000)
             return
 
-        audio = AudioSegment.from_file(self.file_path)
-
-        # Determine the duration of the audio in milliseconds
-        duration_ms = len(audio)
-        segment_duration_ms = 5000
-        num_segments = math.ceil(duration_ms / segment_duration_ms)
-        output_dir = "audio_segments"
-        os.makedirs(output_dir, exist_ok=True)
-        segments_paths = []
-        seg_list = []
-
-        # Segment the audio file into smaller chunks for processing
-        for i in range(num_segments):
-            start_time = i * segment_duration_ms
-            end_time = min(start_time + segment_duration_ms, duration_ms)
-            segment = audio[start_time:end_time]
-            if len(segment) < 5000:
-                continue
-            seg_list.append(segment)
-            segment_path = os.path.join(output_dir, f"segment_{i + 1}.wav")
-            segment.export(segment_path, format="wav")
-            segments_paths.append(segment_path)
-
-        # Combine non-ad segments into a single processed audio file
-        processed_audio = AudioSegment.silent(duration=0)
-
-        for i, seg_path in enumerate(segments_paths):
-            if not self.audio_processor.detect_ads(seg_path):
-                processed_audio += seg_list[i]
+        # Decoded in process where possible (libsndfile), with ffmpeg only as a fallback; its output format is
+        # given so no ffprobe run is needed
+        samples, sample_rate = decode_file(self.file_path, sample_rate=FFMPEG_SAMPLE_RATE, channels=FFMPEG_CHANNELS)
+
+        # Whole 5-second windows as views of the decoded samples; a shorter tail is dropped
+        window_frames = WINDOW_SECONDS * sample_rate
+        num_windows = len(samples) // window_frames
+        windows = samples[:num_windows * window_frames].reshape(num_windows, window_frames, samples.shape[1])
+
+        # Keep the non-ad windows, classifying a batch of windows per call
+        is_ad = np.zeros(num_windows, dtype=bool)
+        for start in range(0, num_windows, WINDOWS_PER_BATCH):
+            is_ad[start:start + WINDOWS_PER_BATCH] = self.audio_processor.detect_ads_batch(
+                windows[start:start + WINDOWS_PER_BATCH], sample_rate)
+        processed_audio = windows[~is_ad].reshape(-1, samples.shape[1])
 
         # Save the processed audio to a file
         self.output_path = "processed_audio.wav"
-        processed_audio.export(self.output_path, format="wav")
+        write_wav(self.output_path, processed_audio, sample_rate)
 
         self.message_label.setText("Processing complete. Processed audio saved.")
 
-        # Clean up temporary segment files
-        for seg_path in segments_paths:
-            os.remove(seg_path)
-        if not os.listdir(output_dir):
-            os.rmdir(output_dir)
-
         self.statusBar.showMessage("Audio processing completed", 3000)
 
     def toggle_play_pause(self):
@@ -259,7 +214,15 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    parser = argparse.ArgumentParser(description="Audio Ad Blocker")
+    parser.add_argument("--model", default='svm_model_vggish_5sec.pkl',
+                        help="SVM pickle, exported .npz or model_registry directory")
+    parser.add_argument("--anomaly", default=None, metavar="SCORER_DIR",
+                        help="use a saved anomaly scorer instead of the SVM")
+    parser.add_argument("--distilled-head", default=None, help="use a distilled head (.npz) instead of VGGish + SVM")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(args.model, anomaly_path=args.anomaly, head_path=args.distilled_head)
     window.show()
     sys.exit(app.exec_())
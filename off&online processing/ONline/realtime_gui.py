@@ -0,0 +1,155 @@
+import argparse
+import sys
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, QWidget
+import vggish_params
+from audio_processor import AudioProcessor, create_processor
+from cascade import CascadeProcessor
+from model_watcher import ModelWatcher
+from realtime_engine import RealtimeDetector, PyAudioSource, SystemMuteSink, GatedOutputSink
+
+CHUNK = 1024
+CHANNELS = 2
+RATE = 44100
+PROCESSING_HEADROOM_SECONDS = 1
+
+class MainWindow(QMainWindow):
+    # Detection events arrive on the engine's processing thread; the label is updated on the GUI thread
+    decision_made = pyqtSignal(bool)
+
+    def __init__(self, model_path, window_seconds, pass_through=False, delay_seconds=None, prefilter_path=None,
+                 watch=False, threshold_path=None, calibrator_path=None, threshold=None, unmute_below=None,
+                 anomaly_path=None, head_path=None):
+        super().__init__()
+
+        self.setWindowTitle("Real-Time Ad Detector")
+        classifier = create_processor(model_path, window_seconds, calibrator_path, anomaly_path, head_path)
+        self.audio_processor = classifier
+        if prefilter_path:
+            # Clearly-not-ad windows are resolved from the log-mel features and never reach VGGish
+            self.audio_processor = CascadeProcessor(self.audio_processor, prefilter_path)
+        # Retrained models are swapped in while detection keeps running, without a restart or TF warm-up
+        self.watcher = None
+        if (watch or threshold_path) and not isinstance(classifier, AudioProcessor):
+            print("Hot reload only applies to the SVM backend, ignoring --watch / --threshold-file")
+        elif watch or threshold_path:
+            self.watcher = ModelWatcher(classifier, model_path, threshold_path)
+            self.watcher.install_signal_handler()
+        self.window_seconds = window_seconds
+        # In pass-through mode the captured stream is re-emitted through an AudioGate instead of muting the OS
+        self.pass_through = pass_through
+        self.delay_seconds = delay_seconds if delay_seconds is not None else window_seconds + 2
+        self.threshold = threshold
+        self.unmute_below = unmute_below
+
+        self.label = QLabel("Press 'Start' to begin real-time ad detection...")
+        self.start_button = QPushButton("Start")
+        self.start_button.clicked.connect(self.start_detection)
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.clicked.connect(self.stop_detection)
+        self.stop_button.setEnabled(False)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.label)
+        layout.addWidget(self.start_button)
+        layout.addWidget(self.stop_button)
+
+        container = QWidget()
+        container.setLayout(layout)
+        self.setCentralWidget(container)
+
+        self.decision_made.connect(self.show_decision)
+        self.detector = None
+        self.sink = None
+
+    def start_detection(self):
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+
+        if self.pass_through:
+            # Whatever the delay holds beyond one window plus processing time is used to reach back to the ad onset
+            lookback_seconds = max(0, self.delay_seconds - self.window_seconds - PROCESSING_HEADROOM_SECONDS)
+            if self.delay_seconds < self.window_seconds + PROCESSING_HEADROOM_SECONDS:
+                print(f"Warning: a {self.delay_seconds} s delay is shorter than the detection latency, "
+                      f"the start of each ad will play")
+            self.sink = GatedOutputSink(self.delay_seconds, onset_lookback_seconds=lookback_seconds)
+        else:
+            # Require two consecutive windows before muting/unmuting so a single misclassification doesn't flap
+            self.sink = SystemMuteSink(mute_after=2, unmute_after=2, unmute_below=self.unmute_below)
+
+        # Detection alone only needs what the model consumes; pass-through keeps full quality for playback
+        native_format = None if self.pass_through else (vggish_params.SAMPLE_RATE, 1)
+        source = PyAudioSource(rate=RATE, channels=CHANNELS, chunk=CHUNK, native_format=native_format)
+        self.detector = RealtimeDetector(self.audio_processor, source, [self.sink],
+                                         window_seconds=self.window_seconds, threshold=self.threshold)
+        self.detector.add_listener(lambda event: self.decision_made.emit(event.is_ad))
+        self.detector.start()
+        if self.watcher is not None:
+            self.watcher.start()
+        print("* recording")
+
+        if self.pass_through:
+            gate = self.sink.gate
+            self.label.setText(f"Detecting... output delayed by {gate.latency_seconds:.1f} s "
+                               f"({gate.memory_bytes / 2 ** 20:.1f} MiB buffer)")
+
+    def stop_detection(self):
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+
+        self.detector.stop()
+        if self.watcher is not None:
+            self.watcher.stop()
+        print("* done recording")
+        print(self.detector.summary())
+        if isinstance(self.audio_processor, CascadeProcessor):
+            print(f"Cascade skipped VGGish on {self.audio_processor.skip_rate:.1%} of windows")
+        print(self.sink.report())
+        self.label.setText("Detection stopped.")
+
+    def closeEvent(self, event):
+        # Closing mid-session must not leave the capture and reload threads running (or the system muted)
+        if self.stop_button.isEnabled():
+            self.stop_detection()
+        super().closeEvent(event)
+
+    def show_decision(self, is_ad):
+        if is_ad:
+            print("ad detected")
+            self.label.setText("Ad detected! Silencing..." if self.pass_through else "Ad detected! Muting system volume...")
+        else:
+            self.label.setText("No ad detected.")
+
+def main(model_path, window_seconds):
+    """
+    Run the real-time detector GUI for one model/window configuration.
+
+    :param model_path: Default model: an SVM pickle, exported .npz or model_registry directory.
+    :param window_seconds: Window length the model was trained on.
+    """
+    parser = argparse.ArgumentParser(description="Real-time ad detector")
+    parser.add_argument("--pass-through", action="store_true",
+                        help="re-emit the captured stream through a delayed gate instead of muting the system")
+    parser.add_argument("--delay", type=float, default=window_seconds + 2,
+                        help="playback delay of the pass-through gate in seconds")
+    parser.add_argument("--model", default=model_path,
+                        help="SVM pickle, exported .npz or model_registry directory to use instead of the default")
+    parser.add_argument("--prefilter", default=None, help="cascade prefilter (.npz) run before VGGish")
+    parser.add_argument("--watch", action="store_true", help="hot-reload the model when it changes (or on SIGHUP)")
+    parser.add_argument("--threshold-file", default=None, help="JSON decision threshold, reloaded when it changes")
+    parser.add_argument("--calibrator", default=None, help="calibrator (.npz) turning scores into P(ad)")
+    parser.add_argument("--threshold", type=float, default=None, help="score above which a window is an ad")
+    parser.add_argument("--unmute-below", type=float, default=None,
+                        help="score a window must fall below to count towards unmuting")
+    parser.add_argument("--anomaly", default=None, metavar="SCORER_DIR",
+                        help="use a saved anomaly scorer instead of the SVM")
+    parser.add_argument("--distilled-head", default=None, help="use a distilled head (.npz) instead of VGGish + SVM")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(args.model, window_seconds, pass_through=args.pass_through, delay_seconds=args.delay,
+                        prefilter_path=args.prefilter, watch=args.watch, threshold_path=args.threshold_file,
+                        calibrator_path=args.calibrator, threshold=args.threshold, unmute_below=args.unmute_below,
+                        anomaly_path=args.anomaly, head_path=args.distilled_head)
+    window.show()
+    sys.exit(app.exec_())
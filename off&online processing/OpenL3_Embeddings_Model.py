@@ -4,7 +4,78 @@ import librosa
 import openl3
 import numpy as np
 from pydub import AudioSegment
-import io
+from embedding_reduction import EmbeddingReducer
+
+
+class OpenL3Embedder:
+    """
+    OpenL3 embedder that loads the Keras model once and embeds batches of waveforms.
+    """
+
+    def __init__(self, content_type="music", embedding_size=512, input_repr="mel256",
+                 hop_size=0.1, batch_size=32, reducer_path=None):
+        """
+        Load the OpenL3 model.
+
+        Parameters:
+        - content_type: "music" or "env", the OpenL3 training content.
+        - embedding_size: 512 or 6144.
+        - input_repr: Spectrogram representation ("linear", "mel128" or "mel256").
+        - hop_size: Seconds between embedding frames; a larger hop gives fewer frames per
+          window, which is faster and gives smaller vectors at the cost of time resolution.
+        - batch_size: Number of frames run through the model at once.
+        - reducer_path: Optional EmbeddingReducer (.npz) applied to every embedding, so the
+          classifier sees the same compact vectors in training and inference.
+        """
+        self.model = openl3.models.load_audio_embedding_model(input_repr=input_repr,
+                                                              content_type=content_type,
+                                                              embedding_size=embedding_size)
+        self.hop_size = hop_size
+        self.batch_size = batch_size
+        self.reducer = EmbeddingReducer.load(reducer_path) if reducer_path else None
+
+    def embed_batch(self, waveforms, sample_rate):
+        """
+        Embed several waveforms with one model call.
+
+        Parameters:
+        - waveforms: List of NumPy waveforms (mono, or (samples, channels)).
+        - sample_rate: Sample rate shared by the waveforms.
+
+        Returns:
+        - List of flattened embeddings, one per waveform.
+        """
+        embeddings, _ = openl3.get_audio_embedding(list(waveforms), [sample_rate] * len(waveforms),
+                                                   model=self.model,
+                                                   hop_size=self.hop_size,
+                                                   batch_size=self.batch_size,
+                                                   verbose=False)
+        flat_embeddings = [np.ravel(embedding) for embedding in embeddings]
+        if self.reducer is not None:
+            flat_embeddings = [self.reducer.transform(embedding) for embedding in flat_embeddings]
+        return flat_embeddings
+
+    def embed(self, waveform, sample_rate):
+        """
+        Embed a single waveform.
+
+        Returns:
+        - The flattened embedding.
+        """
+        return self.embed_batch([waveform], sample_rate)[0]
+
+
+_default_embedder = None
+
+
+def get_default_embedder():
+    """
+    Return the shared embedder (music, 512-dim), loading the model on first use.
+    """
+    global _default_embedder
+    if _default_embedder is None:
+        _default_embedder = OpenL3Embedder()
+    return _default_embedder
 
 
 def extract_audio_embedding(audio_data, sample_rate):
@@ -18,20 +89,9 @@ def extract_audio_embedding(audio_data, sample_rate):
     Returns:
     - flat_embedding: The flattened audio embedding.
     """
-
-    # Set the desired embedding size
-    embedding_size = 512
-
     try:
-        # Extract embeddings using OpenL3
-        embedding, _ = openl3.get_audio_embedding(audio_data, sample_rate,
-                                                  content_type="music",
-                                                  embedding_size=embedding_size)
-
-        # Flatten the embedding
-        flat_embedding = np.ravel(embedding)
-
-        return flat_embedding
+        # Extract embeddings using the preloaded OpenL3 model
+        return get_default_embedder().embed(audio_data, sample_rate)
 
     except Exception as e:
         # Handle any errors that might occur during the embedding
@@ -73,13 +133,10 @@ def convert_audio_to_embedding(audio_segment):
     - embedding: The audio embedding.
     """
     try:
-        # Convert AudioSegment to bytes
-        audio_bytes = io.BytesIO()
-        audio_segment.export(audio_bytes, format='wav')
-        audio_bytes.seek(0)
-
-        # Load audio bytes with librosa
-        audio_data, sample_rate = librosa.load(audio_bytes, sr=None)
+        # Read the samples straight out of the AudioSegment, scaled to [-1.0, +1.0]
+        audio_data = np.array(audio_segment.get_array_of_samples(), dtype=np.float32)
+        audio_data = audio_data.reshape(-1, audio_segment.channels) / float(1 << (8 * audio_segment.sample_width - 1))
+        sample_rate = audio_segment.frame_rate
 
         # Extract audio embedding
         embedding = extract_audio_embedding(audio_data, sample_rate)
@@ -91,15 +148,16 @@ def convert_audio_to_embedding(audio_segment):
         return None
 
 
-# Example usage:
-# Assuming you have an AudioSegment object named 'audio_segment'
-audio_segment = AudioSegment.from_file("/content/drive/MyDrive/AD-Blocker Project/DEMO files/first_pod_segment.wav")
+if __name__ == "__main__":
+    # Example usage:
+    # Assuming you have an AudioSegment object named 'audio_segment'
+    audio_segment = AudioSegment.from_file("/content/drive/MyDrive/AD-Blocker Project/DEMO files/first_pod_segment.wav")
 
-embedding = convert_audio_to_embedding(audio_segment)
-if embedding is not None:
-    print("Successfully converted audio to embedding.")
-else:
-    print("Conversion to embedding failed.")
+    embedding = convert_audio_to_embedding(audio_segment)
+    if embedding is not None:
+        print("Successfully converted audio to embedding.")
+    else:
+        print("Conversion to embedding failed.")
 
 
 
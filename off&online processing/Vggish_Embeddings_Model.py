@@ -32,24 +32,32 @@ def convert_to_2d_array(three_d_array):
 
     return two_d_array
 
-def extract_vggish_embeddings(audio_file): #, sample_rate=22050
-    # Preprocess the numpy array into Mel spectrograms
-    mel_features = vggish_input.wavfile_to_examples(audio_file)
-
+def embed_examples(mel_features):
     # Run VGGish model on preprocessed audio
     embedding_batch = sess.run('vggish/embedding:0',
                                feed_dict={'vggish/input_features:0': mel_features})
-    #flattened_embeddings = convert_to_2d_array(embedding_batch)
 
     # Flatten the embeddings to fit the SVC model input
-    flattened_embeddings = embedding_batch.flatten()
+    return embedding_batch.flatten()
+
+
+def extract_vggish_embeddings(audio_file): #, sample_rate=22050
+    # Preprocess the numpy array into Mel spectrograms
+    mel_features = vggish_input.wavfile_to_examples(audio_file)
+
+    flattened_embeddings = embed_examples(mel_features)
 
     print("final shape ", flattened_embeddings.shape)
-    # Load the pre-trained VGGish model
 
     return flattened_embeddings
 
 
+def extract_vggish_embeddings_from_waveform(waveform, sample_rate):
+    # Same as extract_vggish_embeddings, for audio that is already in memory (samples in [-1.0, +1.0])
+    mel_features = vggish_input.waveform_to_examples(waveform, sample_rate)
+    return embed_examples(mel_features)
+
+
 # def extract_vggish_embeddings(audio_buffer, sample_rate=22050):
 #     # Preprocess the numpy array into Mel spectrograms
 #     mel_features = vggish_input.waveform_to_examples(audio_buffer, sample_rate)
@@ -0,0 +1,16 @@
+"""Anomaly-detection approach to ad blocking: scorers fitted on podcast embeddings only."""
+from anomaly.base import read_settings
+from anomaly.isolation_forest import IsolationForestScorer
+from anomaly.knn import KnnScorer
+
+SCORERS = {scorer_class.kind: scorer_class for scorer_class in (IsolationForestScorer, KnnScorer)}
+
+
+def load_scorer(directory):
+    """
+    Load any scorer saved with save(), picking the class from its settings.
+
+    :param directory: Directory written by a scorer's save().
+    :return: Fitted scorer.
+    """
+    return SCORERS[read_settings(directory)['kind']].load(directory)
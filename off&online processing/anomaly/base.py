@@ -0,0 +1,46 @@
+import json
+import os
+
+
+class AnomalyScorer:
+    """
+    Base class for anomaly scorers over embedding matrices.
+
+    Scorers are fitted on normal (podcast) embeddings. score_batch returns one score per
+    window where higher means more ad-like, and windows scoring above threshold are ads.
+    """
+    kind = None
+
+    def __init__(self):
+        self.threshold = None
+
+    def fit(self, normal_embeddings, anomaly_embeddings=None):
+        raise NotImplementedError
+
+    def score_batch(self, embeddings):
+        raise NotImplementedError
+
+    def predict(self, embeddings):
+        """
+        :param embeddings: np.ndarray of shape (n_windows, embedding_dim).
+        :return: np.ndarray of ints, 1 for ads and 0 for content.
+        """
+        return (self.score_batch(embeddings) > self.threshold).astype(int)
+
+    def save(self, directory):
+        raise NotImplementedError
+
+    def _write_settings(self, directory, settings):
+        os.makedirs(directory, exist_ok=True)
+        settings = dict(settings, kind=self.kind, threshold=self.threshold)
+        with open(os.path.join(directory, 'scorer.json'), 'w') as f:
+            json.dump(settings, f, indent=2)
+
+
+def read_settings(directory):
+    """
+    :param directory: Directory written by a scorer's save().
+    :return: Dictionary of the scorer settings, including its 'kind'.
+    """
+    with open(os.path.join(directory, 'scorer.json')) as f:
+        return json.load(f)
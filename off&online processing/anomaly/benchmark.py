@@ -0,0 +1,88 @@
+import argparse
+import time
+
+import numpy as np
+
+from anomaly import IsolationForestScorer, KnnScorer
+from fast_classifier import load_classifier, load_embeddings_folder
+from knn_detector import hnswlib, faiss
+
+
+def benchmark_scorer(name, scorer, normal_train, ad_train, test_embeddings, test_labels, repeats=3):
+    """
+    Fit a scorer and time batch scoring on the test embeddings.
+
+    :return: Dictionary with fit time, scoring throughput and test accuracy.
+    """
+    start = time.perf_counter()
+    scorer.fit(normal_train, ad_train)
+    fit_seconds = time.perf_counter() - start
+
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predictions = scorer.predict(test_embeddings)
+        best = min(best, time.perf_counter() - start)
+
+    return {'backend': name, 'fit_seconds': fit_seconds,
+            'windows_per_second': len(test_embeddings) / best,
+            'accuracy': float(np.mean(predictions == test_labels))}
+
+
+def benchmark_classifier(name, model, test_embeddings, test_labels, repeats=3):
+    """
+    Time an already trained classifier (e.g. the SVM) on the same test set, for comparison.
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predictions = model.predict(test_embeddings)
+        best = min(best, time.perf_counter() - start)
+    return {'backend': name, 'fit_seconds': None,
+            'windows_per_second': len(test_embeddings) / best,
+            'accuracy': float(np.mean(predictions == test_labels))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark anomaly scorer throughput per backend")
+    parser.add_argument("train_podcasts", help="folder of podcast training embeddings (.npy)")
+    parser.add_argument("train_ads", help="folder of ad training embeddings (.npy)")
+    parser.add_argument("test_podcasts", help="folder of podcast test embeddings (.npy)")
+    parser.add_argument("test_ads", help="folder of ad test embeddings (.npy)")
+    parser.add_argument("--svm", help="optional SVM model (.pkl or .npz) to compare against")
+    parser.add_argument("--neighbors", type=int, default=11)
+    args = parser.parse_args()
+
+    normal_train = load_embeddings_folder(args.train_podcasts).astype(np.float32)
+    ad_train = load_embeddings_folder(args.train_ads).astype(np.float32)
+    test_podcasts = load_embeddings_folder(args.test_podcasts).astype(np.float32)
+    test_ads = load_embeddings_folder(args.test_ads).astype(np.float32)
+    test_embeddings = np.concatenate((test_podcasts, test_ads))
+    test_labels = np.concatenate((np.zeros(len(test_podcasts), dtype=int), np.ones(len(test_ads), dtype=int)))
+
+    scorers = {'isolation_forest': IsolationForestScorer(n_jobs=-1),
+               'knn_brute': KnnScorer(args.neighbors, backend='brute')}
+    if hnswlib is not None:
+        scorers['knn_hnsw'] = KnnScorer(args.neighbors, backend='hnsw', max_elements=len(normal_train))
+    if faiss is not None:
+        # IvfPqIndex.min_training_size: ~39 training points per coarse list and per PQ centroid
+        max_clusters = len(normal_train) // 39
+        if max_clusters >= 2:
+            bits = min(8, int(np.log2(max_clusters)))
+            scorers['knn_ivfpq'] = KnnScorer(args.neighbors, backend='ivfpq', nlist=min(1024, max_clusters), bits=bits)
+        else:
+            print(f"Skipping knn_ivfpq: {len(normal_train)} podcast windows are too few to train IVF-PQ")
+
+    results = [benchmark_scorer(name, scorer, normal_train, ad_train, test_embeddings, test_labels)
+               for name, scorer in scorers.items()]
+    if args.svm:
+        results.append(benchmark_classifier('svm', load_classifier(args.svm), test_embeddings, test_labels))
+
+    for result in results:
+        fit = f"{result['fit_seconds']:.2f} s" if result['fit_seconds'] is not None else "-"
+        print(f"{result['backend']:>18}: fit {fit:>9}, {result['windows_per_second']:>12,.0f} windows/s, "
+              f"accuracy {result['accuracy']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
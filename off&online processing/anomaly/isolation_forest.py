@@ -0,0 +1,55 @@
+import os
+
+import joblib
+from sklearn.ensemble import IsolationForest
+
+from anomaly.base import AnomalyScorer, read_settings
+
+
+class IsolationForestScorer(AnomalyScorer):
+    """
+    Isolation Forest from the 'Only Isolation Forest for Vggish' notebook.
+    """
+    kind = 'isolation_forest'
+
+    def __init__(self, n_estimators=100, contamination='auto', n_jobs=None, random_state=None):
+        """
+        :param n_estimators: Number of trees.
+        :param contamination: Passed to sklearn's IsolationForest; 'auto' as in the notebook.
+        :param n_jobs: Parallel jobs for fitting and scoring.
+        :param random_state: Seed for reproducible forests.
+        """
+        super().__init__()
+        self.model = IsolationForest(n_estimators=n_estimators, contamination=contamination,
+                                     n_jobs=n_jobs, random_state=random_state)
+
+    def fit(self, normal_embeddings, anomaly_embeddings=None):
+        """
+        Fit the forest on normal embeddings. The threshold is the forest's own offset, which
+        matches sklearn's predict().
+
+        :param normal_embeddings: np.ndarray of shape (n_windows, embedding_dim).
+        :param anomaly_embeddings: Unused; accepted for a uniform fit() signature.
+        """
+        self.model.fit(normal_embeddings)
+        self.threshold = float(-self.model.offset_)
+        return self
+
+    def score_batch(self, embeddings):
+        """
+        :param embeddings: np.ndarray of shape (n_windows, embedding_dim).
+        :return: Negated sklearn anomaly score, so that higher means more ad-like.
+        """
+        return -self.model.score_samples(embeddings)
+
+    def save(self, directory):
+        self._write_settings(directory, {})
+        joblib.dump(self.model, os.path.join(directory, 'isolation_forest.joblib'))
+
+    @classmethod
+    def load(cls, directory):
+        settings = read_settings(directory)
+        scorer = cls.__new__(cls)
+        scorer.model = joblib.load(os.path.join(directory, 'isolation_forest.joblib'))
+        scorer.threshold = settings['threshold']
+        return scorer
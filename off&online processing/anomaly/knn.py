@@ -0,0 +1,74 @@
+import numpy as np
+
+from anomaly.base import AnomalyScorer, read_settings
+from knn_detector import KnnAnomalyDetector, create_index
+
+
+class KnnScorer(AnomalyScorer):
+    """
+    Mean k-nearest-neighbor distance to normal embeddings, from the KNN notebooks.
+    """
+    kind = 'knn'
+
+    def __init__(self, n_neighbors=11, backend=None, normal_percentile=99.0, **index_params):
+        """
+        :param n_neighbors: Number of neighbors averaged in the score.
+        :param backend: Index backend passed to knn_detector.create_index ('hnsw', 'ivfpq', 'brute').
+        :param normal_percentile: Without ad embeddings, the threshold is this percentile of the normal scores.
+        :param index_params: Extra index settings, e.g. ef or nprobe.
+        """
+        super().__init__()
+        self.n_neighbors = n_neighbors
+        self.normal_percentile = normal_percentile
+        self.backend = backend
+        self.index_params = index_params
+        self.detector = None
+
+    def fit(self, normal_embeddings, anomaly_embeddings=None):
+        """
+        Index the normal embeddings and set the threshold: the way the notebooks do if ad
+        embeddings are given, otherwise at normal_percentile of the normal windows' own scores.
+
+        :param normal_embeddings: np.ndarray of shape (n_windows, embedding_dim).
+        :param anomaly_embeddings: Optional ad embeddings from the training set.
+        """
+        index = create_index(normal_embeddings.shape[1], self.backend, **self.index_params)
+        self.detector = KnnAnomalyDetector(index, self.n_neighbors).fit(normal_embeddings)
+        if anomaly_embeddings is not None:
+            self.detector.calculate_thresholds(anomaly_embeddings, normal_embeddings)
+        else:
+            self.detector.threshold = float(np.percentile(self.normal_scores(normal_embeddings),
+                                                          self.normal_percentile))
+        self.threshold = self.detector.threshold
+        return self
+
+    def normal_scores(self, normal_embeddings, max_windows=10000, random_state=0):
+        """
+        Leave-one-out scores of indexed normal windows: each window's nearest hit is itself, so
+        one extra neighbor is searched and the first one dropped.
+
+        :param normal_embeddings: The embeddings passed to fit().
+        :param max_windows: Score a random sample of at most this many windows.
+        :return: np.ndarray of scores.
+        """
+        rows = np.arange(len(normal_embeddings))
+        if len(rows) > max_windows:
+            rows = np.sort(np.random.default_rng(random_state).choice(rows, max_windows, replace=False))
+        distances, _ = self.detector.index.search(normal_embeddings[rows], self.n_neighbors + 1)
+        return distances[:, 1:].mean(axis=1)
+
+    def score_batch(self, embeddings):
+        return self.detector.score_batch(embeddings)
+
+    def save(self, directory):
+        self._write_settings(directory, {'n_neighbors': self.n_neighbors})
+        self.detector.save(directory)
+
+    @classmethod
+    def load(cls, directory):
+        settings = read_settings(directory)
+        scorer = cls(settings['n_neighbors'])
+        scorer.detector = KnnAnomalyDetector.load(directory)
+        scorer.backend = scorer.detector.index.backend
+        scorer.threshold = settings['threshold']
+        return scorer
@@ -0,0 +1,91 @@
+import numpy as np
+
+import vggish_input
+from anomaly import load_scorer
+from audio_frontend import waveform_to_log_mel_examples
+from audio_processor import embed_log_mel_windows, embed_waveforms
+
+
+class AnomalyProcessor:
+    """
+    Drop-in replacement for AudioProcessor that flags ads with an anomaly scorer instead of the SVM.
+
+    Uses the same VGGish embedder as AudioProcessor, so it plugs into RealtimeDetector, the cascade
+    and the GUIs. Scores are the scorer's (higher means more ad-like) and windows above the
+    scorer's threshold are ads.
+    """
+    def __init__(self, scorer_directory):
+        """
+        :param scorer_directory: Directory written by a scorer's save().
+        """
+        self.scorer = load_scorer(scorer_directory)
+
+    @property
+    def decision_threshold(self):
+        return self.scorer.threshold
+
+    # Anomaly scores are unbounded distances or negated forest scores
+    score_range = (-np.inf, np.inf)
+
+    def detect_ads(self, file_path):
+        """
+        :param file_path: Path to a 16-bit WAV file.
+        :return: True if an ad is detected, False otherwise.
+        """
+        return bool(self.detect_ads_in_examples([vggish_input.wavfile_to_examples(file_path)])[0])
+
+    def detect_ads_in_waveform(self, waveform, sample_rate):
+        """
+        :param waveform: np.ndarray of int16 samples or floats in [-1.0, +1.0], mono or (frames, channels).
+        :param sample_rate: Sample rate of the waveform.
+        :return: True if an ad is detected, False otherwise.
+        """
+        return bool(self.detect_ads_batch([waveform], sample_rate)[0])
+
+    def detect_ads_batch(self, waveforms, sample_rate):
+        """
+        :param waveforms: Sequence of windows of equal length.
+        :param sample_rate: Sample rate of the windows.
+        :return: np.ndarray of booleans, True where an ad was detected.
+        """
+        return self.score_ads_batch(waveforms, sample_rate) > self.decision_threshold
+
+    def detect_ads_in_examples(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays with the same number of examples.
+        :return: np.ndarray of booleans, True where an ad was detected.
+        """
+        return self.score_ads_in_examples(window_examples) > self.decision_threshold
+
+    def score_ads_in_waveform(self, waveform, sample_rate):
+        return self.score_ads_in_waveform_with_threshold(waveform, sample_rate)[0]
+
+    def score_ads_in_waveform_with_threshold(self, waveform, sample_rate):
+        """
+        :param waveform: np.ndarray as accepted by detect_ads_in_waveform.
+        :param sample_rate: Sample rate of the waveform.
+        :return: (anomaly score, decision threshold).
+        """
+        scores, threshold, _ = self.score_ads_in_examples_with_threshold(
+            [waveform_to_log_mel_examples(waveform, sample_rate)])
+        return float(scores[0]), threshold
+
+    def score_ads_batch(self, waveforms, sample_rate):
+        """
+        :param waveforms: Sequence of windows of equal length.
+        :param sample_rate: Sample rate of the windows.
+        :return: np.ndarray of anomaly scores.
+        """
+        return self.scorer.score_batch(embed_waveforms(waveforms, sample_rate))
+
+    def score_ads_in_examples(self, window_examples):
+        return self.score_ads_in_examples_with_threshold(window_examples)[0]
+
+    def score_ads_in_examples_with_threshold(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays with the same number of examples (may be empty).
+        :return: (np.ndarray of anomaly scores, decision threshold, score range).
+        """
+        scorer = self.scorer
+        scores = scorer.score_batch(embed_log_mel_windows(window_examples)) if len(window_examples) else np.empty(0)
+        return scores, scorer.threshold, self.score_range
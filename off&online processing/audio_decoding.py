@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import wave
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+FFMPEG = shutil.which('ffmpeg')
+FFPROBE = shutil.which('ffprobe')
+BLOCK_FRAMES = 65536
+# Output format of the ffmpeg fallback when the caller gives none, so no ffprobe run is needed per file
+FFMPEG_SAMPLE_RATE = 44100
+FFMPEG_CHANNELS = 2
+# Files decoded by one ffmpeg process in decode_files
+FFMPEG_BATCH_FILES = 16
+
+
+class AudioStream:
+    """
+    Decoded audio of one file as a stream of int16 (frames, channels) blocks.
+
+    libsndfile decodes in process (WAV, FLAC, OGG, and MP3 from libsndfile 1.1 on), straight
+    into NumPy buffers. Anything it can't open is piped as raw PCM out of an ffmpeg process,
+    read block by block; nothing is ever held as one big Python bytestring. For many files,
+    decode_files batches the ffmpeg fallback instead of starting a process per file.
+    """
+    def __init__(self, path, block_frames=BLOCK_FRAMES, sample_rate=None, channels=None):
+        """
+        :param path: Audio file.
+        :param block_frames: Frames per block.
+        :param sample_rate: Resample to this rate (ffmpeg backend only; libsndfile keeps the file's rate).
+        :param channels: Downmix to this many channels (ffmpeg backend only).
+            Without both, ffprobe is run first to read the file's own format.
+        :raises RuntimeError: If no backend can decode the file.
+        """
+        self.path = path
+        self.block_frames = block_frames
+        self.frames = None
+        self._sound_file = None
+        self._process = None
+        if sf is not None:
+            try:
+                self._sound_file = sf.SoundFile(path)
+            except RuntimeError:  # sf.LibsndfileError is a RuntimeError
+                self._sound_file = None
+        if self._sound_file is not None:
+            self.backend = 'soundfile'
+            self.sample_rate = self._sound_file.samplerate
+            self.channels = self._sound_file.channels
+            self.frames = self._sound_file.frames
+        elif FFMPEG is not None:
+            self.backend = 'ffmpeg'
+            if sample_rate is None or channels is None:
+                probed_rate, probed_channels = probe(path)
+                sample_rate, channels = sample_rate or probed_rate, channels or probed_channels
+            self.sample_rate, self.channels = sample_rate, channels
+            self._process = subprocess.Popen([FFMPEG, '-v', 'error', '-nostdin', '-i', path, '-f', 's16le',
+                                              '-acodec', 'pcm_s16le', '-ar', str(sample_rate), '-ac', str(channels),
+                                              '-'], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                             bufsize=block_frames * channels * 2)
+        else:
+            raise RuntimeError(f"Can't decode {path}: libsndfile can't open it and ffmpeg is not installed")
+
+    def __iter__(self):
+        if self._sound_file is not None:
+            block = np.empty((self.block_frames, self.channels), dtype=np.int16)
+            while True:
+                # read() fills the preallocated block; a copy goes out so the buffer can be reused
+                frames = self._sound_file.read(self.block_frames, dtype='int16', always_2d=True, out=block)
+                if not len(frames):
+                    break
+                yield frames.copy()
+        else:
+            block_bytes = self.block_frames * self.channels * 2
+            while True:
+                # Buffered reads return whole blocks until the end of the stream
+                data = self._process.stdout.read(block_bytes)
+                if not data:
+                    break
+                yield np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+            if self._process.wait() != 0:
+                error = self._process.stderr.read().decode(errors='replace')
+                raise RuntimeError(f"ffmpeg failed on {self.path}: {error}")
+        self.close()
+
+    def close(self):
+        if self._sound_file is not None:
+            self._sound_file.close()
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def probe(path):
+    """
+    :return: (sample_rate, channels) of the first audio stream, read with ffprobe.
+    """
+    if FFPROBE is None:
+        raise RuntimeError("ffprobe is not installed")
+    output = subprocess.run([FFPROBE, '-v', 'error', '-select_streams', 'a:0', '-show_entries',
+                             'stream=sample_rate,channels', '-of', 'json', path],
+                            capture_output=True, check=True).stdout
+    stream = json.loads(output)['streams'][0]
+    return int(stream['sample_rate']), int(stream['channels'])
+
+
+def decode_file(path, block_frames=BLOCK_FRAMES, sample_rate=None, channels=None):
+    """
+    Decode a whole file into one array.
+
+    :param path: Audio file (WAV, MP3, FLAC, ...).
+    :param block_frames: See AudioStream.
+    :param sample_rate: See AudioStream.
+    :param channels: See AudioStream.
+    :return: (np.ndarray of int16 samples with shape (frames, channels), sample rate).
+    """
+    with AudioStream(path, block_frames, sample_rate, channels) as stream:
+        if stream.frames is not None:
+            # Known length: decode straight into the final array
+            samples = np.empty((stream.frames, stream.channels), dtype=np.int16)
+            position = 0
+            for block in stream:
+                samples[position:position + len(block)] = block
+                position += len(block)
+            return samples[:position], stream.sample_rate
+        blocks = list(stream)
+        if not blocks:
+            return np.empty((0, stream.channels), dtype=np.int16), stream.sample_rate
+        return np.concatenate(blocks), stream.sample_rate
+
+
+def soundfile_can_open(path):
+    """
+    :return: True if libsndfile can decode the file in process.
+    """
+    if sf is None:
+        return False
+    try:
+        sf.info(path)
+        return True
+    except RuntimeError:
+        return False
+
+
+def ffmpeg_decode_batch(paths, sample_rate, channels):
+    """
+    Decode several files with a single ffmpeg process: one input and one raw PCM output per file.
+
+    The process start-up, which dominates for short files, is paid once per batch instead of
+    once per file. ffmpeg stops at the first file it can't open, so callers should fall back
+    to decoding the files one by one when this raises.
+
+    :param paths: Audio files.
+    :param sample_rate: Output sample rate.
+    :param channels: Output channel count.
+    :return: List of np.ndarray of int16 samples with shape (frames, channels), in the order of paths.
+    :raises RuntimeError: If ffmpeg is missing or fails on any of the files.
+    """
+    if FFMPEG is None:
+        raise RuntimeError("ffmpeg is not installed")
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = [os.path.join(directory, f"{i}.s16") for i in range(len(paths))]
+        command = [FFMPEG, '-v', 'error', '-nostdin']
+        for path in paths:
+            command += ['-i', path]
+        for i, output in enumerate(outputs):
+            command += ['-map', f'{i}:a:0', '-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(sample_rate),
+                        '-ac', str(channels), output]
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace')}")
+        return [np.fromfile(output, dtype=np.int16).reshape(-1, channels) for output in outputs]
+
+
+def decode_files(paths, workers=4, block_frames=BLOCK_FRAMES, sample_rate=FFMPEG_SAMPLE_RATE,
+                 channels=FFMPEG_CHANNELS, batch_files=FFMPEG_BATCH_FILES):
+    """
+    Decode many files with a pool of decoders, yielding results in the order of paths.
+
+    Files libsndfile can open are decoded in process, one per task. The others go to ffmpeg
+    in batches of batch_files per process (see ffmpeg_decode_batch), at the given rate and
+    channel count so no ffprobe is needed. libsndfile and subprocess waits release the GIL,
+    so threads decode in parallel.
+
+    :param sample_rate: Output rate of the ffmpeg fallback; None probes each file (one more process per file).
+    :param channels: Output channels of the ffmpeg fallback; None probes each file.
+    :param batch_files: Files per ffmpeg process.
+    :return: Generator of (path, samples, sample rate), or (path, None, error message) for files that fail.
+    """
+    def decode(path):
+        try:
+            return (path,) + decode_file(path, block_frames, sample_rate, channels)
+        except Exception as e:
+            return path, None, repr(e)
+
+    def run(task):
+        indices, batch, use_ffmpeg = task
+        if use_ffmpeg and sample_rate is not None and channels is not None:
+            try:
+                return [(index, (path, samples, sample_rate)) for index, path, samples in
+                        zip(indices, batch, ffmpeg_decode_batch(batch, sample_rate, channels))]
+            except RuntimeError:
+                pass  # Decode one by one so the error lands on the file that caused it
+        return [(index, decode(path)) for index, path in zip(indices, batch)]
+
+    paths = list(paths)
+    tasks, ffmpeg_indices = [], []
+    for index, path in enumerate(paths):
+        if soundfile_can_open(path):
+            tasks.append(([index], [path], False))
+        else:
+            ffmpeg_indices.append(index)
+    for start in range(0, len(ffmpeg_indices), batch_files):
+        indices = ffmpeg_indices[start:start + batch_files]
+        tasks.append((indices, [paths[index] for index in indices], True))
+    tasks.sort(key=lambda task: task[0][0])
+
+    # Tasks finish out of order; results are held back until every earlier path is done
+    finished = {}
+    next_index = 0
+    with ThreadPool(workers) as pool:
+        for results in pool.imap_unordered(run, tasks):
+            finished.update(results)
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+
+def write_wav(path, samples, sample_rate):
+    """
+    Write int16 samples as a PCM WAV file with the standard library, so no decoder is needed to save.
+
+    :param samples: np.ndarray of int16 samples, mono or (frames, channels).
+    """
+    samples = np.ascontiguousarray(samples, dtype=np.int16)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1 if samples.ndim == 1 else samples.shape[1])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode audio files with libsndfile, falling back to ffmpeg")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sample-rate", type=int, default=FFMPEG_SAMPLE_RATE,
+                        help="output rate of the ffmpeg fallback")
+    parser.add_argument("--channels", type=int, default=FFMPEG_CHANNELS,
+                        help="output channels of the ffmpeg fallback")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    total_seconds = 0.0
+    for path, samples, result in decode_files(args.files, args.workers, sample_rate=args.sample_rate,
+                                              channels=args.channels):
+        if samples is None:
+            print(f"{path}: failed, {result}")
+            continue
+        total_seconds += len(samples) / result
+        print(f"{path}: {len(samples) / result:.1f} s, {samples.shape[1]} channels at {result} Hz")
+    elapsed = time.time() - start_time
+    print(f"Decoded {total_seconds:.0f} s of audio in {elapsed:.1f} s "
+          f"({total_seconds / max(elapsed, 1e-9):.0f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
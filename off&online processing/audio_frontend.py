@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import resampy
+
+import vggish_input
+import vggish_params
+
+
+def to_vggish_waveform(waveform, sample_rate):
+    """
+    Downmix, scale and resample captured audio to the mono float waveform VGGish expects, in one stage.
+
+    Audio captured at 16 kHz mono only pays for the int16 -> float conversion; everything else
+    does a single float32 downmix pass before resampling, instead of the float64 copy, channel
+    mean and resample that waveform_to_examples would otherwise run.
+
+    :param waveform: np.ndarray of int16 samples or floats in [-1.0, +1.0], mono or (frames, channels).
+    :param sample_rate: Sample rate of the waveform.
+    :return: 1-D float32 np.ndarray at vggish_params.SAMPLE_RATE.
+    """
+    scale = 1.0 / 32768.0 if waveform.dtype == np.int16 else 1.0
+    if waveform.ndim > 1 and waveform.shape[1] == 1:
+        waveform = waveform[:, 0]
+    if waveform.ndim > 1:
+        mono = waveform.mean(axis=1, dtype=np.float32)
+        mono *= scale
+    else:
+        mono = np.multiply(waveform, scale, dtype=np.float32)
+    if sample_rate != vggish_params.SAMPLE_RATE:
+        mono = resampy.resample(mono, sample_rate, vggish_params.SAMPLE_RATE)
+    return mono
+
+
+def waveform_to_log_mel_examples(waveform, sample_rate):
+    """
+    Compute the VGGish log-mel examples of a window without loading the VGGish model.
+
+    :param waveform: np.ndarray as accepted by to_vggish_waveform.
+    :param sample_rate: Sample rate of the waveform.
+    :return: np.ndarray of shape (num_examples, vggish_params.NUM_FRAMES, vggish_params.NUM_BANDS).
+    """
+    return vggish_input.waveform_to_examples(to_vggish_waveform(waveform, sample_rate), vggish_params.SAMPLE_RATE)
+
+
+def load_window_folder(directory):
+    """
+    :param directory: Folder of 16-bit WAV window files (e.g. a train/test folder from Audio_Sets).
+    :return: List of per-window log-mel arrays, in file name order.
+    """
+    return [vggish_input.wavfile_to_examples(os.path.join(directory, filename))
+            for filename in sorted(os.listdir(directory)) if filename.endswith('.wav')]
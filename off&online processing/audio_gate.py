@@ -0,0 +1,137 @@
+import threading
+import numpy as np
+
+
+class AudioGate:
+    """
+    Pass-through gate that sits in the audio path: input -> delay line -> gain stage -> output.
+
+    Every sample gets an absolute index when it enters the gate. Detections are reported
+    against those indices with mark(), so an ad window that is classified after it was
+    captured can still be silenced as long as it hasn't left the delay line yet. Making the
+    delay longer than window + processing time turns it into a look-ahead buffer: on an ad
+    onset the gate can also reach back into the preceding window, which usually holds the
+    first seconds of the ad.
+    """
+    def __init__(self, sample_rate, channels, delay_seconds, fade_ms=20, duck_gain=0.0,
+                 onset_lookback_seconds=0.0):
+        """
+        Initialize the gate.
+
+        :param sample_rate: Sample rate of the stream.
+        :param channels: Number of interleaved channels in the stream.
+        :param delay_seconds: Length of the delay line, at least the detection latency.
+        :param fade_ms: Length of the cross-fade ramp between content and ad gain.
+        :param duck_gain: Gain applied to ad regions (0.0 mutes, e.g. 0.1 ducks).
+        :param onset_lookback_seconds: How far before an ad window to extend the gating when an ad starts.
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.delay_samples = int(round(delay_seconds * sample_rate))
+        self.fade_samples = max(1, int(fade_ms * sample_rate / 1000))
+        self.duck_gain = duck_gain
+        self.onset_lookback_samples = int(round(onset_lookback_seconds * sample_rate))
+
+        self.audio_ring = np.zeros((self.delay_samples, channels), dtype=np.float32)
+        self.target_ring = np.ones(self.delay_samples, dtype=np.float32)
+        self.samples_written = 0
+        self.live_target = 1.0
+        self.in_ad = False
+        self.current_gain = 1.0
+        self.leaked_samples = 0
+        self.max_decision_lag = 0
+        self.lock = threading.Lock()
+
+    @property
+    def latency_seconds(self):
+        """
+        :return: Playback delay added by the gate, in seconds.
+        """
+        return self.delay_samples / self.sample_rate
+
+    @property
+    def memory_bytes(self):
+        """
+        :return: Memory held by the delay line and its gain targets, in bytes.
+        """
+        return self.audio_ring.nbytes + self.target_ring.nbytes
+
+    def report(self):
+        """
+        :return: One-line summary of the buffer size, added latency and observed decision lag.
+        """
+        return (f"Playback delay {self.latency_seconds:.1f} s, "
+                f"buffer {self.memory_bytes / 2 ** 20:.1f} MiB, "
+                f"worst decision lag {self.max_decision_lag / self.sample_rate:.2f} s, "
+                f"ad audio leaked {self.leaked_samples / self.sample_rate:.2f} s")
+
+    def process(self, block):
+        """
+        Push a block of captured audio and return the delayed, gated block.
+
+        :param block: np.ndarray of shape (frames, channels) or flat interleaved samples; int16 or float.
+        :return: Block of the same shape and dtype, delayed by delay_samples.
+        """
+        dtype = block.dtype
+        frames = block.reshape(-1, self.channels).astype(np.float32)
+        num_frames = len(frames)
+        assert num_frames <= self.delay_samples, 'Block longer than the delay line'
+
+        with self.lock:
+            positions = (self.samples_written + np.arange(num_frames)) % self.delay_samples
+            delayed = self.audio_ring[positions]
+            targets = self.target_ring[positions]
+
+            self.audio_ring[positions] = frames
+            self.target_ring[positions] = self.live_target
+            self.samples_written += num_frames
+
+        delayed *= self._gain_envelope(targets)[:, np.newaxis]
+        if np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            delayed = np.clip(np.round(delayed), info.min, info.max)
+        return delayed.astype(dtype).reshape(block.shape)
+
+    def _gain_envelope(self, targets):
+        # Ramp linearly towards each target, one change point at a time
+        envelope = np.empty(len(targets), dtype=np.float32)
+        step = 1.0 / self.fade_samples
+        change_points = np.flatnonzero(np.diff(targets)) + 1
+        for start, end in zip(np.r_[0, change_points], np.r_[change_points, len(targets)]):
+            target = targets[start]
+            ramp = np.arange(1, end - start + 1, dtype=np.float32) * step
+            if target >= self.current_gain:
+                envelope[start:end] = np.minimum(self.current_gain + ramp, target)
+            else:
+                envelope[start:end] = np.maximum(self.current_gain - ramp, target)
+            self.current_gain = float(envelope[end - 1])
+        return envelope
+
+    def mark(self, start_sample, end_sample, is_ad):
+        """
+        Report the decision for a window of input samples.
+
+        Samples still in the delay line are retargeted; samples that were already played
+        can't be fixed and are counted in leaked_samples. The decision is carried forward
+        to everything captured after the window until the next mark. When this is the first
+        ad window after content, the gating starts onset_lookback_seconds earlier.
+
+        :param start_sample: Absolute index of the first sample of the window.
+        :param end_sample: Absolute index one past the last sample of the window.
+        :param is_ad: True if the window was classified as an ad.
+        """
+        target = self.duck_gain if is_ad else 1.0
+        with self.lock:
+            self.max_decision_lag = max(self.max_decision_lag, self.samples_written - end_sample)
+            oldest_unplayed = max(0, self.samples_written - self.delay_samples)
+            if is_ad and oldest_unplayed > start_sample:
+                self.leaked_samples += min(oldest_unplayed, end_sample) - start_sample
+            if is_ad and not self.in_ad:
+                start_sample = max(0, start_sample - self.onset_lookback_samples)
+            first = max(start_sample, oldest_unplayed)
+
+            if self.samples_written > first:
+                positions = np.arange(first, self.samples_written) % self.delay_samples
+                self.target_ring[positions] = target
+            self.live_target = target
+            self.in_ad = is_ad
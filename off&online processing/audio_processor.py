@@ -0,0 +1,315 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import vggish_params
+from audio_frontend import to_vggish_waveform, waveform_to_log_mel_examples
+from calibration import classifier_scores, load_calibrator
+from embedding_reduction import EmbeddingReducer
+from fast_classifier import load_classifier
+from model_registry import load_model
+from Vggish_Embeddings_Model import embed_examples, extract_vggish_embeddings, extract_vggish_embeddings_from_waveform
+
+
+def embed_waveforms(waveforms, sample_rate):
+    """
+    Embed several windows of equal length with a single VGGish run.
+
+    :param waveforms: Sequence of windows, each as accepted by to_vggish_waveform.
+    :param sample_rate: Sample rate of the windows.
+    :return: np.ndarray of shape (n_windows, embedding_dim), flattened like extract_vggish_embeddings.
+    """
+    return embed_log_mel_windows([waveform_to_log_mel_examples(waveform, sample_rate) for waveform in waveforms])
+
+
+def embed_log_mel_windows(window_examples):
+    """
+    Embed windows whose log-mel examples are already computed, with a single VGGish run.
+
+    :param window_examples: List of per-window log-mel arrays with the same number of examples.
+    :return: np.ndarray of shape (n_windows, embedding_dim).
+    """
+    return embed_examples(np.concatenate(window_examples)).reshape(len(window_examples), -1)
+
+
+LoadedModel = namedtuple('LoadedModel', ['classifier', 'reducer', 'calibrator', 'metadata', 'threshold', 'path'])
+
+
+def load_processor_model(svm_model_path, reducer_path=None, window_seconds=None, threshold=None,
+                         calibrator_path=None):
+    """
+    Load everything AudioProcessor needs to score embeddings, as one immutable bundle.
+
+    :param svm_model_path: See AudioProcessor.
+    :param reducer_path: See AudioProcessor.
+    :param window_seconds: See AudioProcessor.
+    :param threshold: See AudioProcessor.
+    :param calibrator_path: See AudioProcessor.
+    :return: LoadedModel.
+    """
+    calibrator = load_calibrator(calibrator_path) if calibrator_path else None
+    if os.path.isdir(svm_model_path):
+        artifact = load_model(svm_model_path, embedder='vggish', window_seconds=window_seconds)
+        return LoadedModel(artifact.classifier, artifact.reducer, calibrator or artifact.calibrator,
+                           artifact.metadata, threshold, artifact.path)
+    reducer = EmbeddingReducer.load(reducer_path) if reducer_path else None
+    return LoadedModel(load_classifier(svm_model_path), reducer, calibrator, None, threshold, svm_model_path)
+
+
+class AudioProcessor:
+    """
+    Class for processing audio and detecting ads using a pre-trained SVM model.
+
+    Windows get a continuous ad score: the calibrated probability P(ad) when a calibrator is
+    loaded, otherwise the classifier's decision function. detect_* methods compare it with
+    the threshold; score_* methods return it for callers that apply their own.
+
+    The classifier, its reduction stage, calibrator and threshold live in a single LoadedModel
+    that reload() replaces in one assignment. Every detection call reads it once, so a window
+    that is being classified during a reload finishes on the model it started with.
+    """
+    def __init__(self, svm_model_path, reducer_path=None, window_seconds=None, threshold=None,
+                 calibrator_path=None):
+        """
+        Initialize the AudioProcessor with a pre-trained SVM model.
+
+        :param svm_model_path: Path to the SVM model file, either a joblib pickle or a .npz
+            model exported with fast_classifier (a single dot product per window), or a
+            model_registry directory (its reducer and metadata come with it).
+        :param reducer_path: Optional EmbeddingReducer (.npz) the model was trained behind.
+        :param window_seconds: Window length the caller classifies; registry models are checked against it.
+        :param threshold: Score above which a window is an ad; None for the default (0.5 for
+            probabilities, 0 for decision functions).
+        :param calibrator_path: Optional calibrator (.npz from calibration.py); registry models may carry their own.
+        """
+        self.window_seconds = window_seconds
+        self.reducer_path = reducer_path
+        self.calibrator_path = calibrator_path
+        self.model = load_processor_model(svm_model_path, reducer_path, window_seconds, threshold, calibrator_path)
+
+    @property
+    def svm_model(self):
+        return self.model.classifier
+
+    @property
+    def reducer(self):
+        return self.model.reducer
+
+    @property
+    def metadata(self):
+        return self.model.metadata
+
+    def reload(self, svm_model_path=None, reducer_path=None, threshold=None):
+        """
+        Load a new classifier (and/or threshold) and swap it in atomically.
+
+        The VGGish session is untouched, so this costs only the classifier load. If loading or
+        validation fails, the current model stays in place and the error is raised.
+
+        :param svm_model_path: New model path, or None to keep the current one (e.g. to change the threshold).
+        :param reducer_path: Reducer for a pickle/.npz model, or None to keep the current one.
+        :param threshold: New threshold, or None to keep the current one.
+        :return: The new LoadedModel.
+        """
+        current = self.model
+        if threshold is None:
+            threshold = current.threshold
+        if svm_model_path is None:
+            new_model = current._replace(threshold=threshold)
+        else:
+            reducer_path = reducer_path or self.reducer_path
+            new_model = load_processor_model(svm_model_path, reducer_path, self.window_seconds, threshold,
+                                             self.calibrator_path)
+            self.reducer_path = reducer_path
+        self.model = new_model
+        return new_model
+
+    @staticmethod
+    def reduce_with(model, embeddings):
+        if model.reducer is None:
+            return embeddings
+        return model.reducer.transform(embeddings).astype(np.float32)
+
+    @staticmethod
+    def is_probability(model):
+        return model.calibrator is not None or not hasattr(model.classifier, 'decision_function')
+
+    @staticmethod
+    def threshold_of(model):
+        if model.threshold is not None:
+            return model.threshold
+        return 0.5 if AudioProcessor.is_probability(model) else 0.0
+
+    @staticmethod
+    def score(model, embeddings):
+        """
+        :param model: LoadedModel to score with.
+        :param embeddings: np.ndarray of shape (n_windows, embedding_dim), before reduction.
+        :return: np.ndarray of ad scores, one per window, in a single vectorized pass.
+        """
+        scores = classifier_scores(model.classifier, AudioProcessor.reduce_with(model, embeddings))
+        if model.calibrator is not None:
+            scores = model.calibrator.transform(scores)
+        return scores
+
+    @staticmethod
+    def classify(model, embeddings):
+        """
+        :param model: LoadedModel to classify with.
+        :param embeddings: np.ndarray of shape (n_windows, embedding_dim), before reduction.
+        :return: np.ndarray of booleans, True where an ad was detected.
+        """
+        return AudioProcessor.score(model, embeddings) > AudioProcessor.threshold_of(model)
+
+    @property
+    def decision_threshold(self):
+        return self.threshold_of(self.model)
+
+    @staticmethod
+    def range_of(model):
+        return (0.0, 1.0) if AudioProcessor.is_probability(model) else (-np.inf, np.inf)
+
+    @property
+    def score_range(self):
+        """
+        :return: (lowest, highest) possible score, for windows decided without the classifier.
+        """
+        return self.range_of(self.model)
+
+    def reduce(self, embeddings):
+        """
+        Apply the reduction stage, if any, exactly as it was applied to the training embeddings.
+
+        :param embeddings: A flat window embedding or a (n_windows, embedding_dim) batch.
+        :return: Reduced embeddings, or the input unchanged without a reducer.
+        """
+        return self.reduce_with(self.model, embeddings)
+
+    def convert_to_embeddings(self, file_path):
+        """
+        Convert an audio file to VGGish embeddings.
+
+        :param file_path: Path to the audio file.
+        :return: Embeddings of the audio file.
+        """
+        embeddings = extract_vggish_embeddings(file_path)
+        return embeddings
+
+    def detect_ads(self, file_path):
+        """
+        Detect ads in the given audio file based on the embeddings.
+
+        :param file_path: Path to the audio file.
+        :return: True if ads are detected, False otherwise.
+        """
+        model = self.model
+        return self.classify(model, [self.convert_to_embeddings(file_path)])
+
+    def detect_ads_in_waveform(self, waveform, sample_rate):
+        """
+        Detect ads in audio that is already in memory, without going through a WAV file.
+
+        :param waveform: np.ndarray of int16 samples or floats in [-1.0, +1.0], mono or (frames, channels).
+        :param sample_rate: Sample rate of the waveform.
+        :return: True if ads are detected, False otherwise.
+        """
+        model = self.model
+        waveform = to_vggish_waveform(waveform, sample_rate)
+        embedding = extract_vggish_embeddings_from_waveform(waveform, vggish_params.SAMPLE_RATE)
+        return bool(self.classify(model, [embedding])[0])
+
+    def detect_ads_batch(self, waveforms, sample_rate):
+        """
+        Detect ads in several windows of equal length with one classifier call.
+
+        :param waveforms: Sequence of windows, each as accepted by detect_ads_in_waveform.
+        :param sample_rate: Sample rate of the windows.
+        :return: np.ndarray of booleans, True where an ad was detected.
+        """
+        model = self.model
+        return self.classify(model, embed_waveforms(waveforms, sample_rate))
+
+    def detect_ads_in_examples(self, window_examples):
+        """
+        Detect ads in windows whose log-mel examples are already computed (e.g. by a cascade's first stage).
+
+        :param window_examples: List of per-window log-mel arrays with the same number of examples.
+        :return: np.ndarray of booleans, True where an ad was detected.
+        """
+        model = self.model
+        return self.classify(model, embed_log_mel_windows(window_examples))
+
+    def score_ads_in_waveform(self, waveform, sample_rate):
+        """
+        :param waveform: np.ndarray as accepted by detect_ads_in_waveform.
+        :param sample_rate: Sample rate of the waveform.
+        :return: Ad score of the window (see the class docstring).
+        """
+        return self.score_ads_in_waveform_with_threshold(waveform, sample_rate)[0]
+
+    def score_ads_in_waveform_with_threshold(self, waveform, sample_rate):
+        """
+        Score a window and return the threshold of the model that scored it.
+
+        Reading decision_threshold separately could pick up a model hot-reloaded in between,
+        comparing e.g. a raw SVM margin with a calibrated model's 0.5.
+
+        :param waveform: np.ndarray as accepted by detect_ads_in_waveform.
+        :param sample_rate: Sample rate of the waveform.
+        :return: (ad score, decision threshold), both from one model snapshot.
+        """
+        model = self.model
+        waveform = to_vggish_waveform(waveform, sample_rate)
+        embedding = extract_vggish_embeddings_from_waveform(waveform, vggish_params.SAMPLE_RATE)
+        return float(self.score(model, [embedding])[0]), self.threshold_of(model)
+
+    def score_ads_batch(self, waveforms, sample_rate):
+        """
+        :param waveforms: Sequence of windows of equal length.
+        :param sample_rate: Sample rate of the windows.
+        :return: np.ndarray of ad scores.
+        """
+        model = self.model
+        return self.score(model, embed_waveforms(waveforms, sample_rate))
+
+    def score_ads_in_examples(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays with the same number of examples.
+        :return: np.ndarray of ad scores.
+        """
+        return self.score_ads_in_examples_with_threshold(window_examples)[0]
+
+    def score_ads_in_examples_with_threshold(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays with the same number of examples (may be empty).
+        :return: (np.ndarray of ad scores, decision threshold, score range), all from one model snapshot.
+        """
+        model = self.model
+        if len(window_examples):
+            scores = self.score(model, embed_log_mel_windows(window_examples))
+        else:
+            scores = np.empty(0)
+        return scores, self.threshold_of(model), self.range_of(model)
+
+
+def create_processor(model_path, window_seconds=None, calibrator_path=None, anomaly_path=None, head_path=None):
+    """
+    Build the detection backend selected by the GUIs and the headless engine.
+
+    :param model_path: See AudioProcessor; used when no other backend is selected.
+    :param window_seconds: See AudioProcessor.
+    :param calibrator_path: See AudioProcessor.
+    :param anomaly_path: Directory of a saved anomaly scorer; selects AnomalyProcessor instead of the SVM.
+    :param head_path: Distilled head (.npz); selects DistilledHeadProcessor instead of VGGish + SVM.
+    :return: AudioProcessor, AnomalyProcessor or DistilledHeadProcessor.
+    """
+    if anomaly_path and head_path:
+        raise ValueError("Select either an anomaly scorer or a distilled head, not both")
+    if anomaly_path:
+        from anomaly.processor import AnomalyProcessor
+        return AnomalyProcessor(anomaly_path)
+    if head_path:
+        from distilled_head import DistilledHeadProcessor
+        return DistilledHeadProcessor(head_path)
+    return AudioProcessor(model_path, window_seconds=window_seconds, calibrator_path=calibrator_path)
@@ -0,0 +1,218 @@
+import argparse
+import multiprocessing
+import os
+import re
+import time
+
+import numpy as np
+
+import vggish_params
+from embedding_store import STORE_FILE, EmbeddingStore
+
+SEGMENT_NUMBER = re.compile(r'_segment_(\d+)\.wav$')
+SET_TO_SPLIT = {'train': 'train', 'validation': 'validation', 'test': 'test'}
+
+# Per-process embedder, set up once by _init_worker
+_embed_files = None
+
+
+def _init_worker(embedder, reducer_path):
+    """
+    Load the embedding model once per worker process.
+    """
+    global _embed_files
+    if embedder == 'vggish':
+        import vggish_input
+        from Vggish_Embeddings_Model import embed_examples
+        from embedding_reduction import EmbeddingReducer
+
+        reducer = EmbeddingReducer.load(reducer_path) if reducer_path else None
+
+        def embed_files(paths):
+            examples = [vggish_input.wavfile_to_examples(path) for path in paths]
+            # One session run for the whole batch, split back per file
+            embeddings = embed_examples(np.concatenate(examples)).reshape(-1, vggish_params.EMBEDDING_SIZE)
+            if reducer is not None:
+                # Reduced frame by frame, exactly as AudioProcessor reduces at inference
+                embeddings = reducer.transform(embeddings.ravel()).astype(np.float32).reshape(len(embeddings), -1)
+            boundaries = np.cumsum([len(file_examples) for file_examples in examples])[:-1]
+            return [part.ravel() for part in np.split(embeddings, boundaries)]
+    else:
+        import soundfile as sf
+        from OpenL3_Embeddings_Model import OpenL3Embedder
+
+        openl3_embedder = OpenL3Embedder(reducer_path=reducer_path)
+
+        def embed_files(paths):
+            waveforms, rates = zip(*(sf.read(path) for path in paths))
+            if len(set(rates)) > 1:
+                return [openl3_embedder.embed(waveform, rate) for waveform, rate in zip(waveforms, rates)]
+            return openl3_embedder.embed_batch(waveforms, rates[0])
+    _embed_files = embed_files
+
+
+def _embed_chunk(chunk):
+    """
+    Worker task: embed a chunk of segment files.
+
+    :param chunk: List of (path, source, segment, split) tuples.
+    :return: (embedded rows, embeddings, failures) where failures are (path, error) pairs.
+    """
+    try:
+        return chunk, _embed_files([row[0] for row in chunk]), []
+    except Exception:
+        # Retry file by file so one unreadable segment doesn't lose the rest of the chunk
+        done, embeddings, failures = [], [], []
+        for row in chunk:
+            try:
+                embeddings.append(_embed_files([row[0]])[0])
+                done.append(row)
+            except Exception as e:
+                failures.append((row[0], repr(e)))
+        return done, embeddings, failures
+
+
+def read_manifest(manifest_path, audio_folder):
+    """
+    Read the segment manifest written by Audio_Subsections / Audio_Sets.
+
+    :param manifest_path: Parquet, Arrow, CSV or Excel file with 'Segment Name', 'Source File' and optionally 'Set'.
+    :param audio_folder: Folder holding the segment WAV files.
+    :return: List of (path, source, segment, split) tuples.
+    """
+    import pandas as pd
+
+    if manifest_path.endswith('.parquet'):
+        manifest = pd.read_parquet(manifest_path)
+    elif manifest_path.endswith(('.arrow', '.feather')):
+        manifest = pd.read_feather(manifest_path)
+    elif manifest_path.endswith('.csv'):
+        manifest = pd.read_csv(manifest_path)
+    else:
+        manifest = pd.read_excel(manifest_path)
+    splits = manifest['Set'] if 'Set' in manifest else ['unassigned'] * len(manifest)
+
+    rows = []
+    segments_seen = {}
+    for segment_name, source, split in zip(manifest['Segment Name'], manifest['Source File'], splits):
+        # Segment numbers come from the file name, falling back to the manifest order within the source
+        match = SEGMENT_NUMBER.search(segment_name)
+        segments_seen[source] = segments_seen.get(source, -1) + 1
+        segment = int(match.group(1)) - 1 if match else segments_seen[source]
+        rows.append((os.path.join(audio_folder, segment_name), str(source), segment,
+                     SET_TO_SPLIT.get(split, 'unassigned')))
+    return rows
+
+
+def completed_segments(store_directory):
+    """
+    The store itself is the done-manifest: a (source, segment) pair is done once its row is committed,
+    so the two can never disagree after a crash.
+
+    :return: Set of (source, segment) pairs already in the store.
+    """
+    if not os.path.exists(os.path.join(store_directory, STORE_FILE)):
+        return set()
+    store = EmbeddingStore(store_directory)
+    sources = np.asarray(store.sources, dtype=object)[store.index['source']]
+    return set(zip(sources.tolist(), store.index['segment'].tolist()))
+
+
+def failed_segments(store_directory):
+    """
+    Segments that failed or could not be stored (e.g. short remainders) are done too: they are
+    listed in failed.txt and not retried on every restart.
+
+    :return: Set of segment paths listed in the store's failed.txt.
+    """
+    failures_path = os.path.join(store_directory, 'failed.txt')
+    if not os.path.exists(failures_path):
+        return set()
+    with open(failures_path) as failures_file:
+        return {line.split('\t', 1)[0] for line in failures_file if line.strip()}
+
+
+def run_extraction(rows, store_directory, label, embedder='vggish', workers=None, chunk_size=64,
+                   reducer_path=None, commit_rows=4096, retry_failed=False):
+    """
+    Embed every segment not yet in the store, in parallel, committing to the store as results arrive.
+
+    :param rows: (path, source, segment, split) tuples, e.g. from read_manifest().
+    :param store_directory: Embedding store to fill (created on the first result).
+    :param label: Label of every segment (0 podcast, 1 ad).
+    :param embedder: 'vggish' or 'openl3'.
+    :param workers: Worker processes, one model each; defaults to the CPU count.
+    :param chunk_size: Segments per worker task; each task is embedded as one batch.
+    :param reducer_path: Optional EmbeddingReducer applied to every embedding, as at inference.
+    :param commit_rows: Commit the store at least this often; unfinished work is redone on restart.
+    :param retry_failed: Try the segments listed in failed.txt again instead of skipping them.
+    :return: Dictionary with counts and throughput.
+    """
+    failures_path = os.path.join(store_directory, 'failed.txt')
+    if retry_failed and os.path.exists(failures_path):
+        os.remove(failures_path)
+    done = completed_segments(store_directory)
+    skipped_paths = failed_segments(store_directory)
+    todo = [row for row in rows if (row[1], row[2]) not in done and row[0] not in skipped_paths]
+    print(f"{len(rows) - len(todo)} of {len(rows)} segments already extracted or failed before, {len(todo)} to go")
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+
+    store = EmbeddingStore(store_directory) if os.path.exists(os.path.join(store_directory, STORE_FILE)) else None
+    extracted = failed = 0
+    start_time = time.time()
+
+    # spawn gives every worker a fresh interpreter, so no TensorFlow state is inherited through fork
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker, initargs=(embedder, reducer_path)) as pool:
+        for chunk_rows, embeddings, failures in pool.imap_unordered(_embed_chunk, chunks):
+            if store is None and embeddings:
+                store = EmbeddingStore.create(store_directory, len(embeddings[0]),
+                                              np.asarray(embeddings[0]).dtype)
+            # Remainder segments embed to a different size and can't share the store
+            keep = [i for i, embedding in enumerate(embeddings) if store is not None and len(embedding) == store.dim]
+            failures += [(chunk_rows[i][0], f"embedding size {len(embeddings[i])}")
+                         for i in sorted(set(range(len(embeddings))) - set(keep))]
+            if keep:
+                store.append(np.stack([embeddings[i] for i in keep]),
+                             [chunk_rows[i][1] for i in keep], [chunk_rows[i][2] for i in keep], label,
+                             [chunk_rows[i][3] for i in keep], commit=False)
+                if store.pending_rows >= commit_rows:
+                    store.commit()
+            if failures:
+                os.makedirs(store_directory, exist_ok=True)
+                with open(failures_path, 'a') as failures_file:
+                    failures_file.writelines(f"{path}\t{error}\n" for path, error in failures)
+
+            extracted += len(keep)
+            failed += len(failures)
+            elapsed = time.time() - start_time
+            print(f"{extracted}/{len(todo)} segments, {failed} failed, {extracted / max(elapsed, 1e-9):.1f} segments/s")
+
+    if store is not None:
+        store.commit()
+    elapsed = time.time() - start_time
+    return {'extracted': extracted, 'failed': failed, 'skipped': len(rows) - len(todo), 'seconds': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable bulk embedding extraction into an embedding store")
+    parser.add_argument("manifest", help="segment manifest (.parquet, .xlsx or .csv) from Audio_Subsections")
+    parser.add_argument("audio_folder", help="folder with the segment WAV files")
+    parser.add_argument("store", help="embedding store directory")
+    parser.add_argument("--label", type=int, required=True, help="0 for podcasts, 1 for ads")
+    parser.add_argument("--embedder", choices=["vggish", "openl3"], default="vggish")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="segments embedded per batch")
+    parser.add_argument("--reducer", default=None, help="EmbeddingReducer (.npz) applied to the embeddings")
+    parser.add_argument("--retry-failed", action="store_true", help="retry the segments listed in failed.txt")
+    args = parser.parse_args()
+
+    rows = read_manifest(args.manifest, args.audio_folder)
+    result = run_extraction(rows, args.store, args.label, args.embedder, args.workers, args.chunk_size,
+                            args.reducer, retry_failed=args.retry_failed)
+    print(f"Extracted {result['extracted']} segments ({result['skipped']} already done, {result['failed']} failed) "
+          f"in {result['seconds']:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
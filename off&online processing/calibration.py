@@ -0,0 +1,186 @@
+import argparse
+
+import numpy as np
+
+
+class PlattCalibrator:
+    """
+    Platt scaling: P(ad | score) = 1 / (1 + exp(a * score + b)), fitted on held-out scores.
+    """
+    method = 'platt'
+
+    def __init__(self, a, b):
+        self.a = float(a)
+        self.b = float(b)
+
+    @classmethod
+    def fit(cls, scores, labels, iterations=100):
+        """
+        Fit a and b by Newton's method on the regularized targets from Platt (1999).
+
+        :param scores: Decision function values of held-out windows.
+        :param labels: Their labels (0 podcast, 1 ad).
+        :return: Fitted PlattCalibrator.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        labels = np.asarray(labels).astype(bool)
+        positives, negatives = labels.sum(), (~labels).sum()
+        # Targets slightly inside (0, 1) keep the fit from diverging on separable data
+        targets = np.where(labels, (positives + 1) / (positives + 2), 1 / (negatives + 2))
+
+        a, b = 0.0, np.log((negatives + 1) / (positives + 1))
+        for _ in range(iterations):
+            probabilities = 1 / (1 + np.exp(a * scores + b))
+            # Gradient and Hessian of the cross-entropy with respect to (a, b)
+            error = targets - probabilities
+            weights = probabilities * (1 - probabilities)
+            gradient = np.array([np.dot(error, scores), error.sum()])
+            hessian = np.array([[np.dot(weights, scores ** 2), np.dot(weights, scores)],
+                                [np.dot(weights, scores), weights.sum()]]) + 1e-12 * np.eye(2)
+            step = np.linalg.solve(hessian, gradient)
+            a, b = a - step[0], b - step[1]
+            if np.abs(step).max() < 1e-9:
+                break
+        return cls(a, b)
+
+    def transform(self, scores):
+        """
+        :param scores: Decision function values, any shape.
+        :return: Ad probabilities of the same shape.
+        """
+        return 1 / (1 + np.exp(self.a * np.asarray(scores, dtype=np.float64) + self.b))
+
+    def arrays(self):
+        return {'platt_a': np.array(self.a), 'platt_b': np.array(self.b)}
+
+
+class IsotonicCalibrator:
+    """
+    Isotonic calibration: a monotone piecewise-linear map from score to probability.
+    """
+    method = 'isotonic'
+
+    def __init__(self, score_points, probability_points):
+        self.score_points = np.asarray(score_points, dtype=np.float64)
+        self.probability_points = np.asarray(probability_points, dtype=np.float64)
+
+    @classmethod
+    def fit(cls, scores, labels):
+        from sklearn.isotonic import IsotonicRegression
+
+        regression = IsotonicRegression(y_min=0, y_max=1, out_of_bounds='clip')
+        regression.fit(np.asarray(scores, dtype=np.float64), np.asarray(labels, dtype=np.float64))
+        return cls(regression.X_thresholds_, regression.y_thresholds_)
+
+    def transform(self, scores):
+        return np.interp(scores, self.score_points, self.probability_points)
+
+    def arrays(self):
+        return {'isotonic_scores': self.score_points, 'isotonic_probabilities': self.probability_points}
+
+
+CALIBRATORS = {calibrator_class.method: calibrator_class for calibrator_class in (PlattCalibrator, IsotonicCalibrator)}
+
+
+def fit_calibrator(scores, labels, method='platt'):
+    """
+    :param scores: Decision function values of held-out windows (not the training windows).
+    :param labels: Their labels (0 podcast, 1 ad).
+    :param method: 'platt' (2 parameters, fine for small sets) or 'isotonic' (needs more data).
+    :return: Fitted calibrator.
+    """
+    if method not in CALIBRATORS:
+        raise ValueError(f"Unknown calibration method '{method}', expected one of {sorted(CALIBRATORS)}")
+    return CALIBRATORS[method].fit(scores, labels)
+
+
+def calibrator_from_arrays(arrays):
+    """
+    :param arrays: Mapping with the arrays written by a calibrator's arrays().
+    :return: The calibrator, or None if the mapping holds none.
+    """
+    if 'platt_a' in arrays:
+        return PlattCalibrator(arrays['platt_a'], arrays['platt_b'])
+    if 'isotonic_scores' in arrays:
+        return IsotonicCalibrator(arrays['isotonic_scores'], arrays['isotonic_probabilities'])
+    return None
+
+
+def save_calibrator(calibrator, path):
+    np.savez(path, **calibrator.arrays())
+
+
+def load_calibrator(path):
+    with np.load(path) as arrays:
+        calibrator = calibrator_from_arrays(arrays)
+    if calibrator is None:
+        raise ValueError(f"{path} does not contain a calibrator")
+    return calibrator
+
+
+def classifier_scores(classifier, embeddings):
+    """
+    Continuous ad score of a classifier: decision_function where available, else P(ad).
+
+    :param classifier: Trained classifier (sklearn model or LinearModel).
+    :param embeddings: np.ndarray of shape (n_windows, embedding_dim).
+    :return: np.ndarray of shape (n_windows,).
+    """
+    if hasattr(classifier, 'decision_function'):
+        return np.asarray(classifier.decision_function(embeddings), dtype=np.float64)
+    return classifier.predict_proba(embeddings)[:, list(classifier.classes_).index(1)]
+
+
+def threshold_table(probabilities, labels, thresholds=np.linspace(0.1, 0.9, 9)):
+    """
+    Precision, recall and accuracy of each threshold, to pick a per-deployment operating point.
+
+    :return: List of dictionaries, one per threshold.
+    """
+    probabilities = np.asarray(probabilities)
+    labels = np.asarray(labels).astype(bool)
+    # One comparison matrix for all thresholds at once
+    predictions = probabilities[np.newaxis, :] > np.asarray(thresholds)[:, np.newaxis]
+    true_positives = (predictions & labels).sum(axis=1)
+    precision = true_positives / np.maximum(predictions.sum(axis=1), 1)
+    recall = true_positives / max(labels.sum(), 1)
+    accuracy = (predictions == labels).mean(axis=1)
+    return [{'threshold': float(threshold), 'precision': float(p), 'recall': float(r), 'accuracy': float(a)}
+            for threshold, p, r, a in zip(thresholds, precision, recall, accuracy)]
+
+
+def main():
+    from audio_processor import load_processor_model
+    from fast_classifier import load_embeddings_folder
+
+    parser = argparse.ArgumentParser(description="Calibrate a classifier's scores on held-out embeddings")
+    parser.add_argument("model_path", help="SVM pickle, exported .npz or model_registry directory")
+    parser.add_argument("podcasts", help="folder of held-out podcast embeddings (.npy)")
+    parser.add_argument("ads", help="folder of held-out ad embeddings (.npy)")
+    parser.add_argument("--method", choices=sorted(CALIBRATORS), default="platt")
+    parser.add_argument("--reducer", default=None, help="EmbeddingReducer the model was trained behind")
+    parser.add_argument("--output", default="calibrator.npz")
+    args = parser.parse_args()
+
+    model = load_processor_model(args.model_path, args.reducer)
+    podcasts = load_embeddings_folder(args.podcasts)
+    ads = load_embeddings_folder(args.ads)
+    embeddings = np.concatenate((podcasts, ads))
+    if model.reducer is not None:
+        embeddings = model.reducer.transform(embeddings).astype(np.float32)
+    labels = np.concatenate((np.zeros(len(podcasts), dtype=int), np.ones(len(ads), dtype=int)))
+
+    scores = classifier_scores(model.classifier, embeddings)
+    calibrator = fit_calibrator(scores, labels, args.method)
+    save_calibrator(calibrator, args.output)
+    print(f"Calibrator saved to {args.output}")
+
+    probabilities = calibrator.transform(scores)
+    print(f"Brier score of the calibrated probabilities: {np.mean((probabilities - labels) ** 2):.4f}")
+    for row in threshold_table(probabilities, labels):
+        print(f"threshold {row['threshold']:.2f}: precision {row['precision']:.3f}, "
+              f"recall {row['recall']:.3f}, accuracy {row['accuracy']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import argparse
+import time
+
+import numpy as np
+
+import vggish_input
+import vggish_params
+from audio_frontend import load_window_folder, waveform_to_log_mel_examples
+
+FEATURE_NAMES = ('spectral_flux', 'loudness_mean', 'loudness_std', 'loudness_jump', 'low_energy_ratio',
+                 'speech_band_ratio')
+LOUDNESS_BLOCK_FRAMES = 48  # 0.48 s blocks for the loudness jump
+SPEECH_BAND_HZ = (300, 3400)
+
+
+def _band_center_frequencies():
+    # Same mel scale as mel_features.spectrogram_to_mel_matrix
+    def hertz_to_mel(frequencies_hertz):
+        return 1127.0 * np.log(1.0 + frequencies_hertz / 700.0)
+
+    band_edges_mel = np.linspace(hertz_to_mel(vggish_params.MEL_MIN_HZ), hertz_to_mel(vggish_params.MEL_MAX_HZ),
+                                 vggish_params.NUM_BANDS + 2)
+    return 700.0 * (np.exp(band_edges_mel[1:-1] / 1127.0) - 1.0)
+
+
+_BAND_CENTERS_HZ = _band_center_frequencies()
+_SPEECH_BANDS = (_BAND_CENTERS_HZ >= SPEECH_BAND_HZ[0]) & (_BAND_CENTERS_HZ <= SPEECH_BAND_HZ[1])
+
+
+def prefilter_features(examples):
+    """
+    Cheap per-window features computed from the log-mel examples the frontend already produces.
+
+    - spectral_flux: mean positive change of the log-mel spectrum between frames (music and jingles change more).
+    - loudness_mean / loudness_std: frame loudness in dB; ads are mastered louder and more compressed.
+    - loudness_jump: largest change between consecutive 0.48 s loudness blocks (an ad cutting in).
+    - low_energy_ratio: share of frames quieter than half the mean energy; speech pauses make this high.
+    - speech_band_ratio: share of energy in the 300-3400 Hz speech band; music spreads wider.
+
+    :param examples: Log-mel examples of one window, shape (n_examples, NUM_FRAMES, NUM_BANDS).
+    :return: np.ndarray of len(FEATURE_NAMES) floats.
+    """
+    log_mel = np.asarray(examples, dtype=np.float32).reshape(-1, vggish_params.NUM_BANDS)
+    mel = np.maximum(np.exp(log_mel) - vggish_params.LOG_OFFSET, 0)
+    band_energy = mel ** 2
+    frame_energy = band_energy.sum(axis=1)
+    loudness = 10 * np.log10(frame_energy + 1e-10)
+
+    spectral_flux = np.maximum(np.diff(log_mel, axis=0), 0).sum(axis=1).mean() if len(log_mel) > 1 else 0.0
+
+    n_blocks = len(loudness) // LOUDNESS_BLOCK_FRAMES
+    block_loudness = loudness[:n_blocks * LOUDNESS_BLOCK_FRAMES].reshape(n_blocks, -1).mean(axis=1)
+    loudness_jump = np.abs(np.diff(block_loudness)).max() if n_blocks > 1 else 0.0
+
+    low_energy_ratio = np.mean(frame_energy < 0.5 * frame_energy.mean())
+    speech_band_ratio = band_energy[:, _SPEECH_BANDS].sum() / max(band_energy.sum(), 1e-10)
+
+    return np.array([spectral_flux, loudness.mean(), loudness.std(), loudness_jump, low_energy_ratio,
+                     speech_band_ratio], dtype=np.float32)
+
+
+class CascadePrefilter:
+    """
+    First stage of the cascade: a logistic regression on prefilter_features with two thresholds.
+
+    Windows whose ad probability is below reject_below are confidently content and skip VGGish;
+    windows above accept_above (disabled by default) are confidently ads. Everything in between
+    is ambiguous and goes to the full VGGish + SVM pipeline.
+    """
+    def __init__(self, feature_mean, feature_std, weights, bias, reject_below, accept_above=None):
+        self.feature_mean = np.asarray(feature_mean, dtype=np.float32)
+        self.feature_std = np.asarray(feature_std, dtype=np.float32)
+        self.weights = np.asarray(weights, dtype=np.float32).ravel()
+        self.bias = float(np.ravel(bias)[0])
+        self.reject_below = float(reject_below)
+        self.accept_above = None if accept_above is None or np.isnan(accept_above) else float(accept_above)
+
+    @classmethod
+    def fit(cls, window_examples, labels, max_missed_ads=0.01, max_false_accepts=None):
+        """
+        Fit the first stage and pick its thresholds from the training score distribution.
+
+        :param window_examples: List of per-window log-mel arrays.
+        :param labels: Window labels (0 podcast, 1 ad).
+        :param max_missed_ads: Share of training ads allowed below reject_below (they never reach the SVM).
+        :param max_false_accepts: Share of training podcasts allowed above accept_above, or None to always
+            send likely ads to the SVM.
+        :return: Fitted CascadePrefilter.
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        labels = np.asarray(labels)
+        features = np.stack([prefilter_features(examples) for examples in window_examples])
+        feature_mean = features.mean(axis=0)
+        feature_std = features.std(axis=0) + 1e-6
+        model = LogisticRegression(class_weight='balanced', max_iter=1000)
+        model.fit((features - feature_mean) / feature_std, labels)
+
+        prefilter = cls(feature_mean, feature_std, model.coef_, model.intercept_, 0.0)
+        probabilities = prefilter.ad_probability(features=features)
+        prefilter.reject_below = float(np.quantile(probabilities[labels == 1], max_missed_ads))
+        if max_false_accepts is not None:
+            prefilter.accept_above = float(np.quantile(probabilities[labels == 0], 1 - max_false_accepts))
+        return prefilter
+
+    def ad_probability(self, window_examples=None, features=None):
+        """
+        :param window_examples: List of per-window log-mel arrays, or None when features are given.
+        :param features: Precomputed prefilter_features, shape (n_windows, len(FEATURE_NAMES)).
+        :return: np.ndarray of first-stage ad probabilities.
+        """
+        if features is None:
+            features = np.stack([prefilter_features(examples) for examples in window_examples])
+        logits = ((features - self.feature_mean) / self.feature_std) @ self.weights + self.bias
+        return 1 / (1 + np.exp(-logits))
+
+    def decide(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays.
+        :return: (resolved, is_ad) boolean arrays; is_ad is only meaningful where resolved is True.
+        """
+        probabilities = self.ad_probability(window_examples)
+        is_ad = probabilities > (self.accept_above if self.accept_above is not None else np.inf)
+        resolved = (probabilities < self.reject_below) | is_ad
+        return resolved, is_ad
+
+    def save(self, path):
+        np.savez(path, feature_mean=self.feature_mean, feature_std=self.feature_std, weights=self.weights,
+                 bias=np.array(self.bias), reject_below=np.array(self.reject_below),
+                 accept_above=np.array(np.nan if self.accept_above is None else self.accept_above))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as params:
+            return cls(**{name: params[name] for name in params.files})
+
+
+class CascadeProcessor:
+    """
+    Drop-in AudioProcessor wrapper that only runs VGGish + SVM on windows the prefilter can't resolve.
+    """
+    def __init__(self, processor, prefilter_path):
+        """
+        :param processor: AudioProcessor used for the ambiguous windows.
+        :param prefilter_path: Path to a CascadePrefilter saved with save() (.npz).
+        """
+        self.processor = processor
+        self.prefilter = CascadePrefilter.load(prefilter_path)
+        self.total_windows = 0
+        self.skipped_windows = 0
+
+    @property
+    def skip_rate(self):
+        return self.skipped_windows / self.total_windows if self.total_windows else 0.0
+
+    @property
+    def decision_threshold(self):
+        return self.processor.decision_threshold
+
+    @property
+    def score_range(self):
+        return self.processor.score_range
+
+    def detect_ads(self, file_path):
+        """
+        :param file_path: Path to a 16-bit WAV file.
+        :return: True if an ad is detected, False otherwise.
+        """
+        return bool(self.detect_ads_in_examples([vggish_input.wavfile_to_examples(file_path)])[0])
+
+    def detect_ads_in_waveform(self, waveform, sample_rate):
+        """
+        :param waveform: np.ndarray of int16 samples or floats in [-1.0, +1.0], mono or (frames, channels).
+        :param sample_rate: Sample rate of the waveform.
+        :return: True if an ad is detected, False otherwise.
+        """
+        return bool(self.detect_ads_batch([waveform], sample_rate)[0])
+
+    def detect_ads_batch(self, waveforms, sample_rate):
+        """
+        :param waveforms: Sequence of windows of equal length.
+        :param sample_rate: Sample rate of the windows.
+        :return: np.ndarray of booleans, True where an ad was detected.
+        """
+        return self.detect_ads_in_examples([waveform_to_log_mel_examples(waveform, sample_rate)
+                                            for waveform in waveforms])
+
+    def detect_ads_in_examples(self, window_examples):
+        scores, threshold, _ = self.score_ads_in_examples_with_threshold(window_examples)
+        return scores > threshold
+
+    def score_ads_in_waveform(self, waveform, sample_rate):
+        return self.score_ads_in_waveform_with_threshold(waveform, sample_rate)[0]
+
+    def score_ads_in_waveform_with_threshold(self, waveform, sample_rate):
+        scores, threshold, _ = self.score_ads_in_examples_with_threshold(
+            [waveform_to_log_mel_examples(waveform, sample_rate)])
+        return float(scores[0]), threshold
+
+    def score_ads_batch(self, waveforms, sample_rate):
+        return self.score_ads_in_examples([waveform_to_log_mel_examples(waveform, sample_rate)
+                                           for waveform in waveforms])
+
+    def score_ads_in_examples(self, window_examples):
+        return self.score_ads_in_examples_with_threshold(window_examples)[0]
+
+    def score_ads_in_examples_with_threshold(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays.
+        :return: (np.ndarray of ad scores, decision threshold, score range) on the processor's scale,
+            all from one model snapshot of the processor; windows the prefilter resolved get the
+            extreme of the scale, so any downstream threshold keeps them on their side.
+        """
+        resolved, is_ad = self.prefilter.decide(window_examples)
+        ambiguous = np.flatnonzero(~resolved)
+        ambiguous_examples = [window_examples[i] for i in ambiguous]
+        if hasattr(self.processor, 'score_ads_in_examples_with_threshold'):
+            ambiguous_scores, threshold, score_range = \
+                self.processor.score_ads_in_examples_with_threshold(ambiguous_examples)
+        else:
+            # Processors without hot reload have a fixed threshold and scale
+            threshold, score_range = self.processor.decision_threshold, self.processor.score_range
+            ambiguous_scores = self.processor.score_ads_in_examples(ambiguous_examples) if len(ambiguous) else []
+        lowest, highest = score_range
+        scores = np.where(is_ad, highest, lowest)
+        if len(ambiguous):
+            scores[ambiguous] = ambiguous_scores
+        self.total_windows += len(window_examples)
+        self.skipped_windows += len(window_examples) - len(ambiguous)
+        return scores, threshold, score_range
+
+
+def cascade_report(processor, prefilter_path, window_examples, labels):
+    """
+    Compare the cascade with running VGGish + SVM on every window.
+
+    Timings start from the log-mel examples, which both paths need anyway.
+
+    :param processor: AudioProcessor with the SVM.
+    :param prefilter_path: Path to the saved CascadePrefilter.
+    :param window_examples: List of per-window log-mel arrays.
+    :param labels: Window labels (0 podcast, 1 ad).
+    :return: Dictionary with skip rate, accuracies and per-window cost of both paths.
+    """
+    labels = np.asarray(labels).astype(bool)
+
+    start = time.perf_counter()
+    full_predictions = np.concatenate([processor.detect_ads_in_examples([examples]) for examples in window_examples])
+    full_seconds = time.perf_counter() - start
+
+    cascade = CascadeProcessor(processor, prefilter_path)
+    start = time.perf_counter()
+    cascade_predictions = np.concatenate([cascade.detect_ads_in_examples([examples]) for examples in window_examples])
+    cascade_seconds = time.perf_counter() - start
+
+    return {'skip_rate': cascade.skip_rate,
+            'full_accuracy': float(np.mean(full_predictions == labels)),
+            'cascade_accuracy': float(np.mean(cascade_predictions == labels)),
+            'agreement': float(np.mean(full_predictions == cascade_predictions)),
+            'full_ms_per_window': 1000 * full_seconds / len(window_examples),
+            'cascade_ms_per_window': 1000 * cascade_seconds / len(window_examples),
+            'speedup': full_seconds / cascade_seconds}
+
+
+def main():
+    from audio_processor import AudioProcessor
+
+    parser = argparse.ArgumentParser(description="Fit the cascade prefilter and report skip rate and accuracy")
+    parser.add_argument("model_path", help="path to the SVM model file")
+    parser.add_argument("train_podcasts", help="folder of podcast training windows (.wav)")
+    parser.add_argument("train_ads", help="folder of ad training windows (.wav)")
+    parser.add_argument("test_podcasts", help="folder of podcast test windows (.wav)")
+    parser.add_argument("test_ads", help="folder of ad test windows (.wav)")
+    parser.add_argument("--max-missed-ads", type=float, default=0.01,
+                        help="share of training ads the prefilter may reject")
+    parser.add_argument("--max-false-accepts", type=float, default=None,
+                        help="share of training podcasts the prefilter may flag as ads without the SVM")
+    parser.add_argument("--reducer", default=None, help="EmbeddingReducer the SVM was trained behind")
+    parser.add_argument("--output", default="cascade_prefilter.npz")
+    args = parser.parse_args()
+
+    def load_split(podcast_folder, ad_folder):
+        podcasts = load_window_folder(podcast_folder)
+        ads = load_window_folder(ad_folder)
+        return podcasts + ads, np.concatenate((np.zeros(len(podcasts), dtype=int), np.ones(len(ads), dtype=int)))
+
+    train_examples, train_labels = load_split(args.train_podcasts, args.train_ads)
+    test_examples, test_labels = load_split(args.test_podcasts, args.test_ads)
+
+    prefilter = CascadePrefilter.fit(train_examples, train_labels, args.max_missed_ads, args.max_false_accepts)
+    prefilter.save(args.output)
+    print(f"Prefilter saved to {args.output} (reject below {prefilter.reject_below:.3f})")
+    for name, weight in zip(FEATURE_NAMES, prefilter.weights):
+        print(f"{name:>18}: {weight:+.3f}")
+
+    report = cascade_report(AudioProcessor(args.model_path, args.reducer), args.output, test_examples, test_labels)
+    print(f"Skip rate {report['skip_rate']:.1%}, agreement with full pipeline {report['agreement']:.1%}")
+    print(f"Accuracy: full {report['full_accuracy']:.3f}, cascade {report['cascade_accuracy']:.3f}")
+    print(f"Per window: full {report['full_ms_per_window']:.1f} ms, cascade {report['cascade_ms_per_window']:.1f} ms "
+          f"({report['speedup']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
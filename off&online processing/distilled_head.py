@@ -0,0 +1,262 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+import vggish_input
+import vggish_params
+from audio_frontend import load_window_folder, waveform_to_log_mel_examples
+
+
+class DistilledHead:
+    """
+    Small MLP that classifies VGGish log-mel patches directly, distilled from VGGish + SVM.
+
+    Each 0.96 s patch (96 frames x 64 bands) is average-pooled in time, normalized and run
+    through one hidden layer. The window logit is the mean of its patch logits. Inference is
+    plain NumPy (about 0.1 M multiply-adds per patch), with no TensorFlow session.
+    """
+    def __init__(self, feature_mean, feature_std, hidden_weights, hidden_bias, output_weights, output_bias,
+                 time_pool=4):
+        self.feature_mean = np.asarray(feature_mean, dtype=np.float32)
+        self.feature_std = np.asarray(feature_std, dtype=np.float32)
+        self.hidden_weights = np.asarray(hidden_weights, dtype=np.float32)
+        self.hidden_bias = np.asarray(hidden_bias, dtype=np.float32)
+        self.output_weights = np.asarray(output_weights, dtype=np.float32).ravel()
+        self.output_bias = float(np.ravel(output_bias)[0])
+        self.time_pool = int(time_pool)
+
+    @staticmethod
+    def pool(examples, time_pool):
+        """
+        :param examples: Log-mel patches of shape (n_patches, NUM_FRAMES, NUM_BANDS).
+        :return: Time-pooled, flattened patches of shape (n_patches, NUM_FRAMES // time_pool * NUM_BANDS).
+        """
+        examples = np.asarray(examples, dtype=np.float32)
+        pooled = examples.reshape(len(examples), vggish_params.NUM_FRAMES // time_pool, time_pool,
+                                  vggish_params.NUM_BANDS).mean(axis=2)
+        return pooled.reshape(len(examples), -1)
+
+    def patch_logits(self, examples):
+        features = (self.pool(examples, self.time_pool) - self.feature_mean) / self.feature_std
+        hidden = np.maximum(features @ self.hidden_weights + self.hidden_bias, 0)
+        return hidden @ self.output_weights + self.output_bias
+
+    def window_logits(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays (n_patches, NUM_FRAMES, NUM_BANDS).
+        :return: np.ndarray with one logit per window; positive means ad.
+        """
+        counts = [len(examples) for examples in window_examples]
+        logits = self.patch_logits(np.concatenate(window_examples))
+        return np.add.reduceat(logits, np.cumsum([0] + counts[:-1])) / counts
+
+    def save(self, path):
+        np.savez(path, feature_mean=self.feature_mean, feature_std=self.feature_std,
+                 hidden_weights=self.hidden_weights, hidden_bias=self.hidden_bias,
+                 output_weights=self.output_weights, output_bias=np.array(self.output_bias),
+                 time_pool=np.array(self.time_pool))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as params:
+            return cls(**{name: params[name] for name in params.files})
+
+
+class DistilledHeadProcessor:
+    """
+    Drop-in AudioProcessor backend running the distilled head instead of VGGish + SVM.
+    """
+    def __init__(self, head_path):
+        """
+        :param head_path: Path to a head saved by train_distilled_head (.npz).
+        """
+        self.head = DistilledHead.load(head_path)
+
+    # Scores are the sigmoid of the window logit
+    decision_threshold = 0.5
+    score_range = (0.0, 1.0)
+
+    def detect_ads(self, file_path):
+        """
+        :param file_path: Path to a 16-bit WAV file.
+        :return: True if an ad is detected, False otherwise.
+        """
+        return bool(self.head.window_logits([vggish_input.wavfile_to_examples(file_path)])[0] > 0)
+
+    def detect_ads_in_waveform(self, waveform, sample_rate):
+        """
+        :param waveform: np.ndarray of int16 samples or floats in [-1.0, +1.0], mono or (frames, channels).
+        :param sample_rate: Sample rate of the waveform.
+        :return: True if an ad is detected, False otherwise.
+        """
+        return bool(self.detect_ads_batch([waveform], sample_rate)[0])
+
+    def detect_ads_batch(self, waveforms, sample_rate):
+        """
+        :param waveforms: Sequence of windows.
+        :param sample_rate: Sample rate of the windows.
+        :return: np.ndarray of booleans, True where an ad was detected.
+        """
+        return self.score_ads_batch(waveforms, sample_rate) > self.decision_threshold
+
+    def detect_ads_in_examples(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays.
+        :return: np.ndarray of booleans, True where an ad was detected.
+        """
+        return self.score_ads_in_examples(window_examples) > self.decision_threshold
+
+    def score_ads_in_waveform(self, waveform, sample_rate):
+        return float(self.score_ads_batch([waveform], sample_rate)[0])
+
+    def score_ads_in_waveform_with_threshold(self, waveform, sample_rate):
+        return self.score_ads_in_waveform(waveform, sample_rate), self.decision_threshold
+
+    def score_ads_batch(self, waveforms, sample_rate):
+        return self.score_ads_in_examples([waveform_to_log_mel_examples(waveform, sample_rate)
+                                           for waveform in waveforms])
+
+    def score_ads_in_examples(self, window_examples):
+        return self.score_ads_in_examples_with_threshold(window_examples)[0]
+
+    def score_ads_in_examples_with_threshold(self, window_examples):
+        """
+        :param window_examples: List of per-window log-mel arrays (may be empty).
+        :return: (np.ndarray of P(ad) scores, decision threshold, score range).
+        """
+        scores = 1 / (1 + np.exp(-self.head.window_logits(window_examples))) if len(window_examples) else np.empty(0)
+        return scores, self.decision_threshold, self.score_range
+
+
+def teacher_logits(svm_model, window_examples, reducer=None):
+    """
+    Score windows with the full VGGish + SVM pipeline; these are the distillation targets.
+
+    :param svm_model: Trained classifier with decision_function (or predict_proba).
+    :param window_examples: List of per-window log-mel arrays.
+    :param reducer: EmbeddingReducer the classifier was trained behind, if any.
+    :return: np.ndarray with one logit per window.
+    """
+    from Vggish_Embeddings_Model import embed_examples
+
+    embeddings = np.stack([embed_examples(examples) for examples in window_examples])
+    if reducer is not None:
+        embeddings = reducer.transform(embeddings).astype(np.float32)
+    if hasattr(svm_model, 'decision_function'):
+        return svm_model.decision_function(embeddings)
+    probabilities = np.clip(svm_model.predict_proba(embeddings)[:, 1], 1e-6, 1 - 1e-6)
+    return np.log(probabilities / (1 - probabilities))
+
+
+def train_distilled_head(window_examples, labels, teacher, hidden_units=64, time_pool=4, label_weight=0.3,
+                         epochs=30, batch_size=256):
+    """
+    Train the head on patches, against a blend of the teacher's soft targets and the true labels.
+
+    :param window_examples: List of per-window log-mel arrays.
+    :param labels: True window labels (0 podcast, 1 ad).
+    :param teacher: Teacher logits per window, from teacher_logits().
+    :param hidden_units: Size of the hidden layer.
+    :param time_pool: Frames averaged together before the MLP.
+    :param label_weight: Weight of the true labels in the targets (the rest comes from the teacher).
+    :return: Trained DistilledHead.
+    """
+    import tensorflow as tf
+
+    counts = [len(examples) for examples in window_examples]
+    features = DistilledHead.pool(np.concatenate(window_examples), time_pool)
+    feature_mean = features.mean(axis=0)
+    feature_std = features.std(axis=0) + 1e-6
+    features = (features - feature_mean) / feature_std
+
+    soft_targets = 1 / (1 + np.exp(-np.asarray(teacher, dtype=np.float32)))
+    targets = label_weight * np.asarray(labels, dtype=np.float32) + (1 - label_weight) * soft_targets
+    patch_targets = np.repeat(targets, counts)
+
+    model = tf.keras.Sequential([
+        tf.keras.layers.Dense(hidden_units, activation='relu', input_shape=(features.shape[1],)),
+        tf.keras.layers.Dense(1),
+    ])
+    model.compile(optimizer=tf.keras.optimizers.Adam(1e-3),
+                  loss=tf.keras.losses.BinaryCrossentropy(from_logits=True))
+    model.fit(features, patch_targets, epochs=epochs, batch_size=batch_size, shuffle=True, verbose=2)
+
+    (hidden_weights, hidden_bias), (output_weights, output_bias) = [layer.get_weights() for layer in model.layers]
+    return DistilledHead(feature_mean, feature_std, hidden_weights, hidden_bias, output_weights, output_bias,
+                         time_pool)
+
+
+def calculate_metrics(actual_labels, predicted_labels):
+    """
+    :return: [accuracy, precision, recall, f1], the order used by result_analysis.
+    """
+    actual_labels = np.asarray(actual_labels).astype(bool)
+    predicted_labels = np.asarray(predicted_labels).astype(bool)
+    true_positives = np.sum(actual_labels & predicted_labels)
+    precision = true_positives / max(np.sum(predicted_labels), 1)
+    recall = true_positives / max(np.sum(actual_labels), 1)
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return [float(np.mean(actual_labels == predicted_labels)), float(precision), float(recall), float(f1)]
+
+
+def main():
+    import joblib
+    from embedding_reduction import EmbeddingReducer
+
+    parser = argparse.ArgumentParser(description="Distill VGGish + SVM into a log-mel MLP head")
+    parser.add_argument("teacher", help="trained SVM (joblib pickle) used as the teacher")
+    parser.add_argument("train_podcasts", help="folder of podcast training windows (.wav)")
+    parser.add_argument("train_ads", help="folder of ad training windows (.wav)")
+    parser.add_argument("test_podcasts", help="folder of podcast test windows (.wav)")
+    parser.add_argument("test_ads", help="folder of ad test windows (.wav)")
+    parser.add_argument("--reducer", default=None, help="EmbeddingReducer (.npz) the teacher was trained behind")
+    parser.add_argument("--output", default="distilled_head.npz")
+    parser.add_argument("--hidden-units", type=int, default=64)
+    parser.add_argument("--plot", action="store_true", help="plot the metrics with result_analysis")
+    args = parser.parse_args()
+
+    svm_model = joblib.load(args.teacher)
+    reducer = EmbeddingReducer.load(args.reducer) if args.reducer else None
+
+    def load_split(podcast_folder, ad_folder):
+        podcasts = load_window_folder(podcast_folder)
+        ads = load_window_folder(ad_folder)
+        return podcasts + ads, np.concatenate((np.zeros(len(podcasts), dtype=int), np.ones(len(ads), dtype=int)))
+
+    train_examples, train_labels = load_split(args.train_podcasts, args.train_ads)
+    test_examples, test_labels = load_split(args.test_podcasts, args.test_ads)
+
+    head = train_distilled_head(train_examples, train_labels, teacher_logits(svm_model, train_examples, reducer),
+                                hidden_units=args.hidden_units)
+    head.save(args.output)
+    print(f"Distilled head saved to {args.output}")
+
+    start = time.perf_counter()
+    student_predictions = head.window_logits(test_examples) > 0
+    student_ms = 1000 * (time.perf_counter() - start) / len(test_examples)
+
+    start = time.perf_counter()
+    teacher_predictions = teacher_logits(svm_model, test_examples, reducer) > 0
+    teacher_ms = 1000 * (time.perf_counter() - start) / len(test_examples)
+
+    results = {'VGGish + SVM': calculate_metrics(test_labels, teacher_predictions),
+               'Distilled head': calculate_metrics(test_labels, student_predictions)}
+    metrics = ['Accuracy', 'Precision', 'Recall', 'F1 Score']
+    for name, values in results.items():
+        print(name, dict(zip(metrics, np.round(values, 2))))
+    print(f"Inference per window (from log-mel): teacher {teacher_ms:.2f} ms, head {student_ms:.3f} ms")
+
+    if args.plot:
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'result_analysis'))
+        from audio_file_metrics_vggish_svm_3sec import prepare_data, plot_results
+
+        models = list(results)
+        plot_results(prepare_data(models, metrics, results), models, metrics,
+                     str(round(len(test_examples[0]) * vggish_params.EXAMPLE_HOP_SECONDS)), "distilled_head_metrics")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import argparse
+import time
+
+import numpy as np
+
+import vggish_params
+
+
+class EmbeddingReducer:
+    """
+    PCA (with whitening) and 8-bit quantization of window embeddings, frame by frame.
+
+    This is the transformation vggish_postprocess.Postprocessor applies to 128-D VGGish frames,
+    generalized to any frame size (512 for OpenL3) and to fewer output components. Windows are
+    flattened frame embeddings, as produced by extract_vggish_embeddings or OpenL3Embedder, so
+    a window of F frames of size D becomes F * n_components uint8 values.
+    """
+    def __init__(self, pca_matrix, pca_means, quantize=True):
+        """
+        :param pca_matrix: Whitening PCA matrix of shape (n_components, frame_dim).
+        :param pca_means: Frame mean of shape (frame_dim,).
+        :param quantize: If True, transform() returns uint8 codes; otherwise whitened floats.
+        """
+        self.pca_matrix = np.asarray(pca_matrix, dtype=np.float32)
+        self.pca_means = np.asarray(pca_means, dtype=np.float32).ravel()
+        self.quantize = quantize
+
+    @property
+    def frame_dim(self):
+        return self.pca_matrix.shape[1]
+
+    @property
+    def n_components(self):
+        return self.pca_matrix.shape[0]
+
+    @classmethod
+    def fit(cls, embeddings, frame_dim, n_components, max_frames=200000, quantize=True, random_state=0):
+        """
+        Fit the PCA on the frames of a set of training windows.
+
+        :param embeddings: np.ndarray of shape (n_windows, frames * frame_dim).
+        :param frame_dim: Size of one frame embedding (vggish_params.EMBEDDING_SIZE for VGGish, 512 for OpenL3).
+        :param n_components: Number of principal components kept per frame.
+        :param max_frames: Frames sampled for the covariance estimate.
+        :param quantize: See __init__.
+        :param random_state: Seed for the frame sample.
+        :return: Fitted EmbeddingReducer.
+        """
+        frames = np.asarray(embeddings, dtype=np.float32).reshape(-1, frame_dim)
+        if len(frames) > max_frames:
+            frames = frames[np.random.default_rng(random_state).choice(len(frames), max_frames, replace=False)]
+        means = frames.mean(axis=0)
+        covariance = np.cov(frames - means, rowvar=False)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1][:n_components]
+        # Whitening puts every component at unit variance, which is what the quantization range assumes
+        pca_matrix = (eigenvectors[:, order] / np.sqrt(np.maximum(eigenvalues[order], 1e-12))).T
+        return cls(pca_matrix, means, quantize)
+
+    def transform(self, embeddings):
+        """
+        :param embeddings: np.ndarray of shape (n_windows, frames * frame_dim), or a single flat window.
+        :return: Reduced windows of shape (n_windows, frames * n_components) (or flat for a single window).
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        single = embeddings.ndim == 1
+        windows = embeddings.reshape(1 if single else len(embeddings), -1, self.frame_dim)
+
+        reduced = (windows - self.pca_means) @ self.pca_matrix.T
+        if self.quantize:
+            # Same clipping and scaling as vggish_postprocess.Postprocessor
+            np.clip(reduced, vggish_params.QUANTIZE_MIN_VAL, vggish_params.QUANTIZE_MAX_VAL, out=reduced)
+            reduced -= vggish_params.QUANTIZE_MIN_VAL
+            reduced *= 255.0 / (vggish_params.QUANTIZE_MAX_VAL - vggish_params.QUANTIZE_MIN_VAL)
+            reduced = reduced.astype(np.uint8)
+
+        reduced = reduced.reshape(len(windows), -1)
+        return reduced[0] if single else reduced
+
+    def save(self, path):
+        """
+        Save the parameters in the .npz layout read by vggish_postprocess.Postprocessor.
+
+        :param path: Output path.
+        """
+        np.savez(path, **{vggish_params.PCA_EIGEN_VECTORS_NAME: self.pca_matrix,
+                          vggish_params.PCA_MEANS_NAME: self.pca_means,
+                          'quantize': np.array(self.quantize)})
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a reducer saved with save(), or Google's released vggish_pca_params.npz.
+
+        :param path: Path to the .npz file.
+        :return: EmbeddingReducer instance.
+        """
+        with np.load(path) as params:
+            quantize = bool(params['quantize']) if 'quantize' in params else True
+            return cls(params[vggish_params.PCA_EIGEN_VECTORS_NAME], params[vggish_params.PCA_MEANS_NAME], quantize)
+
+
+def reduction_report(train_embeddings, train_labels, test_embeddings, test_labels, frame_dim,
+                     component_counts=(8, 16, 32, 64, None)):
+    """
+    Train a linear SVM (as in the notebooks) on reduced embeddings and compare speed and accuracy.
+
+    :param train_embeddings: Training windows, shape (n_windows, frames * frame_dim).
+    :param train_labels: Training labels (0 podcast, 1 ad).
+    :param test_embeddings: Test windows.
+    :param test_labels: Test labels.
+    :param frame_dim: Size of one frame embedding.
+    :param component_counts: Components per frame to try; None is the unreduced baseline.
+    :return: List of dictionaries, one per setting.
+    """
+    from sklearn.svm import SVC
+
+    results = []
+    for n_components in component_counts:
+        if n_components is None:
+            reducer = None
+            train, test = train_embeddings, test_embeddings
+        else:
+            reducer = EmbeddingReducer.fit(train_embeddings, frame_dim, n_components)
+            train = reducer.transform(train_embeddings).astype(np.float32)
+
+        model = SVC(kernel='linear')
+        start = time.perf_counter()
+        model.fit(train, train_labels)
+        fit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if reducer is not None:
+            test = reducer.transform(test_embeddings).astype(np.float32)
+        predictions = model.predict(test)
+        predict_seconds = time.perf_counter() - start
+
+        results.append({'components': n_components or frame_dim,
+                        'dims': train.shape[1],
+                        'bytes_per_window': train.shape[1] * (1 if reducer is not None else 4),
+                        'fit_seconds': fit_seconds,
+                        'predict_ms_per_window': 1000 * predict_seconds / len(test),
+                        'accuracy': float(np.mean(predictions == test_labels))})
+    return results
+
+
+def main():
+    from fast_classifier import load_embeddings_folder
+
+    parser = argparse.ArgumentParser(description="Fit a PCA + uint8 reduction stage and report speed vs accuracy")
+    parser.add_argument("train_podcasts")
+    parser.add_argument("train_ads")
+    parser.add_argument("test_podcasts")
+    parser.add_argument("test_ads")
+    parser.add_argument("--frame-dim", type=int, default=vggish_params.EMBEDDING_SIZE,
+                        help="128 for VGGish, 512 for OpenL3")
+    parser.add_argument("--components", type=int, default=32, help="components per frame of the saved reducer")
+    parser.add_argument("--output", default="embedding_reducer.npz")
+    args = parser.parse_args()
+
+    def load_split(podcast_folder, ad_folder):
+        podcasts = load_embeddings_folder(podcast_folder)
+        ads = load_embeddings_folder(ad_folder)
+        labels = np.concatenate((np.zeros(len(podcasts), dtype=int), np.ones(len(ads), dtype=int)))
+        return np.concatenate((podcasts, ads)), labels
+
+    train_embeddings, train_labels = load_split(args.train_podcasts, args.train_ads)
+    test_embeddings, test_labels = load_split(args.test_podcasts, args.test_ads)
+
+    for result in reduction_report(train_embeddings, train_labels, test_embeddings, test_labels, args.frame_dim):
+        print(f"{result['components']:>4} comp/frame, {result['dims']:>6} dims, "
+              f"{result['bytes_per_window']:>7} B/window, fit {result['fit_seconds']:.2f} s, "
+              f"{result['predict_ms_per_window']:.4f} ms/window, accuracy {result['accuracy']:.3f}")
+
+    EmbeddingReducer.fit(train_embeddings, args.frame_dim, args.components).save(args.output)
+    print(f"Reducer saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+STORE_FILE = 'store.json'
+SPLITS = ('unassigned', 'train', 'validation', 'test')
+INDEX_COLUMNS = {'source': np.int32, 'segment': np.int32, 'label': np.int8, 'split': np.int8}
+
+
+class EmbeddingStore:
+    """
+    Append-only store of window embeddings in fixed-size, memory-mapped .npy shards.
+
+    Layout of a store directory:
+    - store.json: embedding size, dtype, rows per shard, committed row count, number of index
+      chunks and the source name table;
+    - shard_00000.npy, ...: (shard_rows, dim) arrays, filled in order;
+    - index_00000.npz, ...: source, segment, label and split of the rows added by one commit.
+
+    Row i lives in shard i // shard_rows. Reads go through np.load(mmap_mode='r'), so a batch
+    only touches the pages of the rows it asks for and nothing is loaded up front. Each commit
+    writes only its own index chunk and then store.json, whose row count makes the rows
+    visible, so a crash mid-append leaves the store at the last commit and committing costs
+    the same however large the store is.
+    """
+    def __init__(self, directory):
+        """
+        Open an existing store (see create()).
+
+        :param directory: Store directory.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, STORE_FILE)) as store_file:
+            settings = json.load(store_file)
+        self.dim = settings['dim']
+        self.dtype = np.dtype(settings['dtype'])
+        self.shard_rows = settings['shard_rows']
+        self.rows = settings['rows']
+        self.index_chunks = settings['index_chunks']
+        self.sources = settings['sources']
+        self._source_codes = {source: code for code, source in enumerate(self.sources)}
+
+        chunks = []
+        for chunk in range(self.index_chunks):
+            with np.load(self._index_chunk_path(chunk)) as chunk_file:
+                chunks.append({column: chunk_file[column] for column in INDEX_COLUMNS})
+        self._index_buffers = {column: np.concatenate([np.empty(0, dtype)] + [chunk[column] for chunk in chunks])
+                                       [:self.rows].astype(dtype)
+                               for column, dtype in INDEX_COLUMNS.items()}
+        self._shards = {}
+        self._pending = []
+        self._pending_rows = 0
+
+    @classmethod
+    def create(cls, directory, dim, dtype=np.float32, shard_rows=65536):
+        """
+        Create an empty store.
+
+        :param directory: New store directory.
+        :param dim: Size of one (flattened) window embedding.
+        :param dtype: Embedding dtype, e.g. float32 or uint8 for reduced embeddings.
+        :param shard_rows: Rows per shard file.
+        :return: EmbeddingStore instance.
+        """
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, STORE_FILE)):
+            raise ValueError(f"{directory} already contains a store")
+        settings = {'dim': int(dim), 'dtype': np.dtype(dtype).str, 'shard_rows': int(shard_rows), 'rows': 0,
+                    'index_chunks': 0, 'sources': []}
+        with open(os.path.join(directory, STORE_FILE), 'w') as store_file:
+            json.dump(settings, store_file)
+        return cls(directory)
+
+    def __len__(self):
+        """
+        :return: Number of committed rows.
+        """
+        return self.rows
+
+    @property
+    def pending_rows(self):
+        """
+        :return: Number of appended rows not committed yet.
+        """
+        return self._pending_rows
+
+    @property
+    def index(self):
+        """
+        :return: Dictionary of index columns (see INDEX_COLUMNS), one entry per committed row.
+        """
+        return {column: buffer[:self.rows] for column, buffer in self._index_buffers.items()}
+
+    def _shard_path(self, shard):
+        return os.path.join(self.directory, f"shard_{shard:05d}.npy")
+
+    def _index_chunk_path(self, chunk):
+        return os.path.join(self.directory, f"index_{chunk:05d}.npz")
+
+    def _shard(self, shard, writable=False):
+        key = (shard, writable)
+        if key not in self._shards:
+            path = self._shard_path(shard)
+            if writable and not os.path.exists(path):
+                self._shards[key] = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype,
+                                                              shape=(self.shard_rows, self.dim))
+            else:
+                self._shards[key] = np.load(path, mmap_mode='r+' if writable else 'r')
+        return self._shards[key]
+
+    def append(self, embeddings, sources, segments, labels, split='unassigned', commit=True):
+        """
+        Append windows, and commit them unless commit is False (see commit()).
+
+        :param embeddings: Array of shape (n, dim) or (n, ...) flattening to dim.
+        :param sources: Source file name per window, or one name for all.
+        :param segments: Segment index of each window within its source.
+        :param labels: Label per window (0 podcast, 1 ad), or one label for all.
+        :param split: Split name per window, or one for all (see SPLITS).
+        :param commit: Make the rows visible now; bulk writers commit once per shard or file instead.
+        :return: Row ids of the new windows.
+        """
+        embeddings = np.asarray(embeddings).reshape(-1, self.dim)
+        n = len(embeddings)
+        if isinstance(sources, str):
+            sources = [sources] * n
+        source_codes = np.array([self._source_code(source) for source in sources], dtype=np.int32)
+        split_codes = np.array([SPLITS.index(s) for s in ([split] * n if isinstance(split, str) else split)],
+                               dtype=np.int8)
+
+        start = self.rows + self._pending_rows
+        written = 0
+        while written < n:
+            shard, offset = divmod(start + written, self.shard_rows)
+            count = min(n - written, self.shard_rows - offset)
+            self._shard(shard, writable=True)[offset:offset + count] = embeddings[written:written + count]
+            written += count
+
+        self._pending.append({'source': source_codes, 'segment': np.broadcast_to(segments, n),
+                              'label': np.broadcast_to(labels, n), 'split': split_codes})
+        self._pending_rows += n
+        if commit:
+            self.commit()
+        return np.arange(start, start + n)
+
+    def _source_code(self, source):
+        if source not in self._source_codes:
+            self._source_codes[source] = len(self.sources)
+            self.sources.append(source)
+        return self._source_codes[source]
+
+    def commit(self):
+        """
+        Flush the appended embeddings and make their rows visible to readers.
+        """
+        if not self._pending_rows:
+            return
+        for (shard, writable), array in self._shards.items():
+            if writable:
+                array.flush()
+        # Only the shard being filled stays mapped for writing
+        current_shard = (self.rows + self._pending_rows) // self.shard_rows
+        self._shards = {key: array for key, array in self._shards.items() if not key[1] or key[0] == current_shard}
+        new_rows = {column: np.concatenate([np.asarray(chunk[column], dtype=dtype) for chunk in self._pending])
+                    for column, dtype in INDEX_COLUMNS.items()}
+        needed = self.rows + self._pending_rows
+        for column, buffer in self._index_buffers.items():
+            if needed > len(buffer):
+                # Grow geometrically, so the in-memory index costs O(1) amortized per row
+                grown = np.empty(max(needed, 2 * len(buffer)), dtype=buffer.dtype)
+                grown[:self.rows] = buffer[:self.rows]
+                self._index_buffers[column] = buffer = grown
+            buffer[self.rows:needed] = new_rows[column]
+
+        # The new rows' index chunk first, then the row count that makes them visible. A chunk
+        # left by a crash before store.json is rewritten is not counted and gets overwritten.
+        np.savez(self._index_chunk_path(self.index_chunks), **new_rows)
+        self.rows = needed
+        self.index_chunks += 1
+        self._pending = []
+        self._pending_rows = 0
+
+        settings = {'dim': self.dim, 'dtype': self.dtype.str, 'shard_rows': self.shard_rows, 'rows': self.rows,
+                    'index_chunks': self.index_chunks, 'sources': self.sources}
+        path = os.path.join(self.directory, STORE_FILE)
+        with open(path + '.tmp', 'w') as store_file:
+            json.dump(settings, store_file)
+        os.replace(path + '.tmp', path)
+
+    def select(self, label=None, split=None, sources=None):
+        """
+        :param label: Keep only rows with this label.
+        :param split: Keep only rows of this split name.
+        :param sources: Keep only rows from these source names.
+        :return: Sorted row ids matching all given conditions.
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        if label is not None:
+            mask &= self.index['label'] == label
+        if split is not None:
+            mask &= self.index['split'] == SPLITS.index(split)
+        if sources is not None:
+            codes = [self._source_codes[source] for source in sources if source in self._source_codes]
+            mask &= np.isin(self.index['source'], codes)
+        return np.flatnonzero(mask)
+
+    def read(self, rows):
+        """
+        Gather rows in the given order, one fancy-indexing read per shard touched.
+
+        :param rows: Row ids.
+        :return: np.ndarray of shape (len(rows), dim).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        batch = np.empty((len(rows), self.dim), dtype=self.dtype)
+        shards = rows // self.shard_rows
+        for shard in np.unique(shards):
+            positions = np.flatnonzero(shards == shard)
+            # Sorted offsets read the memory map sequentially
+            order = np.argsort(rows[positions], kind='stable')
+            offsets = rows[positions][order] % self.shard_rows
+            batch[positions[order]] = self._shard(shard)[offsets]
+        return batch
+
+    def iter_batches(self, rows=None, batch_size=4096, shuffle=False, random_state=0):
+        """
+        Stream (embeddings, labels) batches without materializing the whole selection.
+
+        :param rows: Row ids to iterate over (e.g. from select()); None for all rows.
+        :param batch_size: Rows per batch.
+        :param shuffle: Visit the rows in random order.
+        :param random_state: Seed for the shuffle.
+        """
+        rows = np.arange(self.rows) if rows is None else np.asarray(rows)
+        if shuffle:
+            rows = np.random.default_rng(random_state).permutation(rows)
+        for start in range(0, len(rows), batch_size):
+            batch_rows = rows[start:start + batch_size]
+            yield self.read(batch_rows), self.index['label'][batch_rows]
+
+    def load_split(self, split):
+        """
+        :return: (embeddings, labels) of a whole split, for models that need everything in memory.
+        """
+        rows = self.select(split=split)
+        return self.read(rows), self.index['label'][rows]
+
+
+def import_npy_folder(store, directory, label, split='unassigned'):
+    """
+    Append a folder of per-file .npy embeddings (the layout of the training notebooks) to a store.
+
+    Each file is one source; its first axis is the segment. Files are memory-mapped, so a file
+    is copied once, straight into the shard.
+
+    :param store: EmbeddingStore.
+    :param directory: Folder of .npy files.
+    :param label: Label of every window in the folder.
+    :param split: Split of every window in the folder.
+    :return: Number of windows imported.
+    """
+    imported = 0
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.npy'):
+            continue
+        embeddings = np.load(os.path.join(directory, filename), mmap_mode='r')
+        source = os.path.splitext(filename)[0]
+        store.append(embeddings.reshape(len(embeddings), -1), source, np.arange(len(embeddings)), label, split,
+                     commit=False)
+        imported += len(embeddings)
+        if store.pending_rows >= store.shard_rows:
+            store.commit()
+    store.commit()
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, fill and inspect sharded embedding stores")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="append a folder of .npy embeddings")
+    importer.add_argument("store", help="store directory (created if needed)")
+    importer.add_argument("folder", help="folder of .npy files, one per source")
+    importer.add_argument("--label", type=int, required=True, help="0 for podcasts, 1 for ads")
+    importer.add_argument("--split", choices=SPLITS, default="unassigned")
+    importer.add_argument("--dtype", default="float32", help="dtype of a new store")
+    importer.add_argument("--shard-rows", type=int, default=65536, help="rows per shard of a new store")
+
+    info = commands.add_parser("info", help="summarize a store")
+    info.add_argument("store")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        if os.path.exists(os.path.join(args.store, STORE_FILE)):
+            store = EmbeddingStore(args.store)
+        else:
+            first = next(filename for filename in sorted(os.listdir(args.folder)) if filename.endswith('.npy'))
+            sample = np.load(os.path.join(args.folder, first), mmap_mode='r')
+            store = EmbeddingStore.create(args.store, int(np.prod(sample.shape[1:])), args.dtype, args.shard_rows)
+        print(f"Imported {import_npy_folder(store, args.folder, args.label, args.split)} windows into {args.store}")
+    else:
+        store = EmbeddingStore(args.store)
+        print(f"{len(store)} windows of {store.dim} x {store.dtype} from {len(store.sources)} sources")
+        for split in SPLITS:
+            rows = store.select(split=split)
+            if len(rows):
+                ads = int(np.sum(store.index['label'][rows] == 1))
+                print(f"{split:>10}: {len(rows)} windows, {ads} ads")
+
+
+if __name__ == "__main__":
+    main()
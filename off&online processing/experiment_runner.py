@@ -0,0 +1,152 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import pickle
+import time
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+from incremental_training import peak_rss_megabytes
+
+RESULT_COLUMNS = ['embedder', 'window_seconds', 'classifier', 'accuracy', 'precision', 'recall', 'f1',
+                  'fit_seconds', 'latency_ms_per_window', 'model_bytes', 'peak_rss_mb', 'train_windows',
+                  'test_windows']
+CLASSIFIERS = ('svm', 'random_forest', 'knn', 'linear_sgd')
+
+
+def make_classifier(name):
+    """
+    The classifiers compared in the notebooks, with their notebook settings.
+    """
+    if name == 'svm':
+        from sklearn.svm import SVC
+        return SVC(kernel='rbf')
+    if name == 'random_forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=100, random_state=42)
+    if name == 'knn':
+        from sklearn.neighbors import KNeighborsClassifier
+        return KNeighborsClassifier(n_neighbors=11)
+    if name == 'linear_sgd':
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(loss='hinge', class_weight='balanced', random_state=0)
+    raise ValueError(f"Unknown classifier '{name}'")
+
+
+def run_cell(cell):
+    """
+    Train and evaluate one (embedder, window, classifier) cell. Runs in its own worker process,
+    so peak RSS is the cell's own.
+
+    :param cell: (embedder, window_seconds, classifier, store_directory).
+    :return: Dictionary with one value per RESULT_COLUMNS entry.
+    """
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+    embedder, window_seconds, classifier_name, store_directory = cell
+    store = EmbeddingStore(store_directory)
+    train_embeddings, train_labels = store.load_split('train')
+    test_embeddings, test_labels = store.load_split('test')
+
+    model = make_classifier(classifier_name)
+    start = time.perf_counter()
+    model.fit(train_embeddings, train_labels)
+    fit_seconds = time.perf_counter() - start
+
+    # Latency as the detector sees it: one window per call, best of a few rounds over a sample
+    sample = test_embeddings[:min(len(test_embeddings), 200)]
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for embedding in sample:
+            model.predict(embedding[np.newaxis, :])
+        best = min(best, time.perf_counter() - start)
+
+    predictions = model.predict(test_embeddings)
+    return {'embedder': embedder, 'window_seconds': window_seconds, 'classifier': classifier_name,
+            'accuracy': accuracy_score(test_labels, predictions),
+            'precision': precision_score(test_labels, predictions, zero_division=0),
+            'recall': recall_score(test_labels, predictions, zero_division=0),
+            'f1': f1_score(test_labels, predictions, zero_division=0),
+            'fit_seconds': fit_seconds,
+            'latency_ms_per_window': 1000 * best / max(len(sample), 1),
+            'model_bytes': len(pickle.dumps(model)),
+            'peak_rss_mb': peak_rss_megabytes(),
+            'train_windows': len(train_labels), 'test_windows': len(test_labels)}
+
+
+def read_results(csv_path):
+    """
+    :return: List of result rows (dictionaries of strings) already in the CSV, or [] if it doesn't exist.
+    """
+    if not os.path.exists(csv_path):
+        return []
+    with open(csv_path, newline='') as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def run_grid(stores, classifiers, csv_path, workers=None):
+    """
+    Run every (embedder, window, classifier) cell in parallel and append each result to the CSV as it completes.
+
+    Cells already in the CSV are skipped, so an interrupted sweep picks up where it stopped.
+
+    :param stores: Dictionary {(embedder, window_seconds): store_directory} of cached embeddings.
+    :param classifiers: Classifier names (see CLASSIFIERS).
+    :param csv_path: Results CSV.
+    :param workers: Parallel cells; defaults to the CPU count.
+    :return: List of the new result dictionaries.
+    """
+    finished = {(row['embedder'], float(row['window_seconds']), row['classifier']) for row in read_results(csv_path)}
+    cells = [(embedder, window_seconds, classifier, store_directory)
+             for (embedder, window_seconds), store_directory in sorted(stores.items())
+             for classifier in classifiers
+             if (embedder, float(window_seconds), classifier) not in finished]
+    print(f"{len(finished)} cells already done, running {len(cells)}")
+
+    new_results = []
+    write_header = not os.path.exists(csv_path)
+    with open(csv_path, 'a', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=RESULT_COLUMNS)
+        if write_header:
+            writer.writeheader()
+        # One task per worker process: peak RSS is per cell and memory is returned between cells
+        with multiprocessing.get_context('spawn').Pool(workers, maxtasksperchild=1) as pool:
+            for result in pool.imap_unordered(run_cell, cells):
+                writer.writerow(result)
+                csv_file.flush()
+                new_results.append(result)
+                print(f"{result['embedder']} {result['window_seconds']} s {result['classifier']}: "
+                      f"accuracy {result['accuracy']:.3f}, F1 {result['f1']:.3f}, "
+                      f"{result['latency_ms_per_window']:.2f} ms/window")
+    return new_results
+
+
+def parse_store_argument(value):
+    """
+    :param value: 'embedder:window=store_directory', e.g. 'vggish:3=stores/vggish_3sec'.
+    :return: ((embedder, window_seconds), store_directory).
+    """
+    key, store_directory = value.split('=', 1)
+    embedder, window_seconds = key.split(':')
+    return (embedder, float(window_seconds)), store_directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the window x embedder x classifier grid in parallel")
+    parser.add_argument("--store", action="append", required=True, type=parse_store_argument,
+                        help="embedder:window=store_directory, once per cached embedding set")
+    parser.add_argument("--classifiers", nargs="+", choices=CLASSIFIERS, default=['svm', 'random_forest', 'knn'])
+    parser.add_argument("--output", default="experiment_results.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    run_grid(dict(args.store), args.classifiers, args.output, args.workers)
+    print(f"Results in {args.output}, sweep took {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import os
+import sys
+
+import joblib
+import numpy as np
+
+# Lowest share of held-out windows on which an exported model must agree with the original
+MIN_AGREEMENT = 0.99
+
+
+class RandomFourierFeatures:
+    """
+    Random Fourier feature map whose dot products approximate the RBF kernel exp(-gamma * ||x - y||^2).
+    """
+    def __init__(self, projection, offset):
+        """
+        :param projection: Random projection matrix of shape (input_dim, n_components).
+        :param offset: Random phase offsets of shape (n_components,).
+        """
+        self.projection = projection
+        self.offset = offset
+
+    @classmethod
+    def sample(cls, gamma, input_dim, n_components, random_state=0):
+        """
+        Draw a feature map for the given RBF gamma.
+
+        :param gamma: RBF kernel coefficient of the SVM.
+        :param input_dim: Embedding dimension.
+        :param n_components: Number of random features; more features give a closer approximation.
+        :param random_state: Seed for the random draw.
+        :return: RandomFourierFeatures instance.
+        """
+        rng = np.random.default_rng(random_state)
+        projection = rng.normal(scale=np.sqrt(2 * gamma), size=(input_dim, n_components)).astype(np.float32)
+        offset = rng.uniform(0, 2 * np.pi, size=n_components).astype(np.float32)
+        return cls(projection, offset)
+
+    def transform(self, embeddings):
+        features = embeddings @ self.projection
+        features += self.offset
+        np.cos(features, out=features)
+        features *= np.sqrt(2.0 / len(self.offset))
+        return features
+
+    def arrays(self):
+        return {'rff_projection': self.projection, 'rff_offset': self.offset}
+
+
+class NystroemFeatures:
+    """
+    Nystroem feature map for the RBF kernel, built on a set of landmark vectors.
+    """
+    def __init__(self, landmarks, normalization, gamma):
+        """
+        :param landmarks: Landmark vectors of shape (n_components, input_dim).
+        :param normalization: K(landmarks, landmarks)^(-1/2), shape (n_components, n_components).
+        :param gamma: RBF kernel coefficient.
+        """
+        self.landmarks = landmarks
+        self.normalization = normalization
+        self.gamma = float(gamma)
+        self.landmark_norms = np.einsum('ij,ij->i', landmarks, landmarks)
+
+    @classmethod
+    def from_landmarks(cls, landmarks, gamma):
+        landmarks = landmarks.astype(np.float32)
+        kernel = rbf_kernel(landmarks, landmarks, gamma)
+        # Inverse square root through the eigendecomposition, dropping numerically null directions
+        eigenvalues, eigenvectors = np.linalg.eigh(kernel)
+        eigenvalues = np.maximum(eigenvalues, 1e-12)
+        normalization = (eigenvectors / np.sqrt(eigenvalues)) @ eigenvectors.T
+        return cls(landmarks, normalization.astype(np.float32), gamma)
+
+    def transform(self, embeddings):
+        return rbf_kernel(embeddings, self.landmarks, self.gamma, self.landmark_norms) @ self.normalization
+
+    def arrays(self):
+        return {'nystroem_landmarks': self.landmarks, 'nystroem_normalization': self.normalization,
+                'nystroem_gamma': np.array(self.gamma)}
+
+
+def rbf_kernel(x, y, gamma, y_norms=None):
+    """
+    Compute exp(-gamma * ||x - y||^2) for all pairs of rows with a single matrix product.
+    """
+    if y_norms is None:
+        y_norms = np.einsum('ij,ij->i', y, y)
+    squared_distances = np.einsum('ij,ij->i', x, x)[:, np.newaxis] - 2 * (x @ y.T) + y_norms
+    np.maximum(squared_distances, 0, out=squared_distances)
+    return np.exp(-gamma * squared_distances)
+
+
+class LinearModel:
+    """
+    Classifier compiled to a single dot product: decision = feature_map(x) . weights + bias.
+
+    Exposes the same predict/decision_function interface as the scikit-learn model it was
+    exported from, so it can replace it in AudioProcessor.
+    """
+    def __init__(self, weights, bias, classes=(0, 1), feature_map=None):
+        """
+        :param weights: Weight vector in (mapped) feature space.
+        :param bias: Intercept.
+        :param classes: Labels for negative and positive decisions, as in the sklearn classes_.
+        :param feature_map: Optional RandomFourierFeatures/NystroemFeatures applied before the dot product.
+        """
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.classes_ = np.asarray(classes)
+        self.feature_map = feature_map
+
+    def decision_function(self, embeddings):
+        """
+        :param embeddings: np.ndarray of shape (n_windows, embedding_dim).
+        :return: np.ndarray of shape (n_windows,) with signed distances to the decision boundary.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.feature_map is not None:
+            embeddings = self.feature_map.transform(embeddings)
+        return embeddings @ self.weights + self.bias
+
+    def predict(self, embeddings):
+        return self.classes_[(self.decision_function(embeddings) > 0).astype(int)]
+
+    def save(self, path):
+        """
+        Save the model to a NumPy .npz file.
+
+        :param path: Output path.
+        """
+        arrays = {'weights': self.weights, 'bias': np.array(self.bias), 'classes': self.classes_}
+        if self.feature_map is not None:
+            arrays.update(self.feature_map.arrays())
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a model saved with save().
+
+        :param path: Path to the .npz file.
+        :return: LinearModel instance.
+        """
+        with np.load(path) as arrays:
+            feature_map = None
+            if 'rff_projection' in arrays:
+                feature_map = RandomFourierFeatures(arrays['rff_projection'], arrays['rff_offset'])
+            elif 'nystroem_landmarks' in arrays:
+                feature_map = NystroemFeatures(arrays['nystroem_landmarks'], arrays['nystroem_normalization'],
+                                               arrays['nystroem_gamma'])
+            return cls(arrays['weights'], arrays['bias'], arrays['classes'], feature_map)
+
+
+def export_svm(svm_model, approximation='nystroem', n_components=2048, random_state=0):
+    """
+    Compile a trained binary sklearn SVC (or any linear model with coef_/intercept_) into a LinearModel.
+
+    Linear models are exported exactly. For RBF SVMs the kernel expansion over the support
+    vectors is folded into a single weight vector in an approximate feature space, so the
+    prediction cost no longer depends on the number of support vectors.
+
+    :param svm_model: Trained classifier.
+    :param approximation: 'nystroem' or 'rff' (random Fourier features) for RBF kernels. Nystroem on the
+        heaviest support vectors reproduces the SVM far more closely at the same size.
+    :param n_components: Size of the approximate feature space for RBF kernels.
+    :param random_state: Seed for the random features / landmark choice.
+    :return: LinearModel instance.
+    """
+    kernel = getattr(svm_model, 'kernel', 'linear')
+    if kernel == 'linear':
+        return LinearModel(np.ravel(svm_model.coef_), svm_model.intercept_[0], svm_model.classes_)
+    if kernel != 'rbf':
+        raise ValueError(f"Can't export an SVM with a '{kernel}' kernel")
+
+    support_vectors = svm_model.support_vectors_.astype(np.float32)
+    dual_coef = svm_model.dual_coef_[0].astype(np.float32)
+    gamma = svm_model._gamma
+
+    if approximation == 'rff':
+        feature_map = RandomFourierFeatures.sample(gamma, support_vectors.shape[1], n_components, random_state)
+    elif approximation == 'nystroem':
+        # Landmarks are the support vectors that weigh most in the decision function
+        order = np.argsort(-np.abs(dual_coef))[:n_components]
+        feature_map = NystroemFeatures.from_landmarks(support_vectors[order], gamma)
+    else:
+        raise ValueError(f"Unknown approximation '{approximation}'")
+
+    # decision(x) = sum_i alpha_i K(sv_i, x) + b ~= (sum_i alpha_i phi(sv_i)) . phi(x) + b
+    weights = dual_coef @ feature_map.transform(support_vectors)
+    return LinearModel(weights, svm_model.intercept_[0], svm_model.classes_, feature_map)
+
+
+def load_classifier(model_path):
+    """
+    Load a classifier from either an exported .npz LinearModel or a joblib pickle.
+
+    :param model_path: Path to the model file.
+    :return: Object with a predict() method.
+    """
+    if model_path.endswith('.npz'):
+        return LinearModel.load(model_path)
+    return joblib.load(model_path)
+
+
+def check_parity(svm_model, fast_model, embeddings, labels=None):
+    """
+    Compare an exported model with the original on the same embeddings.
+
+    :param svm_model: Original sklearn model.
+    :param fast_model: Exported LinearModel.
+    :param embeddings: np.ndarray of shape (n_windows, embedding_dim), e.g. the held-out test set.
+    :param labels: Optional true labels to also report both accuracies.
+    :return: Dictionary with the prediction agreement and, if labels are given, both accuracies.
+    """
+    svm_predictions = svm_model.predict(embeddings)
+    fast_predictions = fast_model.predict(embeddings)
+    results = {'agreement': float(np.mean(svm_predictions == fast_predictions))}
+    if labels is not None:
+        results['svm_accuracy'] = float(np.mean(svm_predictions == labels))
+        results['fast_accuracy'] = float(np.mean(fast_predictions == labels))
+    return results
+
+
+def load_embeddings_folder(directory):
+    """
+    Load and flatten all .npy embedding files in a folder (the layout used by the training notebooks).
+
+    :param directory: Folder containing .npy files of shape (n_windows, ...).
+    :return: np.ndarray of shape (n_windows, embedding_dim).
+    """
+    arrays = [np.load(os.path.join(directory, filename)) for filename in sorted(os.listdir(directory))
+              if filename.endswith('.npy')]
+    embeddings = np.concatenate(arrays, axis=0)
+    return embeddings.reshape(len(embeddings), -1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a trained SVM to a fast .npz model")
+    parser.add_argument("model_path", help="joblib-pickled SVM")
+    parser.add_argument("output_path", help="where to write the .npz model")
+    parser.add_argument("--approximation", choices=["rff", "nystroem"], default="nystroem")
+    parser.add_argument("--components", type=int, default=2048)
+    parser.add_argument("--test-podcasts", help="folder of held-out podcast embeddings (.npy)")
+    parser.add_argument("--test-ads", help="folder of held-out ad embeddings (.npy)")
+    parser.add_argument("--min-agreement", type=float, default=MIN_AGREEMENT,
+                        help="exit with an error if the export agrees with the SVM on fewer test windows")
+    args = parser.parse_args()
+
+    svm_model = joblib.load(args.model_path)
+    fast_model = export_svm(svm_model, args.approximation, args.components)
+
+    if args.test_podcasts and args.test_ads:
+        podcasts = load_embeddings_folder(args.test_podcasts)
+        ads = load_embeddings_folder(args.test_ads)
+        embeddings = np.concatenate((podcasts, ads))
+        labels = np.concatenate((np.zeros(len(podcasts), dtype=int), np.ones(len(ads), dtype=int)))
+        parity = check_parity(svm_model, fast_model, embeddings, labels)
+        print(parity)
+        if parity['agreement'] < args.min_agreement:
+            # Nothing is written, so a deployment script can't pick up an export that decides differently
+            sys.exit(f"Exported model agrees with the SVM on {parity['agreement']:.3f} of the test windows, "
+                     f"below {args.min_agreement}; try another approximation or more components")
+
+    fast_model.save(args.output_path)
+    print(f"Exported model saved to {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+from fast_classifier import LinearModel, RandomFourierFeatures
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_megabytes():
+    """
+    :return: Peak resident set size of this process in MiB, or None where it can't be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB on Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def streaming_moments(store, rows, batch_size=8192):
+    """
+    Per-dimension mean and standard deviation in one streaming pass (Chan et al. parallel update).
+
+    :return: (mean, std) as float64 arrays of shape (store.dim,).
+    """
+    count, mean, m2 = 0, np.zeros(store.dim), np.zeros(store.dim)
+    for embeddings, _ in store.iter_batches(rows, batch_size):
+        embeddings = embeddings.astype(np.float64)
+        batch_count = len(embeddings)
+        batch_mean = embeddings.mean(axis=0)
+        delta = batch_mean - mean
+        total = count + batch_count
+        mean += delta * batch_count / total
+        m2 += ((embeddings - batch_mean) ** 2).sum(axis=0) + delta ** 2 * count * batch_count / total
+        count = total
+    return mean, np.sqrt(m2 / max(count, 1)) + 1e-6
+
+
+def fold_standardization(model, mean, std):
+    """
+    Fold (x - mean) / std into the exported model, so inference takes raw embeddings.
+
+    :param model: LinearModel trained on standardized inputs.
+    :return: LinearModel giving the same decisions on raw inputs.
+    """
+    if model.feature_map is None:
+        weights = model.weights / std
+        return LinearModel(weights, model.bias - np.dot(weights, mean), model.classes_)
+    # ((x - mean) / std) @ P + offset == x @ (P / std) + (offset - (mean / std) @ P)
+    projection = model.feature_map.projection
+    feature_map = RandomFourierFeatures((projection / std[:, np.newaxis]).astype(np.float32),
+                                        (model.feature_map.offset - (mean / std) @ projection).astype(np.float32))
+    return LinearModel(model.weights, model.bias, model.classes_, feature_map)
+
+
+def train_incremental(store, train_rows, validation_rows=None, rff_components=None, gamma=None, epochs=5,
+                      batch_size=4096, alpha=1e-5, random_state=0):
+    """
+    Train a hinge-loss linear classifier (a linear SVM) with SGD, streaming minibatches from the store.
+
+    Memory use is one batch plus the model, whatever the size of the training set. With
+    rff_components, inputs first go through random Fourier features, approximating an RBF SVM.
+
+    :param store: EmbeddingStore.
+    :param train_rows: Row ids to train on, e.g. store.select(split='train').
+    :param validation_rows: Optional row ids scored after every epoch.
+    :param rff_components: Number of random Fourier features, or None for a linear model.
+    :param gamma: RBF gamma for the random features; defaults to 1 / dim (inputs are standardized).
+    :param epochs: Passes over the training rows, each in a new random order.
+    :param batch_size: Rows per partial_fit call.
+    :param alpha: SGD regularization strength.
+    :param random_state: Seed for shuffling and the random features.
+    :return: (LinearModel taking raw embeddings, list of per-epoch dictionaries).
+    """
+    from sklearn.linear_model import SGDClassifier
+
+    mean, std = streaming_moments(store, train_rows)
+    feature_map = None
+    if rff_components:
+        feature_map = RandomFourierFeatures.sample(gamma or 1.0 / store.dim, store.dim, rff_components, random_state)
+
+    def features(embeddings):
+        standardized = ((embeddings - mean) / std).astype(np.float32)
+        return feature_map.transform(standardized) if feature_map is not None else standardized
+
+    labels = store.index['label'][train_rows]
+    counts = np.bincount(labels, minlength=2)
+    class_weight = {label: len(labels) / (2 * max(count, 1)) for label, count in enumerate(counts)}
+    classifier = SGDClassifier(loss='hinge', alpha=alpha, class_weight=class_weight, random_state=random_state)
+
+    history = []
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        for embeddings, batch_labels in store.iter_batches(train_rows, batch_size, shuffle=True,
+                                                           random_state=random_state + epoch):
+            classifier.partial_fit(features(embeddings), batch_labels, classes=np.array([0, 1]))
+        record = {'epoch': epoch + 1, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_megabytes()}
+        if validation_rows is not None and len(validation_rows):
+            correct = sum(int(np.sum(classifier.predict(features(embeddings)) == batch_labels))
+                          for embeddings, batch_labels in store.iter_batches(validation_rows, batch_size))
+            record['validation_accuracy'] = correct / len(validation_rows)
+        history.append(record)
+        print(record)
+
+    model = LinearModel(classifier.coef_.ravel(), classifier.intercept_[0], classifier.classes_, feature_map)
+    return fold_standardization(model, mean, std), history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a linear / RFF SVM out of core from an embedding store")
+    parser.add_argument("store", help="embedding store directory")
+    parser.add_argument("--rff", type=int, default=None, help="random Fourier features (approximate RBF SVM)")
+    parser.add_argument("--gamma", type=float, default=None, help="RBF gamma on standardized inputs")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--alpha", type=float, default=1e-5)
+    parser.add_argument("--output", default="incremental_svm.npz", help="exported LinearModel (.npz)")
+    parser.add_argument("--register", default=None, help="also register the model under this name")
+    parser.add_argument("--embedder", choices=["vggish", "openl3"], default="vggish")
+    parser.add_argument("--window", type=float, default=None, help="window length, required with --register")
+    parser.add_argument("--reducer", default=None,
+                        help="EmbeddingReducer (.npz) the store was extracted with, registered with the model")
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.store)
+    train_rows = store.select(split='train')
+    validation_rows = store.select(split='validation')
+    test_rows = store.select(split='test')
+    print(f"Training on {len(train_rows)} windows of {store.dim} dims "
+          f"({len(train_rows) * store.dim * store.dtype.itemsize / 2 ** 30:.2f} GiB on disk)")
+
+    start = time.perf_counter()
+    model, history = train_incremental(store, train_rows, validation_rows, args.rff, args.gamma, args.epochs,
+                                       args.batch_size, args.alpha)
+    wall_seconds = time.perf_counter() - start
+
+    metrics = {'wall_seconds': wall_seconds, 'peak_rss_mb': peak_rss_megabytes(), 'train_windows': len(train_rows)}
+    if len(test_rows):
+        correct = sum(int(np.sum(model.predict(embeddings) == labels))
+                      for embeddings, labels in store.iter_batches(test_rows))
+        metrics['test_accuracy'] = correct / len(test_rows)
+    print(f"Wall time {wall_seconds:.1f} s, peak RSS {metrics['peak_rss_mb']} MiB, "
+          f"test accuracy {metrics.get('test_accuracy')}")
+
+    model.save(args.output)
+    print(f"Model saved to {args.output}")
+    if args.register:
+        from embedding_reduction import EmbeddingReducer
+        from model_registry import register_model
+
+        if args.window is None:
+            parser.error("--window is required with --register")
+        # A model trained on a reduced store takes reduced inputs; the registry applies the reducer at inference
+        reducer = EmbeddingReducer.load(args.reducer) if args.reducer else None
+        path = register_model(args.register, model, args.embedder, args.window, reducer=reducer, metrics=metrics)
+        print(f"Registered {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import json
+import os
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+class BruteForceIndex:
+    """
+    Exact nearest-neighbor search with chunked matrix products. Used as the fallback backend
+    and as the reference when measuring the recall of the approximate backends.
+    """
+    backend = 'brute'
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._vector_buffer = np.zeros((0, dim), dtype=np.float32)
+        self._norm_buffer = np.zeros(0, dtype=np.float32)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def vectors(self):
+        return self._vector_buffer[:self._count]
+
+    @property
+    def norms(self):
+        return self._norm_buffer[:self._count]
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        needed = self._count + len(vectors)
+        if needed > len(self._vector_buffer):
+            # Grow geometrically, so n inserts cost O(n) copying in total
+            capacity = max(needed, 2 * len(self._vector_buffer), 1024)
+            vector_buffer = np.empty((capacity, self.dim), dtype=np.float32)
+            norm_buffer = np.empty(capacity, dtype=np.float32)
+            vector_buffer[:self._count] = self.vectors
+            norm_buffer[:self._count] = self.norms
+            self._vector_buffer, self._norm_buffer = vector_buffer, norm_buffer
+        self._vector_buffer[self._count:needed] = vectors
+        self._norm_buffer[self._count:needed] = np.einsum('ij,ij->i', vectors, vectors)
+        self._count = needed
+
+    # Exact search has no effort setting
+    search_effort = None
+
+    def set_search_effort(self, effort):
+        pass
+
+    def search(self, queries, k, chunk_size=1024):
+        """
+        :param queries: np.ndarray of shape (n_queries, dim).
+        :param k: Number of neighbors; clamped to the number of indexed vectors.
+        :param chunk_size: Queries per matrix product, bounding the memory of the distance matrix.
+        :return: (distances, ids), both of shape (n_queries, min(k, len(index))); distances are Euclidean.
+        :raises ValueError: If the index is empty.
+        """
+        if not self._count:
+            raise ValueError("Can't search an empty index")
+        k = min(k, self._count)
+        queries = np.asarray(queries, dtype=np.float32)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            squared = np.einsum('ij,ij->i', chunk, chunk)[:, np.newaxis] - 2 * (chunk @ self.vectors.T) + self.norms
+            nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+            nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+            order = np.argsort(nearest_squared, axis=1)
+            ids[start:start + chunk_size] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + chunk_size] = np.sqrt(np.maximum(
+                np.take_along_axis(nearest_squared, order, axis=1), 0))
+        return distances, ids
+
+    def save(self, path):
+        np.save(path + '.npy', self.vectors)
+
+    @classmethod
+    def load(cls, path, dim):
+        index = cls(dim)
+        index.add(np.load(path + '.npy'))
+        return index
+
+
+class HnswIndex:
+    """
+    HNSW graph index (hnswlib). Search effort is the ef parameter: higher means better recall and slower queries.
+    """
+    backend = 'hnsw'
+
+    def __init__(self, dim, max_elements=100000, m=16, ef_construction=200, ef=64):
+        """
+        :param dim: Embedding dimension.
+        :param max_elements: Initial capacity; grown automatically on add().
+        :param m: Graph degree.
+        :param ef_construction: Candidate list size while building.
+        :param ef: Candidate list size while searching.
+        """
+        self.dim = dim
+        self.index = hnswlib.Index(space='l2', dim=dim)
+        self.index.init_index(max_elements=max_elements, M=m, ef_construction=ef_construction)
+        self.index.set_ef(ef)
+
+    def __len__(self):
+        return self.index.get_current_count()
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        needed = len(self) + len(vectors)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, np.arange(len(self), needed))
+
+    @property
+    def search_effort(self):
+        return self.index.ef
+
+    def set_search_effort(self, effort):
+        self.index.set_ef(effort)
+
+    def search(self, queries, k):
+        # ef must be at least k for this query only; the configured search effort is kept
+        ef = self.index.ef
+        if k > ef:
+            self.index.set_ef(k)
+        try:
+            ids, squared = self.index.knn_query(np.asarray(queries, dtype=np.float32), k=k)
+        finally:
+            if k > ef:
+                self.index.set_ef(ef)
+        return np.sqrt(squared), ids.astype(np.int64)
+
+    def save(self, path):
+        self.index.save_index(path + '.hnsw')
+
+    @classmethod
+    def load(cls, path, dim):
+        index = cls.__new__(cls)
+        index.dim = dim
+        index.index = hnswlib.Index(space='l2', dim=dim)
+        index.index.load_index(path + '.hnsw')
+        return index
+
+
+class IvfPqIndex:
+    """
+    Inverted-file index with product quantization (faiss). Search effort is nprobe, the number
+    of inverted lists scanned per query. Needs a training sample before the first add(): call
+    train() with a representative sample, or make the first add() large enough to train on.
+    """
+    backend = 'ivfpq'
+
+    def __init__(self, dim, nlist=1024, subquantizers=16, bits=8, nprobe=16):
+        """
+        :param dim: Embedding dimension (must be divisible by subquantizers).
+        :param nlist: Number of coarse clusters.
+        :param subquantizers: Number of PQ sub-vectors; each vector is stored in subquantizers * bits bits.
+        :param bits: Bits per sub-vector code.
+        :param nprobe: Clusters scanned per query.
+        """
+        self.dim = dim
+        quantizer = faiss.IndexFlatL2(dim)
+        self.index = faiss.IndexIVFPQ(quantizer, dim, nlist, subquantizers, bits)
+        self.index.nprobe = nprobe
+
+    def __len__(self):
+        return self.index.ntotal
+
+    @property
+    def min_training_size(self):
+        """
+        :return: Fewest training vectors for usable clusters: faiss wants about 39 per coarse
+            cluster and per PQ centroid.
+        """
+        return 39 * max(self.index.nlist, 2 ** self.index.pq.nbits)
+
+    def train(self, vectors):
+        """
+        Train the coarse quantizer and the product quantizer.
+
+        :param vectors: Representative sample, at least min_training_size vectors.
+        :raises ValueError: If the sample is too small for nlist and bits.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) < self.min_training_size:
+            raise ValueError(f"IVF-PQ with nlist={self.index.nlist} needs at least {self.min_training_size} "
+                             f"training vectors, got {len(vectors)}; use a smaller nlist or the hnsw/brute backend")
+        self.index.train(vectors)
+
+    def add(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not self.index.is_trained:
+            self.train(vectors)
+        self.index.add(vectors)
+
+    @property
+    def search_effort(self):
+        return self.index.nprobe
+
+    def set_search_effort(self, effort):
+        self.index.nprobe = effort
+
+    def search(self, queries, k):
+        squared, ids = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        return np.sqrt(np.maximum(squared, 0)), ids
+
+    def save(self, path):
+        faiss.write_index(self.index, path + '.ivfpq')
+
+    @classmethod
+    def load(cls, path, dim):
+        index = cls.__new__(cls)
+        index.dim = dim
+        index.index = faiss.read_index(path + '.ivfpq')
+        return index
+
+
+INDEX_BACKENDS = {index_class.backend: index_class for index_class in (BruteForceIndex, HnswIndex, IvfPqIndex)}
+
+
+def create_index(dim, backend=None, **index_params):
+    """
+    Create a nearest-neighbor index, preferring the approximate backends that are installed.
+
+    :param dim: Embedding dimension.
+    :param backend: 'hnsw', 'ivfpq' or 'brute'; None picks hnsw, then ivfpq, then brute.
+    :param index_params: Extra keyword arguments for the index constructor.
+    :return: Index instance.
+    """
+    if backend is None:
+        backend = 'hnsw' if hnswlib is not None else 'ivfpq' if faiss is not None else 'brute'
+    return INDEX_BACKENDS[backend](dim, **index_params)
+
+
+def recall_at_k(index, reference_vectors, queries, k):
+    """
+    Measure the fraction of true k nearest neighbors an index returns.
+
+    :param index: Index built from reference_vectors, in the same order.
+    :param reference_vectors: The vectors that were added to the index.
+    :param queries: Query vectors.
+    :param k: Number of neighbors.
+    :return: Recall in [0, 1].
+    """
+    exact = BruteForceIndex(index.dim)
+    exact.add(reference_vectors)
+    _, true_ids = exact.search(queries, k)
+    _, found_ids = index.search(queries, k)
+    hits = sum(len(np.intersect1d(true_row, found_row)) for true_row, found_row in zip(true_ids, found_ids))
+    return hits / true_ids.size
+
+
+class KnnAnomalyDetector:
+    """
+    KNN anomaly detector from the Anomaly Detection notebooks, backed by an approximate index.
+
+    The index holds normal (podcast) embeddings. A window's score is its mean distance to its
+    k nearest normal neighbors; windows scoring above the threshold are flagged as ads.
+    """
+    def __init__(self, index, n_neighbors=11):
+        """
+        :param index: Index from create_index().
+        :param n_neighbors: Number of neighbors averaged in the score.
+        """
+        self.index = index
+        self.n_neighbors = n_neighbors
+        self.anomaly_threshold = None
+        self.normal_threshold = None
+        self.threshold = None
+
+    def fit(self, normal_embeddings):
+        """
+        Add normal embeddings to the index. Can be called again to insert more data incrementally.
+
+        :param normal_embeddings: np.ndarray of shape (n_windows, dim).
+        """
+        self.index.add(normal_embeddings)
+        return self
+
+    def score_batch(self, embeddings):
+        """
+        :param embeddings: np.ndarray of shape (n_windows, dim).
+        :return: Mean distance to the k nearest normal embeddings, shape (n_windows,).
+        """
+        distances, _ = self.index.search(embeddings, self.n_neighbors)
+        return distances.mean(axis=1)
+
+    def calculate_thresholds(self, anomaly_embeddings, normal_embeddings):
+        """
+        Set the thresholds as in the notebooks: 2 standard deviations above the anomaly mean
+        distance and below the normal mean distance, with the decision threshold halfway.
+
+        :param anomaly_embeddings: Ad embeddings from the training set.
+        :param normal_embeddings: Podcast embeddings from the training set.
+        :return: (anomaly_threshold, normal_threshold)
+        """
+        anomaly_mean_distance = self.score_batch(anomaly_embeddings)
+        normal_mean_distance = self.score_batch(normal_embeddings)
+        self.anomaly_threshold = float(anomaly_mean_distance.mean() + 2 * anomaly_mean_distance.std())
+        self.normal_threshold = float(normal_mean_distance.mean() - 2 * normal_mean_distance.std())
+        self.threshold = (self.anomaly_threshold + self.normal_threshold) / 2
+        return self.anomaly_threshold, self.normal_threshold
+
+    def predict(self, embeddings):
+        """
+        :param embeddings: np.ndarray of shape (n_windows, dim).
+        :return: np.ndarray of ints, 1 for ads and 0 for content.
+        """
+        return (self.score_batch(embeddings) > self.threshold).astype(int)
+
+    def save(self, directory):
+        """
+        Save the index file and the detector settings into a directory.
+
+        :param directory: Output directory, created if needed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.index.save(os.path.join(directory, 'index'))
+        settings = {'backend': self.index.backend, 'dim': self.index.dim, 'n_neighbors': self.n_neighbors,
+                    'anomaly_threshold': self.anomaly_threshold, 'normal_threshold': self.normal_threshold,
+                    'threshold': self.threshold, 'search_effort': self.index.search_effort}
+        with open(os.path.join(directory, 'detector.json'), 'w') as f:
+            json.dump(settings, f, indent=2)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Load a detector saved with save().
+
+        :param directory: Directory written by save().
+        :return: KnnAnomalyDetector instance.
+        """
+        with open(os.path.join(directory, 'detector.json')) as f:
+            settings = json.load(f)
+        index = INDEX_BACKENDS[settings['backend']].load(os.path.join(directory, 'index'), settings['dim'])
+        # The index files don't keep ef / nprobe, so the tuned effort is restored from the settings
+        if settings.get('search_effort') is not None:
+            index.set_search_effort(settings['search_effort'])
+        detector = cls(index, settings['n_neighbors'])
+        detector.anomaly_threshold = settings['anomaly_threshold']
+        detector.normal_threshold = settings['normal_threshold']
+        detector.threshold = settings['threshold']
+        return detector
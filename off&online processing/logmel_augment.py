@@ -0,0 +1,284 @@
+import argparse
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import vggish_params
+from audio_frontend import load_window_folder
+
+# Log-mel value of silence: vggish_input computes log(mel + LOG_OFFSET)
+SILENCE = float(np.log(vggish_params.LOG_OFFSET))
+
+
+def to_mel(examples):
+    """
+    :param examples: Log-mel examples as produced by vggish_input.
+    :return: Mel magnitudes, the inverse of log(mel + LOG_OFFSET).
+    """
+    return np.maximum(np.exp(examples) - vggish_params.LOG_OFFSET, 0.0)
+
+
+def to_log_mel(mel):
+    """
+    :param mel: Mel magnitudes.
+    :return: Log-mel examples in the vggish_input convention.
+    """
+    return np.log(mel + vggish_params.LOG_OFFSET).astype(np.float32)
+
+
+def gain_shift(examples, gain_db):
+    """
+    Apply a gain to log-mel examples, exactly as if the waveform had been scaled before the frontend.
+
+    The mel spectrogram is a linear function of the STFT magnitude, so a gain g scales it by g;
+    the offset inside the log is why this is not just an additive shift.
+
+    :param examples: np.ndarray of shape (..., NUM_FRAMES, NUM_BANDS).
+    :param gain_db: Gain in dB; a scalar or one value per leading index (broadcast over frames and bands).
+    :return: Shifted examples.
+    """
+    gain = 10.0 ** (np.asarray(gain_db, dtype=np.float32) / 20.0)
+    return to_log_mel(to_mel(examples) * gain[..., np.newaxis, np.newaxis])
+
+
+def mix(examples, background_examples, snr_db):
+    """
+    Mix a background under log-mel examples at a given signal-to-background ratio.
+
+    Magnitudes are added in the mel domain, which ignores phase between the two signals;
+    for speech or music under an ad this is close to mixing the waveforms.
+
+    :param examples: np.ndarray of shape (n, NUM_FRAMES, NUM_BANDS), e.g. ad windows.
+    :param background_examples: Same shape, e.g. podcast windows.
+    :param snr_db: Ratio of example to background energy in dB, scalar or one per example.
+    :return: Mixed examples.
+    """
+    mel, background = to_mel(examples), to_mel(background_examples)
+    energy = np.mean(mel ** 2, axis=(-2, -1))
+    background_energy = np.mean(background ** 2, axis=(-2, -1)) + 1e-12
+    scale = np.sqrt(energy / background_energy / 10.0 ** (np.asarray(snr_db, dtype=np.float32) / 10.0))
+    return to_log_mel(mel + background * scale[..., np.newaxis, np.newaxis])
+
+
+def spec_augment(examples, rng, time_masks=2, max_time_width=12, frequency_masks=2, max_frequency_width=8):
+    """
+    SpecAugment-style masking: set random frame and mel band ranges of each example to silence.
+
+    :param examples: np.ndarray of shape (n, NUM_FRAMES, NUM_BANDS); masked in place.
+    :param rng: np.random.Generator.
+    :param time_masks: Frame masks per example.
+    :param max_time_width: Widest frame mask.
+    :param frequency_masks: Band masks per example.
+    :param max_frequency_width: Widest band mask.
+    :return: The masked examples.
+    """
+    n, num_frames, num_bands = examples.shape
+    frames, bands = np.arange(num_frames), np.arange(num_bands)
+    mask = np.zeros(examples.shape, dtype=bool)
+    for count, max_width, size, positions, axis in ((time_masks, max_time_width, num_frames, frames, 1),
+                                                    (frequency_masks, max_frequency_width, num_bands, bands, 2)):
+        if not count:
+            continue
+        widths = rng.integers(0, max_width + 1, size=(n, count))
+        starts = rng.integers(0, size, size=(n, count))
+        # (n, count, size) -> any over the masks -> (n, size)
+        hit = ((positions >= starts[..., np.newaxis]) & (positions < (starts + widths)[..., np.newaxis])).any(axis=1)
+        mask |= np.expand_dims(hit, axis=3 - axis)
+    examples[mask] = SILENCE
+    return examples
+
+
+class LogMelAugmenter:
+    """
+    Random augmentation of cached VGGish log-mel windows, so new training examples cost no
+    resampling or STFT: only the augmentation itself and the embedder.
+    """
+    def __init__(self, backgrounds=None, gain_db_range=(-12.0, 6.0), mix_probability=0.5, snr_db_range=(0.0, 15.0),
+                 time_masks=2, max_time_width=12, frequency_masks=2, max_frequency_width=8, random_state=0):
+        """
+        :param backgrounds: Optional list of per-window log-mel arrays (e.g. podcast windows) mixed under ads.
+        :param gain_db_range: (low, high) of the uniform random gain.
+        :param mix_probability: Chance that an ad window gets a background.
+        :param snr_db_range: (low, high) of the uniform random ad-to-background ratio.
+        :param time_masks: See spec_augment.
+        :param max_time_width: See spec_augment.
+        :param frequency_masks: See spec_augment.
+        :param max_frequency_width: See spec_augment.
+        :param random_state: Seed.
+        """
+        self.backgrounds = backgrounds or []
+        self.gain_db_range = gain_db_range
+        self.mix_probability = mix_probability
+        self.snr_db_range = snr_db_range
+        self.time_masks = time_masks
+        self.max_time_width = max_time_width
+        self.frequency_masks = frequency_masks
+        self.max_frequency_width = max_frequency_width
+        self.rng = np.random.default_rng(random_state)
+
+    def augment(self, window_examples, labels):
+        """
+        Augment a batch of windows.
+
+        :param window_examples: List of per-window log-mel arrays.
+        :param labels: Window labels (0 podcast, 1 ad); only ads get a background.
+        :return: List of augmented per-window log-mel arrays (the inputs are not modified).
+        """
+        counts = [len(examples) for examples in window_examples]
+        examples = np.concatenate(window_examples)
+        window_of_example = np.repeat(np.arange(len(window_examples)), counts)
+
+        # The same gain over all examples of a window, like a level change in the source
+        gains = self.rng.uniform(*self.gain_db_range, size=len(window_examples))
+        examples = gain_shift(examples, gains[window_of_example])
+
+        if self.backgrounds and self.mix_probability > 0:
+            mixed = np.flatnonzero((np.asarray(labels) == 1) &
+                                   (self.rng.random(len(window_examples)) < self.mix_probability))
+            mixed_examples = np.isin(window_of_example, mixed)
+            if mixed_examples.any():
+                background = np.concatenate([self.backgrounds[i] for i in
+                                             self.rng.integers(0, len(self.backgrounds), size=len(mixed))])
+                # Line background examples up with the ad examples, tiling short backgrounds
+                background = background[np.arange(int(mixed_examples.sum())) % len(background)]
+                snr = self.rng.uniform(*self.snr_db_range, size=len(window_examples))[window_of_example[mixed_examples]]
+                examples[mixed_examples] = mix(examples[mixed_examples], background, snr)
+
+        examples = spec_augment(examples, self.rng, self.time_masks, self.max_time_width, self.frequency_masks,
+                                self.max_frequency_width)
+        return np.split(examples, np.cumsum(counts)[:-1])
+
+
+def augmented_batches(window_examples, labels, augmenter, batch_size=64, copies=1, prefetch=4, shuffle=True):
+    """
+    Generate augmented batches on a background thread, a few batches ahead of the consumer.
+
+    Augmentation (NumPy, which releases the GIL) overlaps with the embedder running on the
+    previous batch, so the embedder is never waiting for its input.
+
+    :param window_examples: List of per-window log-mel arrays.
+    :param labels: Window labels.
+    :param augmenter: LogMelAugmenter.
+    :param batch_size: Windows per batch.
+    :param copies: Augmented copies of every window.
+    :param prefetch: Batches prepared ahead.
+    :param shuffle: Visit the windows in random order (the augmenter's generator).
+    :return: Generator of (window indices, augmented window examples, labels).
+    """
+    labels = np.asarray(labels)
+    batches = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for _ in range(copies):
+                order = augmenter.rng.permutation(len(window_examples)) if shuffle else np.arange(len(window_examples))
+                for start in range(0, len(order), batch_size):
+                    if stop.is_set():
+                        return
+                    indices = order[start:start + batch_size]
+                    augmented = augmenter.augment([window_examples[i] for i in indices], labels[indices])
+                    batches.put((indices, augmented, labels[indices]))
+            batches.put(done)
+        except BaseException as e:
+            batches.put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = batches.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue
+        while producer.is_alive():
+            try:
+                batches.get_nowait()
+            except queue.Empty:
+                producer.join(0.1)
+
+
+def augmented_embeddings(window_examples, labels, augmenter, batch_size=64, copies=1, prefetch=4):
+    """
+    Embed augmented windows with VGGish, batch by batch as they are generated.
+
+    :return: Generator of (window indices, embeddings of shape (batch, embedding_dim), labels).
+    """
+    from audio_processor import embed_log_mel_windows
+
+    for indices, augmented, batch_labels in augmented_batches(window_examples, labels, augmenter, batch_size,
+                                                              copies, prefetch):
+        yield indices, embed_log_mel_windows(augmented), batch_labels
+
+
+def main():
+    from embedding_store import STORE_FILE, EmbeddingStore
+
+    parser = argparse.ArgumentParser(description="Add augmented training windows to an embedding store from cached "
+                                                 "log-mel examples")
+    parser.add_argument("ads_folder", help="folder of ad window WAVs (e.g. the train set from Audio_Sets)")
+    parser.add_argument("podcasts_folder", help="folder of podcast window WAVs, also used as mixing backgrounds")
+    parser.add_argument("store", help="embedding store directory (created if needed)")
+    parser.add_argument("--copies", type=int, default=2,
+                        help="augmented copies of every window; copies already in the store count towards it")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--mix-probability", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    names, window_examples, labels = [], [], []
+    for folder, label in ((args.ads_folder, 1), (args.podcasts_folder, 0)):
+        folder_examples = load_window_folder(folder)
+        names += sorted(filename for filename in os.listdir(folder) if filename.endswith('.wav'))
+        window_examples += folder_examples
+        labels += [label] * len(folder_examples)
+    backgrounds = [examples for examples, label in zip(window_examples, labels) if label == 0]
+    augmenter = LogMelAugmenter(backgrounds, mix_probability=args.mix_probability, random_state=args.seed)
+
+    # One '#aug' source per window with the copies as its segments, apart from the window's own rows
+    sources = [f"{os.path.splitext(name)[0]}#aug" for name in names]
+    store = EmbeddingStore(args.store) if os.path.exists(os.path.join(args.store, STORE_FILE)) else None
+    present = np.zeros((len(window_examples), args.copies), dtype=bool)
+    if store is not None and len(store):
+        # Copies already in the store from an earlier run; batches are shuffled across copies, so an
+        # interrupted run can hold any subset of a window's copies, not just the first few
+        window_of_source = {source: i for i, source in enumerate(sources)}
+        window_of_code = np.array([window_of_source.get(source, -1) for source in store.sources], dtype=np.int64)
+        windows = window_of_code[store.index['source']]
+        copies = store.index['segment']
+        known = (windows >= 0) & (copies < args.copies)
+        present[windows[known], copies[known]] = True
+
+    # (window, copy number) of every copy still missing
+    entry_windows, entry_copies = np.nonzero(~present)
+    entry_copies = entry_copies.astype(np.int32)
+    print(f"{int(present.sum())} augmented windows already in the store, adding {len(entry_windows)}")
+
+    start_time = time.time()
+    added = 0
+    for indices, embeddings, batch_labels in augmented_embeddings([window_examples[i] for i in entry_windows],
+                                                                  np.asarray(labels)[entry_windows], augmenter,
+                                                                  args.batch_size):
+        if store is None:
+            store = EmbeddingStore.create(args.store, embeddings.shape[1], embeddings.dtype)
+        store.append(embeddings, [sources[i] for i in entry_windows[indices]], entry_copies[indices],
+                     batch_labels, 'train', commit=False)
+        if store.pending_rows >= store.shard_rows:
+            store.commit()
+        added += len(indices)
+        print(f"{added}/{len(entry_windows)} augmented windows, {added / (time.time() - start_time):.1f} windows/s")
+    if store is not None:
+        store.commit()
+
+
+if __name__ == "__main__":
+    main()
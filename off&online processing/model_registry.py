@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+import vggish_params
+from calibration import calibrator_from_arrays, load_calibrator
+from embedding_reduction import EmbeddingReducer
+from fast_classifier import MIN_AGREEMENT, LinearModel, NystroemFeatures, RandomFourierFeatures, check_parity, \
+    export_svm, load_embeddings_folder
+
+DEFAULT_REGISTRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+METADATA_FILE = 'metadata.json'
+FORMAT_VERSION = 1
+EMBEDDERS = ('vggish', 'openl3')
+
+
+class ModelArtifact:
+    """
+    A classifier loaded from the registry, with its optional reduction stage and metadata.
+
+    Arrays are memory-mapped read-only .npy files, so loading is a few page maps instead of
+    unpickling, and several processes serving the same model share the pages.
+    """
+    def __init__(self, path, metadata, classifier, reducer=None, calibrator=None):
+        self.path = path
+        self.metadata = metadata
+        self.classifier = classifier
+        self.reducer = reducer
+        self.calibrator = calibrator
+
+    @property
+    def name(self):
+        return self.metadata['name']
+
+    @property
+    def version(self):
+        return self.metadata['version']
+
+    def validate(self, embedder=None, window_seconds=None, input_dim=None):
+        """
+        Check that the artifact fits the pipeline it is about to be used in.
+
+        :param embedder: Embedder the caller produces embeddings with ('vggish' or 'openl3').
+        :param window_seconds: Window length the caller classifies.
+        :param input_dim: Size of the embeddings the caller will pass, before any reduction.
+        :raises ValueError: If anything doesn't match.
+        """
+        problems = []
+        if embedder is not None and embedder != self.metadata['embedder']:
+            problems.append(f"embedder is {self.metadata['embedder']}, expected {embedder}")
+        if window_seconds is not None and not np.isclose(window_seconds, self.metadata['window_seconds']):
+            problems.append(f"window is {self.metadata['window_seconds']} s, expected {window_seconds} s")
+        if input_dim is not None and input_dim != self.metadata['input_dim']:
+            problems.append(f"input dimension is {self.metadata['input_dim']}, expected {input_dim}")
+        if problems:
+            raise ValueError(f"Model {self.name} v{self.version} is incompatible: " + "; ".join(problems))
+
+
+def expected_input_dim(embedder, window_seconds):
+    """
+    :return: Flattened embedding size for a window, or None when it can't be derived from the window alone.
+    """
+    if embedder == 'vggish':
+        return int(window_seconds / vggish_params.EXAMPLE_HOP_SECONDS) * vggish_params.EMBEDDING_SIZE
+    return None
+
+
+def classifier_arrays(model):
+    """
+    :param model: LinearModel.
+    :return: (arrays, description) where description is the JSON-able part of the metadata.
+    """
+    arrays = {'weights': model.weights, 'bias': np.array(model.bias), 'classes': model.classes_}
+    feature_map = None
+    if isinstance(model.feature_map, RandomFourierFeatures):
+        feature_map = 'rff'
+        input_dim = model.feature_map.projection.shape[0]
+    elif isinstance(model.feature_map, NystroemFeatures):
+        feature_map = 'nystroem'
+        input_dim = model.feature_map.landmarks.shape[1]
+    else:
+        input_dim = len(model.weights)
+    if model.feature_map is not None:
+        arrays.update(model.feature_map.arrays())
+    return arrays, {'kind': 'linear', 'feature_map': feature_map, 'features': len(model.weights),
+                    'classifier_input_dim': int(input_dim)}
+
+
+def list_versions(name, root=DEFAULT_REGISTRY):
+    """
+    :return: Sorted list of the integer versions registered under name.
+    """
+    model_directory = os.path.join(root, name)
+    if not os.path.isdir(model_directory):
+        return []
+    return sorted(int(entry) for entry in os.listdir(model_directory) if entry.isdigit())
+
+
+def model_path(name, version=None, root=DEFAULT_REGISTRY):
+    """
+    :param version: Version number, or None for the latest.
+    :return: Directory of that version.
+    """
+    if version is None:
+        versions = list_versions(name, root)
+        if not versions:
+            raise ValueError(f"No model named '{name}' in {root}")
+        version = versions[-1]
+    return os.path.join(root, name, str(version))
+
+
+def register_model(name, model, embedder, window_seconds, hop_seconds=None, reducer=None, metrics=None,
+                   root=DEFAULT_REGISTRY, source=None, approximation='nystroem', n_components=2048, calibrator=None,
+                   parity_embeddings=None, min_agreement=MIN_AGREEMENT):
+    """
+    Store a classifier as a new version of name.
+
+    The version is written to a temporary directory and renamed into place, so a reader
+    (or a hot-reload watcher) never sees a half-written artifact.
+
+    :param name: Model name, e.g. 'vggish_svm_3sec'.
+    :param model: LinearModel, or a sklearn SVC / linear model that is compiled with export_svm.
+    :param embedder: 'vggish' or 'openl3'.
+    :param window_seconds: Window length the model was trained on.
+    :param hop_seconds: Hop between windows at training time, if the windows overlapped.
+    :param reducer: Optional EmbeddingReducer the model was trained behind.
+    :param metrics: Optional dictionary of evaluation metrics to keep with the model.
+    :param source: Where the model came from (e.g. the original pickle).
+    :param approximation: Passed to export_svm for RBF SVMs; linear kernels are always exported exactly.
+    :param n_components: Passed to export_svm for RBF SVMs.
+    :param calibrator: Optional calibrator (see calibration.py) mapping the decision function to P(ad).
+    :param parity_embeddings: Held-out embeddings, as the sklearn model takes them (i.e. after the reducer),
+        on which the exported model is compared with the original. Required for RBF SVMs.
+    :param min_agreement: Refuse to register an exported model agreeing with the original on fewer windows.
+    :return: Path of the new version.
+    :raises ValueError: If the export doesn't reproduce the original's decisions closely enough.
+    """
+    if embedder not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder '{embedder}', expected one of {EMBEDDERS}")
+    parity = None
+    if not isinstance(model, LinearModel):
+        exact = getattr(model, 'kernel', 'linear') == 'linear'
+        if not exact and parity_embeddings is None:
+            raise ValueError("An RBF SVM is exported approximately; pass held-out parity_embeddings to verify it")
+        original = model
+        model = export_svm(original, approximation, n_components)
+        if parity_embeddings is not None:
+            # The stored metrics describe the original; only register an export that decides like it
+            parity = check_parity(original, model, np.asarray(parity_embeddings).reshape(len(parity_embeddings), -1))
+            parity.update({'windows': len(parity_embeddings), 'export': 'exact' if exact else approximation})
+            if parity['agreement'] < min_agreement:
+                raise ValueError(f"Exported model agrees with the original on {parity['agreement']:.3f} of the "
+                                 f"held-out windows, below {min_agreement}; try another approximation or more "
+                                 f"components")
+
+    arrays, classifier = classifier_arrays(model)
+    input_dim = classifier['classifier_input_dim']
+    reducer_metadata = None
+    if reducer is not None:
+        arrays['reducer_pca_matrix'] = reducer.pca_matrix
+        arrays['reducer_pca_means'] = reducer.pca_means
+        reducer_metadata = {'frame_dim': reducer.frame_dim, 'n_components': reducer.n_components,
+                            'quantize': bool(reducer.quantize)}
+        # The classifier sees reduced frames; the pipeline feeds full-size ones
+        if input_dim % reducer.n_components:
+            raise ValueError(f"Classifier input ({input_dim}) is not a whole number of reduced frames "
+                             f"({reducer.n_components} components)")
+        input_dim = input_dim // reducer.n_components * reducer.frame_dim
+
+    if calibrator is not None:
+        arrays.update(calibrator.arrays())
+
+    expected = expected_input_dim(embedder, window_seconds)
+    if expected is not None and expected != input_dim:
+        raise ValueError(f"A {window_seconds} s {embedder} window embeds to {expected} values, "
+                         f"but the model expects {input_dim}")
+
+    versions = list_versions(name, root)
+    version = versions[-1] + 1 if versions else 1
+    metadata = {'format_version': FORMAT_VERSION, 'name': name, 'version': version,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'embedder': embedder,
+                'window_seconds': window_seconds, 'hop_seconds': hop_seconds, 'input_dim': input_dim,
+                'reducer': reducer_metadata, 'classifier': classifier,
+                'calibration': calibrator.method if calibrator is not None else None, 'metrics': metrics or {},
+                'parity': parity, 'source': source, 'arrays': sorted(arrays)}
+
+    final_path = os.path.join(root, name, str(version))
+    temporary_path = os.path.join(root, name, f".tmp-{version}-{os.getpid()}")
+    os.makedirs(temporary_path)
+    try:
+        for array_name, array in arrays.items():
+            np.save(os.path.join(temporary_path, array_name + '.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(temporary_path, METADATA_FILE), 'w') as metadata_file:
+            json.dump(metadata, metadata_file, indent=2)
+        os.rename(temporary_path, final_path)
+    except BaseException:
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        raise
+    return final_path
+
+
+def load_model(path, embedder=None, window_seconds=None, input_dim=None):
+    """
+    Load and validate a registered model.
+
+    :param path: A version directory, or a model directory (the latest version is used).
+    :param embedder: See ModelArtifact.validate.
+    :param window_seconds: See ModelArtifact.validate.
+    :param input_dim: See ModelArtifact.validate.
+    :return: ModelArtifact.
+    :raises ValueError: If the artifact is malformed or incompatible.
+    """
+    if not os.path.isfile(os.path.join(path, METADATA_FILE)):
+        path = model_path(os.path.basename(os.path.normpath(path)), root=os.path.dirname(os.path.normpath(path)))
+    with open(os.path.join(path, METADATA_FILE)) as metadata_file:
+        metadata = json.load(metadata_file)
+    if metadata.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {metadata.get('format_version')}, expected {FORMAT_VERSION}")
+
+    arrays = {array_name: np.load(os.path.join(path, array_name + '.npy'), mmap_mode='r')
+              for array_name in metadata['arrays']}
+
+    feature_map = None
+    if metadata['classifier']['feature_map'] == 'rff':
+        feature_map = RandomFourierFeatures(arrays['rff_projection'], arrays['rff_offset'])
+    elif metadata['classifier']['feature_map'] == 'nystroem':
+        feature_map = NystroemFeatures(arrays['nystroem_landmarks'], arrays['nystroem_normalization'],
+                                       arrays['nystroem_gamma'])
+    classifier = LinearModel(arrays['weights'], arrays['bias'], arrays['classes'], feature_map)
+    if len(classifier.weights) != metadata['classifier']['features']:
+        raise ValueError(f"{path}: weights have {len(classifier.weights)} features, "
+                         f"metadata says {metadata['classifier']['features']}")
+
+    reducer = None
+    if metadata['reducer'] is not None:
+        reducer = EmbeddingReducer(arrays['reducer_pca_matrix'], arrays['reducer_pca_means'],
+                                   metadata['reducer']['quantize'])
+
+    artifact = ModelArtifact(path, metadata, classifier, reducer, calibrator_from_arrays(arrays))
+    artifact.validate(embedder, window_seconds, input_dim)
+    return artifact
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Register and inspect versioned classifier artifacts")
+    parser.add_argument("--root", default=DEFAULT_REGISTRY, help="registry directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    register = commands.add_parser("register", help="add a pickled or exported model as a new version")
+    register.add_argument("model_path", help="joblib-pickled classifier or exported .npz LinearModel")
+    register.add_argument("name", help="registry name, e.g. vggish_svm_3sec")
+    register.add_argument("--embedder", choices=EMBEDDERS, default="vggish")
+    register.add_argument("--window", type=float, required=True, help="window length in seconds")
+    register.add_argument("--hop", type=float, default=None, help="hop between training windows in seconds")
+    register.add_argument("--reducer", default=None, help="EmbeddingReducer (.npz) the model was trained behind")
+    register.add_argument("--metrics", default=None, help="JSON file with evaluation metrics")
+    register.add_argument("--approximation", choices=["rff", "nystroem"], default="nystroem")
+    register.add_argument("--parity-embeddings", default=None,
+                          help="folder of held-out .npy embeddings to check the export against (required for RBF)")
+    register.add_argument("--min-agreement", type=float, default=MIN_AGREEMENT)
+    register.add_argument("--calibrator", default=None, help="calibrator (.npz) from calibration.py")
+
+    listing = commands.add_parser("list", help="show the versions of a model")
+    listing.add_argument("name")
+    args = parser.parse_args()
+
+    if args.command == "register":
+        if args.model_path.endswith('.npz'):
+            model = LinearModel.load(args.model_path)
+        else:
+            model = joblib.load(args.model_path)
+        reducer = EmbeddingReducer.load(args.reducer) if args.reducer else None
+        calibrator = load_calibrator(args.calibrator) if args.calibrator else None
+        parity_embeddings = load_embeddings_folder(args.parity_embeddings) if args.parity_embeddings else None
+        if parity_embeddings is not None and reducer is not None:
+            parity_embeddings = reducer.transform(parity_embeddings).astype(np.float32)
+        metrics = None
+        if args.metrics:
+            with open(args.metrics) as metrics_file:
+                metrics = json.load(metrics_file)
+        path = register_model(args.name, model, args.embedder, args.window, args.hop, reducer, metrics,
+                              args.root, source=os.path.abspath(args.model_path), approximation=args.approximation,
+                              calibrator=calibrator, parity_embeddings=parity_embeddings,
+                              min_agreement=args.min_agreement)
+        print(f"Registered {path}")
+    else:
+        for version in list_versions(args.name, args.root):
+            artifact = load_model(model_path(args.name, version, args.root))
+            metadata = artifact.metadata
+            print(f"v{version}: {metadata['embedder']} {metadata['window_seconds']} s, "
+                  f"{metadata['classifier']['feature_map'] or 'linear'}, created {metadata['created']}, "
+                  f"metrics {metadata['metrics']}, parity {metadata.get('parity')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import json
+import os
+import signal
+import threading
+
+from model_registry import METADATA_FILE, model_path
+
+
+def read_threshold(threshold_path):
+    """
+    :param threshold_path: JSON file such as {"threshold": 0.25}.
+    :return: The threshold as a float.
+    """
+    with open(threshold_path) as threshold_file:
+        return float(json.load(threshold_file)['threshold'])
+
+
+class ModelWatcher:
+    """
+    Background thread that hot-reloads an AudioProcessor's classifier when its model changes.
+
+    The watched path can be:
+    - a model_registry model directory: a new version appearing switches to it (versions are
+      renamed into place, so they're complete when they appear);
+    - a registry version directory, a pickle or an exported .npz: a new modification time
+      reloads it, once the file has stopped changing for one poll (so a copy in progress is
+      not picked up half-written).
+    An optional threshold file is watched the same way. SIGHUP (where available) forces an
+    immediate check.
+    """
+    def __init__(self, processor, watched_path, threshold_path=None, poll_seconds=5.0):
+        """
+        :param processor: AudioProcessor to reload.
+        :param watched_path: Model path to watch, as described above.
+        :param threshold_path: Optional JSON threshold file (see read_threshold).
+        :param poll_seconds: Time between checks.
+        """
+        self.processor = processor
+        self.watched_path = watched_path
+        self.threshold_path = threshold_path
+        self.poll_seconds = poll_seconds
+        self.reload_count = 0
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._force = False
+        self._pending = {}
+        # What is loaded now counts as seen, so starting the watcher doesn't reload the model
+        self._loaded = self._signatures()
+        if 'threshold' in self._loaded:
+            processor.reload(threshold=read_threshold(threshold_path))
+
+    def _model_signature(self):
+        if os.path.isdir(self.watched_path) and not os.path.isfile(os.path.join(self.watched_path, METADATA_FILE)):
+            # Registry model directory: the latest version is the signature
+            root, name = os.path.split(os.path.normpath(self.watched_path))
+            return model_path(name, root=root)
+        if os.path.isdir(self.watched_path):
+            status = os.stat(os.path.join(self.watched_path, METADATA_FILE))
+        else:
+            status = os.stat(self.watched_path)
+        return status.st_mtime_ns, status.st_size
+
+    def _signatures(self):
+        signatures = {}
+        try:
+            signatures['model'] = self._model_signature()
+        except (OSError, ValueError):
+            pass
+        if self.threshold_path:
+            try:
+                status = os.stat(self.threshold_path)
+                signatures['threshold'] = (status.st_mtime_ns, status.st_size)
+            except OSError:
+                pass
+        return signatures
+
+    def check(self, force=False):
+        """
+        Reload whatever changed since the last check.
+
+        :param force: Reload changed files right away instead of waiting for them to settle.
+        :return: True if the processor was reloaded.
+        """
+        changed = {}
+        for key, signature in self._signatures().items():
+            if signature == self._loaded.get(key):
+                self._pending.pop(key, None)
+                continue
+            # Registry versions are atomic; files must look the same on two consecutive checks
+            if force or (key == 'model' and isinstance(signature, str)) or self._pending.get(key) == signature:
+                changed[key] = signature
+            else:
+                self._pending[key] = signature
+        if not changed:
+            return False
+
+        # Marked as seen before loading, so a broken artifact is reported once rather than on every poll
+        self._loaded.update(changed)
+        for key in changed:
+            self._pending.pop(key, None)
+        threshold = read_threshold(self.threshold_path) if 'threshold' in changed else None
+        if 'model' in changed:
+            path = changed['model'] if isinstance(changed['model'], str) else self.watched_path
+            self.processor.reload(path, threshold=threshold)
+            print(f"Model reloaded from {path}")
+        else:
+            self.processor.reload(threshold=threshold)
+            print(f"Threshold set to {threshold}")
+        self.reload_count += 1
+        return True
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def request_check(self):
+        """
+        Make the watcher check right away instead of at the next poll, without waiting for files to settle.
+        """
+        self._force = True
+        self._wake.set()
+
+    def install_signal_handler(self):
+        """
+        Check for a new model on SIGHUP. Must be called from the main thread; no-op on Windows.
+        """
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.request_check())
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            force, self._force = self._force, False
+            try:
+                self.check(force)
+            except Exception as e:
+                # A broken rollout must not stop detection; the previous model stays loaded
+                print(f"Model reload failed: {e}")
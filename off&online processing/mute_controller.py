@@ -0,0 +1,213 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+
+NIRCMD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nircmd-x64", "nircmdc.exe")
+ACK_MARKER = "mute-controller-ack"
+
+
+class PycawMixer:
+    """
+    In-process Windows mixer using the Core Audio endpoint volume interface (pycaw).
+    """
+    def __init__(self):
+        from ctypes import cast, POINTER
+        from comtypes import CLSCTX_ALL
+        from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
+
+        speakers = AudioUtilities.GetSpeakers()
+        interface = speakers.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
+        self.volume = cast(interface, POINTER(IAudioEndpointVolume))
+
+    def set_muted(self, muted):
+        """
+        Mute or unmute the default output device.
+
+        :param muted: True to mute, False to unmute.
+        """
+        self.volume.SetMute(1 if muted else 0, None)
+
+    def close(self):
+        pass
+
+
+class PersistentProcessMixer:
+    """
+    Mixer that keeps one helper process alive and writes a command line per state change.
+
+    On Linux the helper is `amixer --stdin`, so no process is spawned per change at all.
+    On other platforms a single shell is kept open, which saves the shell start-up that
+    os.system pays on every call (on macOS each change still starts osascript).
+
+    Every command is acknowledged by the helper once it has run, and set_muted waits for
+    that acknowledgement, so it returns only when the output is actually (un)muted.
+    """
+    def __init__(self, argv, mute_command, unmute_command, ack_command=None, ack_marker=ACK_MARKER,
+                 ack_timeout=2.0):
+        """
+        :param argv: Command line of the helper process that reads commands from stdin.
+        :param mute_command: Line written to the helper to mute.
+        :param unmute_command: Line written to the helper to unmute.
+        :param ack_command: Line written after each command that makes the helper print ack_marker,
+                            or None if the command's own output starts with it.
+        :param ack_marker: Start of the output line that acknowledges a command.
+        :param ack_timeout: Seconds to wait for the acknowledgement.
+        """
+        self.argv = argv
+        self.mute_command = mute_command
+        self.unmute_command = unmute_command
+        self.ack_command = ack_command
+        self.ack_marker = ack_marker
+        self.ack_timeout = ack_timeout
+        self.process = None
+        self.acks = None
+
+    def _ensure_process(self):
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen(self.argv, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                            text=True, bufsize=1)
+            # A reader thread keeps the pipe drained and lets set_muted wait with a timeout
+            self.acks = queue.Queue()
+            threading.Thread(target=self._read_acks, args=(self.process, self.acks), daemon=True).start()
+        return self.process
+
+    def _read_acks(self, process, acks):
+        for line in process.stdout:
+            if line.startswith(self.ack_marker):
+                acks.put(line)
+
+    def set_muted(self, muted):
+        """
+        Mute or unmute the system output through the helper process, waiting until the helper has run the command.
+
+        :param muted: True to mute, False to unmute.
+        :raises RuntimeError: If the helper doesn't acknowledge the command within ack_timeout.
+        """
+        process = self._ensure_process()
+        # Drop acknowledgements that arrived after an earlier timeout
+        while not self.acks.empty():
+            self.acks.get_nowait()
+        process.stdin.write((self.mute_command if muted else self.unmute_command) + "\n")
+        if self.ack_command is not None:
+            process.stdin.write(self.ack_command + "\n")
+        process.stdin.flush()
+        try:
+            self.acks.get(timeout=self.ack_timeout)
+        except queue.Empty:
+            raise RuntimeError(f"{self.argv[0]} did not acknowledge within {self.ack_timeout} s")
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait(timeout=2)
+        self.process = None
+
+
+def create_system_mixer():
+    """
+    Create the fastest available mixer for the current platform.
+
+    :return: An object exposing set_muted(muted) and close().
+    """
+    if sys.platform == "win32":
+        try:
+            return PycawMixer()
+        except Exception as e:
+            print(f"pycaw unavailable, falling back to nircmd: {e}")
+        return PersistentProcessMixer(["cmd.exe", "/Q", "/K"],
+                                      f'"{NIRCMD_PATH}" mutesysvolume 1',
+                                      f'"{NIRCMD_PATH}" mutesysvolume 0',
+                                      ack_command=f"echo {ACK_MARKER}")
+    elif sys.platform == "darwin":
+        return PersistentProcessMixer(["/bin/sh"],
+                                      "osascript -e 'set volume output muted true'",
+                                      "osascript -e 'set volume output muted false'",
+                                      ack_command=f"echo {ACK_MARKER}")
+    # Without --quiet amixer reports the control after every sset, which serves as the acknowledgement
+    return PersistentProcessMixer(["amixer", "--stdin"],
+                                  "sset Master mute",
+                                  "sset Master unmute",
+                                  ack_marker="Simple mixer control")
+
+
+class MuteController:
+    """
+    Debounces per-window ad decisions and only touches the mixer on state transitions.
+
+    With unmute_below set, scores between it and the ad threshold are a dead band: they
+    don't count as ad windows, but don't count towards unmuting either, so a borderline
+    window in the middle of an ad doesn't restart the unmute countdown.
+    """
+    def __init__(self, mixer, mute_after=2, unmute_after=2, unmute_below=None):
+        """
+        Initialize the controller.
+
+        :param mixer: Object exposing set_muted(muted), e.g. from create_system_mixer().
+        :param mute_after: Number of consecutive ad windows required to mute.
+        :param unmute_after: Number of consecutive non-ad windows required to unmute.
+        :param unmute_below: Optional score a non-ad window must fall below to count towards unmuting.
+        """
+        self.mixer = mixer
+        self.mute_after = mute_after
+        self.unmute_after = unmute_after
+        self.unmute_below = unmute_below
+        self.is_muted = False
+        self.ad_streak = 0
+        self.content_streak = 0
+        self.actuation_latencies = []
+
+    def update(self, is_ad, score=None):
+        """
+        Feed the decision for the latest window.
+
+        :param is_ad: True if the window was classified as an ad.
+        :param score: The window's ad score, used with unmute_below.
+        :return: True if the mute state changed on this update.
+        """
+        if is_ad:
+            self.ad_streak += 1
+            self.content_streak = 0
+        elif self.unmute_below is None or score is None or score < self.unmute_below:
+            self.content_streak += 1
+            self.ad_streak = 0
+        else:
+            self.ad_streak = 0
+
+        if not self.is_muted and self.ad_streak >= self.mute_after:
+            return self._actuate(True)
+        if self.is_muted and self.content_streak >= self.unmute_after:
+            return self._actuate(False)
+        return False
+
+    def _actuate(self, muted):
+        start = time.perf_counter()
+        try:
+            self.mixer.set_muted(muted)
+        except Exception as e:
+            # The state is left as it was, so the next window that still calls for the change retries it
+            print(f"Error {'muting' if muted else 'restoring'} system volume: {e}")
+            return False
+        self.actuation_latencies.append(time.perf_counter() - start)
+        self.is_muted = muted
+        return True
+
+    def mean_actuation_latency(self):
+        """
+        :return: Mean time in seconds from a transition until the mixer confirmed it, or 0.0 if none succeeded.
+        """
+        if not self.actuation_latencies:
+            return 0.0
+        return sum(self.actuation_latencies) / len(self.actuation_latencies)
+
+    def close(self):
+        """
+        Restore the volume if it is muted and release the mixer.
+        """
+        if self.is_muted:
+            self._actuate(False)
+        self.mixer.close()
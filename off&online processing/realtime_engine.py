@@ -0,0 +1,502 @@
+import argparse
+import collections
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+from audio_gate import AudioGate
+from mute_controller import MuteController, create_system_mixer
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+
+# score is the processor's continuous ad score (P(ad) when calibrated); is_ad is score > the detector's threshold
+DetectionEvent = collections.namedtuple(
+    'DetectionEvent', ['start_sample', 'end_sample', 'is_ad', 'processing_seconds', 'score'])
+
+
+class PyAudioSource:
+    """
+    Live capture from a PyAudio input device.
+
+    If native_format is given and the device supports it, capture happens directly in that
+    format (e.g. the model's 16 kHz mono), so windows need no downmix or resampling.
+    """
+    live = True
+
+    def __init__(self, rate=44100, channels=2, chunk=1024, input_device_index=None, native_format=None):
+        """
+        :param rate: Capture sample rate used when native_format is not supported.
+        :param channels: Number of capture channels used when native_format is not supported.
+        :param chunk: Frames per read.
+        :param input_device_index: PyAudio device index, or None for the default input.
+        :param native_format: Optional (rate, channels) to try first.
+        """
+        self.rate = rate
+        self.channels = channels
+        self.chunk = chunk
+        self.input_device_index = input_device_index
+        self.native_format = native_format
+        self.pyaudio = None
+        self.stream = None
+
+    def open(self):
+        self.pyaudio = pyaudio.PyAudio()
+        if self.native_format is not None:
+            self._negotiate_native_format()
+        self.stream = self.pyaudio.open(format=pyaudio.paInt16,
+                                        channels=self.channels,
+                                        rate=self.rate,
+                                        input=True,
+                                        input_device_index=self.input_device_index,
+                                        frames_per_buffer=self.chunk)
+
+    def _negotiate_native_format(self):
+        native_rate, native_channels = self.native_format
+        device_index = self.input_device_index
+        if device_index is None:
+            device_index = self.pyaudio.get_default_input_device_info()['index']
+        try:
+            self.pyaudio.is_format_supported(native_rate,
+                                             input_device=device_index,
+                                             input_channels=native_channels,
+                                             input_format=pyaudio.paInt16)
+            self.rate, self.channels = native_rate, native_channels
+        except ValueError:
+            print(f"Input device doesn't support {native_rate} Hz / {native_channels} ch, "
+                  f"capturing at {self.rate} Hz / {self.channels} ch")
+
+    def read(self):
+        """
+        :return: np.ndarray of int16 with shape (chunk, channels).
+        """
+        data = self.stream.read(self.chunk)
+        return np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.pyaudio.terminate()
+
+
+class WavFileSource:
+    """
+    Reads a 16-bit WAV file block by block, for headless runs and benchmarks.
+    """
+    def __init__(self, path, chunk=1024, realtime=False):
+        """
+        :param path: Path to the WAV file.
+        :param chunk: Frames per read.
+        :param realtime: If True, pace reads at the file's sample rate like a live device.
+        """
+        self.path = path
+        self.chunk = chunk
+        self.live = realtime
+        self.wave_file = None
+        self.rate = None
+        self.channels = None
+
+    def open(self):
+        self.wave_file = wave.open(self.path, 'rb')
+        assert self.wave_file.getsampwidth() == 2, 'Only 16-bit WAV files are supported'
+        self.rate = self.wave_file.getframerate()
+        self.channels = self.wave_file.getnchannels()
+
+    def read(self):
+        """
+        :return: np.ndarray of int16 with shape (frames, channels), or None at the end of the file.
+        """
+        data = self.wave_file.readframes(self.chunk)
+        if not data:
+            return None
+        if self.live:
+            time.sleep(self.chunk / self.rate)
+        return np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+
+    def close(self):
+        self.wave_file.close()
+
+
+class SystemMuteSink:
+    """
+    Mutes the OS output through a debounced MuteController.
+    """
+    def __init__(self, mute_after=2, unmute_after=2, unmute_below=None):
+        """
+        :param mute_after: See MuteController.
+        :param unmute_after: See MuteController.
+        :param unmute_below: See MuteController; in the processor's score units.
+        """
+        self.mute_after = mute_after
+        self.unmute_after = unmute_after
+        self.unmute_below = unmute_below
+        self.controller = None
+
+    def open(self, source):
+        self.controller = MuteController(create_system_mixer(), self.mute_after, self.unmute_after,
+                                         self.unmute_below)
+
+    def write(self, block):
+        pass
+
+    def on_decision(self, event):
+        self.controller.update(event.is_ad, event.score)
+
+    def close(self):
+        self.controller.close()
+
+    def report(self):
+        return f"Mean mute actuation latency: {self.controller.mean_actuation_latency() * 1000:.1f} ms"
+
+
+class GateSink:
+    """
+    Re-emits the source through an AudioGate. Subclasses decide where the gated audio goes.
+    """
+    def __init__(self, delay_seconds, onset_lookback_seconds=0.0, fade_ms=20, duck_gain=0.0):
+        self.delay_seconds = delay_seconds
+        self.onset_lookback_seconds = onset_lookback_seconds
+        self.fade_ms = fade_ms
+        self.duck_gain = duck_gain
+        self.gate = None
+
+    def open(self, source):
+        self.gate = AudioGate(source.rate, source.channels, self.delay_seconds, self.fade_ms,
+                              self.duck_gain, self.onset_lookback_seconds)
+
+    def write(self, block):
+        self.emit(self.gate.process(block).tobytes())
+
+    def emit(self, data):
+        raise NotImplementedError
+
+    def on_decision(self, event):
+        self.gate.mark(event.start_sample, event.end_sample, event.is_ad)
+
+    def close(self):
+        pass
+
+    def report(self):
+        return self.gate.report()
+
+
+class GatedOutputSink(GateSink):
+    """
+    Plays the gated stream on a PyAudio output device.
+    """
+    def __init__(self, delay_seconds, onset_lookback_seconds=0.0, fade_ms=20, duck_gain=0.0,
+                 output_device_index=None):
+        super().__init__(delay_seconds, onset_lookback_seconds, fade_ms, duck_gain)
+        self.output_device_index = output_device_index
+        self.pyaudio = None
+        self.stream = None
+
+    def open(self, source):
+        super().open(source)
+        self.pyaudio = pyaudio.PyAudio()
+        self.stream = self.pyaudio.open(format=pyaudio.paInt16,
+                                        channels=source.channels,
+                                        rate=source.rate,
+                                        output=True,
+                                        output_device_index=self.output_device_index)
+
+    def emit(self, data):
+        self.stream.write(data)
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.pyaudio.terminate()
+
+
+class GatedWavSink(GateSink):
+    """
+    Writes the gated stream to a WAV file, e.g. to check a headless run by ear.
+    """
+    def __init__(self, path, delay_seconds, onset_lookback_seconds=0.0, fade_ms=20, duck_gain=0.0):
+        super().__init__(delay_seconds, onset_lookback_seconds, fade_ms, duck_gain)
+        self.path = path
+        self.wave_file = None
+
+    def open(self, source):
+        super().open(source)
+        self.wave_file = wave.open(self.path, 'wb')
+        self.wave_file.setnchannels(source.channels)
+        self.wave_file.setsampwidth(2)
+        self.wave_file.setframerate(source.rate)
+
+    def emit(self, data):
+        self.wave_file.writeframes(data)
+
+    def close(self):
+        # Push silence through the delay line so the tail of the stream is written too
+        silence = np.zeros((self.gate.delay_samples, self.gate.channels), dtype=np.int16)
+        self.emit(self.gate.process(silence).tobytes())
+        self.wave_file.close()
+
+
+class _WindowAssembler:
+    """
+    Collects captured blocks in a preallocated buffer and cuts them into overlapping windows.
+    """
+    def __init__(self, window_samples, hop_samples, channels):
+        self.window_samples = window_samples
+        self.hop_samples = hop_samples
+        self.buffer = np.zeros((2 * (window_samples + hop_samples), channels), dtype=np.int16)
+        self.buffer_start = 0  # Absolute index of buffer[0]
+        self.fill = 0
+        self.next_end = window_samples
+
+    def push(self, block):
+        """
+        :param block: np.ndarray of shape (frames, channels).
+        :return: List of (start_sample, end_sample, window) for every window completed by this block.
+        """
+        if self.fill + len(block) > len(self.buffer):
+            # Shift the samples still needed by the next window to the front
+            keep_from = min(self.next_end - self.window_samples - self.buffer_start, self.fill)
+            kept = self.fill - keep_from
+            self.buffer[:kept] = self.buffer[keep_from:self.fill]
+            self.buffer_start += keep_from
+            self.fill = kept
+            if self.fill + len(block) > len(self.buffer):
+                grown = np.zeros((self.fill + len(block), self.buffer.shape[1]), dtype=self.buffer.dtype)
+                grown[:self.fill] = self.buffer[:self.fill]
+                self.buffer = grown
+
+        self.buffer[self.fill:self.fill + len(block)] = block
+        self.fill += len(block)
+
+        windows = []
+        while self.buffer_start + self.fill >= self.next_end:
+            start = self.next_end - self.window_samples
+            offset = start - self.buffer_start
+            windows.append((start, self.next_end, self.buffer[offset:offset + self.window_samples].copy()))
+            self.next_end += self.hop_samples
+        return windows
+
+
+class RealtimeDetector:
+    """
+    Capture -> window -> classify loop shared by the real-time GUIs and headless runs.
+
+    A capture thread reads blocks from the source, hands every block to the sinks (for
+    pass-through output) and cuts windows of window_seconds every hop_seconds. A processing
+    thread classifies the windows and reports each DetectionEvent to the sinks and to the
+    registered listeners.
+    """
+    def __init__(self, processor, source, sinks=(), window_seconds=3, hop_seconds=None,
+                 max_pending_windows=4, threshold=None):
+        """
+        Initialize the detector.
+
+        :param processor: AudioProcessor used to classify windows.
+        :param source: Audio source (PyAudioSource, WavFileSource, ...).
+        :param sinks: Objects reacting to audio blocks and decisions (SystemMuteSink, GatedOutputSink, ...).
+        :param window_seconds: Length of each classified window.
+        :param hop_seconds: Time between window starts; defaults to window_seconds (no overlap).
+        :param max_pending_windows: For live sources, windows queued beyond this are dropped (oldest first).
+        :param threshold: Per-deployment score threshold; None uses the processor's own. Ignored for
+            processors that only return labels.
+        """
+        self.processor = processor
+        self.threshold = threshold
+        self.source = source
+        self.sinks = list(sinks)
+        self.window_seconds = window_seconds
+        self.hop_seconds = hop_seconds if hop_seconds is not None else window_seconds
+        self.max_pending_windows = max_pending_windows
+        self.listeners = []
+
+        self.is_running = False
+        self.window_queue = None
+        self.capture_thread = None
+        self.process_thread = None
+
+        self.windows_processed = 0
+        self.windows_dropped = 0
+        self.processing_seconds = 0.0
+
+    def add_listener(self, callback):
+        """
+        Register a callback receiving every DetectionEvent (called from the processing thread).
+
+        :param callback: Callable taking a DetectionEvent.
+        """
+        self.listeners.append(callback)
+
+    def start(self):
+        """
+        Open the source and sinks and start the capture and processing threads.
+        """
+        self.source.open()
+        for sink in self.sinks:
+            sink.open(self.source)
+
+        self.window_queue = queue.Queue(maxsize=self.max_pending_windows if self.source.live else 0)
+        self.is_running = True
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.process_thread = threading.Thread(target=self._process_loop, daemon=True)
+        self.capture_thread.start()
+        self.process_thread.start()
+
+    def stop(self):
+        """
+        Stop capturing, finish the windows already captured and release the source and sinks.
+        """
+        self.is_running = False
+        self.wait()
+
+    def wait(self):
+        """
+        Block until the source is exhausted (or stop() was called) and all windows are processed.
+        """
+        self.capture_thread.join()
+        self.process_thread.join()
+        self.source.close()
+        for sink in self.sinks:
+            sink.close()
+
+    def run(self):
+        """
+        Process a finite source (e.g. WavFileSource) to the end, blocking until done.
+        """
+        self.start()
+        self.wait()
+
+    def summary(self):
+        """
+        :return: One-line summary of the processed windows and the classification cost.
+        """
+        mean_ms = 1000 * self.processing_seconds / self.windows_processed if self.windows_processed else 0.0
+        return (f"{self.windows_processed} windows processed, {self.windows_dropped} dropped, "
+                f"{mean_ms:.1f} ms per window")
+
+    def _capture_loop(self):
+        window_samples = int(round(self.window_seconds * self.source.rate))
+        hop_samples = int(round(self.hop_seconds * self.source.rate))
+        assembler = _WindowAssembler(window_samples, hop_samples, self.source.channels)
+
+        while self.is_running:
+            block = self.source.read()
+            if block is None:
+                break
+            for sink in self.sinks:
+                sink.write(block)
+            for window in assembler.push(block):
+                self._enqueue(window)
+
+        self.window_queue.put(None)
+
+    def _enqueue(self, window):
+        if not self.source.live:
+            self.window_queue.put(window)
+            return
+        while True:
+            try:
+                self.window_queue.put_nowait(window)
+                return
+            except queue.Full:
+                # Processing can't keep up; the oldest window is the least useful one
+                try:
+                    self.window_queue.get_nowait()
+                    self.windows_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _process_loop(self):
+        while True:
+            item = self.window_queue.get()
+            if item is None:
+                break
+            start_sample, end_sample, window = item
+
+            start = time.perf_counter()
+            if hasattr(self.processor, 'score_ads_in_waveform_with_threshold'):
+                # Score and threshold from the same model, even if a reload lands mid-window
+                score, threshold = self.processor.score_ads_in_waveform_with_threshold(window, self.source.rate)
+                is_ad = score > (self.threshold if self.threshold is not None else threshold)
+            elif hasattr(self.processor, 'score_ads_in_waveform'):
+                score = self.processor.score_ads_in_waveform(window, self.source.rate)
+                threshold = self.threshold if self.threshold is not None else self.processor.decision_threshold
+                is_ad = score > threshold
+            else:
+                is_ad = self.processor.detect_ads_in_waveform(window, self.source.rate)
+                score = float(is_ad)
+            elapsed = time.perf_counter() - start
+
+            self.windows_processed += 1
+            self.processing_seconds += elapsed
+            event = DetectionEvent(start_sample, end_sample, is_ad, elapsed, score)
+            for sink in self.sinks:
+                sink.on_decision(event)
+            for listener in self.listeners:
+                listener(event)
+
+
+def main():
+    # Headless run over a WAV file, e.g. to benchmark the detection loop without a GUI or audio device
+    parser = argparse.ArgumentParser(description="Run the real-time detector over a WAV file")
+    parser.add_argument("model_path", help="path to the SVM model file or model_registry directory")
+    parser.add_argument("wav_path", help="16-bit WAV file to stream through the detector")
+    parser.add_argument("--window", type=float, default=3, help="window length in seconds")
+    parser.add_argument("--hop", type=float, default=None, help="hop between windows in seconds")
+    parser.add_argument("--gated-output", default=None, help="write the gated stream to this WAV file")
+    parser.add_argument("--delay", type=float, default=5, help="delay of the gated output in seconds")
+    parser.add_argument("--prefilter", default=None, help="cascade prefilter (.npz) run before VGGish")
+    parser.add_argument("--watch", action="store_true", help="hot-reload the model when it changes (or on SIGHUP)")
+    parser.add_argument("--threshold-file", default=None, help="JSON decision threshold, reloaded when it changes")
+    parser.add_argument("--calibrator", default=None, help="calibrator (.npz) turning scores into P(ad)")
+    parser.add_argument("--threshold", type=float, default=None, help="score above which a window is an ad")
+    parser.add_argument("--anomaly", default=None, metavar="SCORER_DIR",
+                        help="use a saved anomaly scorer instead of the SVM (model_path is ignored)")
+    parser.add_argument("--distilled-head", default=None,
+                        help="use a distilled head (.npz) instead of VGGish + SVM (model_path is ignored)")
+    args = parser.parse_args()
+
+    from audio_processor import AudioProcessor, create_processor
+    from cascade import CascadeProcessor
+    from model_watcher import ModelWatcher
+
+    audio_processor = create_processor(args.model_path, args.window, args.calibrator, args.anomaly,
+                                       args.distilled_head)
+    processor = audio_processor
+    if args.prefilter:
+        processor = CascadeProcessor(processor, args.prefilter)
+    watcher = None
+    if (args.watch or args.threshold_file) and not isinstance(audio_processor, AudioProcessor):
+        print("Hot reload only applies to the SVM backend, ignoring --watch / --threshold-file")
+    elif args.watch or args.threshold_file:
+        watcher = ModelWatcher(audio_processor, args.model_path, args.threshold_file)
+        watcher.install_signal_handler()
+        watcher.start()
+
+    sinks = []
+    if args.gated_output:
+        sinks.append(GatedWavSink(args.gated_output, args.delay))
+    detector = RealtimeDetector(processor, WavFileSource(args.wav_path), sinks,
+                                window_seconds=args.window, hop_seconds=args.hop, threshold=args.threshold)
+    detector.add_listener(lambda event: print(f"{event.start_sample}-{event.end_sample}: "
+                                              f"{'ad' if event.is_ad else 'content'} ({event.score:.3f})"))
+
+    start_time = time.time()
+    detector.run()
+    if watcher is not None:
+        watcher.stop()
+        print(f"Model reloaded {watcher.reload_count} times")
+    print(detector.summary())
+    if args.prefilter:
+        print(f"Cascade skipped VGGish on {processor.skip_rate:.1%} of windows")
+    print(f"Execution time: {time.time() - start_time:.2f} seconds")
+    for sink in sinks:
+        print(sink.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+# Names used by off&online processing/experiment_runner.py, mapped to the names shown in the plots
+EMBEDDER_NAMES = {'vggish': 'VGGish', 'openl3': 'OpenL3'}
+CLASSIFIER_NAMES = {'svm': 'SVM', 'knn': 'KNN', 'random_forest': 'Random Forest', 'linear_sgd': 'Linear SGD'}
+CATEGORY_COLUMNS = {'Recall': 'recall', 'Precision': 'precision', 'Accuracy': 'accuracy', 'F1 Score': 'f1'}
+
+
+def load_results_csv(csv_path, sample_length, categories):
+    """
+    Load the results of one window length from an experiment_runner.py CSV.
+
+    Args:
+    csv_path (str): Path of the results CSV.
+    sample_length (str): Window length in seconds to keep.
+    categories (list): List of category names to read.
+
+    Returns:
+    tuple: (modules, sub_modules, results) in the layout expected by prepare_data. Cells of the
+    grid missing from the CSV (a partial or filtered run) hold NaN, which is plotted as no bar.
+
+    Raises:
+    ValueError: If the CSV has no results for sample_length.
+    """
+    df = pd.read_csv(csv_path)
+    df = df[df['window_seconds'].astype(float) == float(sample_length)]
+    if df.empty:
+        raise ValueError(f"No results for {sample_length}-second windows in {csv_path}")
+    modules = [EMBEDDER_NAMES.get(name, name) for name in df['embedder'].unique()]
+    sub_modules = [CLASSIFIER_NAMES.get(name, name) for name in df['classifier'].unique()]
+    results = {module: {} for module in modules}
+    for _, row in df.iterrows():
+        module = EMBEDDER_NAMES.get(row['embedder'], row['embedder'])
+        sub_module = CLASSIFIER_NAMES.get(row['classifier'], row['classifier'])
+        results[module][sub_module] = [row[CATEGORY_COLUMNS[category]] for category in categories]
+    for module in modules:
+        for sub_module in sub_modules:
+            results[module].setdefault(sub_module, [np.nan] * len(categories))
+    return modules, sub_modules, results
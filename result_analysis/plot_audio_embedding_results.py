@@ -1,7 +1,11 @@
+import sys
+
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 
+from experiment_results import load_results_csv
+
 def prepare_data(modules, sub_modules, categories, results):
     """
     Prepare data for plotting from the given modules, sub-modules, categories, and results.
@@ -130,11 +134,18 @@ def main():
         }
     }
 
+    # Results written by experiment_runner.py replace the literals above:
+    # python plot_audio_embedding_results.py experiment_results.csv [sample_length]
+    if len(sys.argv) > 1:
+        if len(sys.argv) > 2:
+            sample_length = sys.argv[2]
+        modules, sub_modules, results = load_results_csv(sys.argv[1], sample_length, categories)
+
     # Prepare data for plotting
     df = prepare_data(modules, sub_modules, categories, results)
 
     # Plot and save results
-    plot_results(df, modules, sub_modules, categories, sample_length, "audio_embedding_results_for_5_sec")
+    plot_results(df, modules, sub_modules, categories, sample_length, f"audio_embedding_results_for_{sample_length}_sec")
 
 
 if __name__ == "__main__":